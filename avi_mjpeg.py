@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Hazır JPEG karelerini yeniden kodlamadan AVI (MJPG) dosyasına yazan basit muxer.
+
+cv2.VideoWriter her kareyi BGR olarak alıp yeniden JPEG'e kodlar. Kamera zaten
+MJPEG verdiğinde bu gereksizdir: MjpegAviWriter sıkıştırılmış byte'ları doğrudan
+'00dc' chunk'ları olarak yazar ve kapanışta idx1 indeksini ekler.
+
+Arayüz cv2.VideoWriter ile uyumludur: isOpened(), write(jpeg_bytes), release().
+Dosya RIFF-AVI 1.0 sınırı nedeniyle MAX_BYTES'ı aşmamalıdır; is_full() True
+döndüğünde çağıran taraf yeni bir dosyaya geçmelidir.
+"""
+from __future__ import annotations
+
+import os
+import struct
+from array import array
+from typing import Optional, Tuple
+
+# Eski oynatıcılarla uyum için RIFF-AVI 1.0 dosyalarını ~1 GiB ile sınırla
+MAX_BYTES = int(os.environ.get("AVI_MAX_BYTES", str(1 << 30)))
+
+_AVIF_HASINDEX = 0x10
+_AVIIF_KEYFRAME = 0x10
+
+
+class MjpegAviWriter:
+    def __init__(self, path: str, fps: float, size: Tuple[int, int], buffer_size: int = 1 << 20):
+        self.path = path
+        self.fps = float(fps) if fps and fps > 0 else 18.0
+        self.width, self.height = int(size[0]), int(size[1])
+        self.frames = 0
+        self.bytes_written = 0
+        self._max_chunk = 0
+        # idx1 girdileri: (offset, size) çiftleri, bellek dostu dizi
+        self._index = array("I")
+        self._fh = None
+        try:
+            self._fh = open(path, "wb", buffering=buffer_size)
+            self._write_headers()
+        except Exception:
+            self._close_file()
+            raise
+
+    # ------------------------------------------------------------ başlıklar
+    def _write_headers(self):
+        fh = self._fh
+        rate = int(round(self.fps * 1000))
+        scale = 1000
+        usec = int(round(1_000_000 / self.fps))
+
+        avih = struct.pack(
+            "<14I",
+            usec,            # dwMicroSecPerFrame
+            0,               # dwMaxBytesPerSec (kapanışta)
+            0,               # dwPaddingGranularity
+            _AVIF_HASINDEX,  # dwFlags
+            0,               # dwTotalFrames (kapanışta)
+            0,               # dwInitialFrames
+            1,               # dwStreams
+            0,               # dwSuggestedBufferSize (kapanışta)
+            self.width, self.height,
+            0, 0, 0, 0,
+        )
+        strh = struct.pack(
+            "<4s4sIHHIIIIIIIIhhhh",
+            b"vids", b"MJPG",
+            0,               # dwFlags
+            0, 0,            # wPriority, wLanguage
+            0,               # dwInitialFrames
+            scale, rate,     # dwScale, dwRate -> fps = rate/scale
+            0,               # dwStart
+            0,               # dwLength (kapanışta)
+            0,               # dwSuggestedBufferSize (kapanışta)
+            0xFFFFFFFF,      # dwQuality
+            0,               # dwSampleSize
+            0, 0, self.width, self.height,
+        )
+        strf = struct.pack(
+            "<IiiHH4sIiiII",
+            40, self.width, self.height, 1, 24, b"MJPG",
+            self.width * self.height * 3, 0, 0, 0, 0,
+        )
+
+        strl = b"strl" + _chunk(b"strh", strh) + _chunk(b"strf", strf)
+        hdrl = b"hdrl" + _chunk(b"avih", avih) + _list(strl)
+
+        fh.write(b"RIFF" + struct.pack("<I", 0) + b"AVI ")
+        self._hdrl_pos = fh.tell()
+        fh.write(_list(hdrl))
+        # Yama konumları (başlıklar sabit uzunlukta)
+        base = self._hdrl_pos + 12          # 'LIST' size 'hdrl'
+        self._avih_data = base + 8          # 'avih' size
+        self._strh_data = base + 8 + len(avih) + 12 + 8
+        fh.write(b"LIST" + struct.pack("<I", 0) + b"movi")
+        self._movi_pos = fh.tell() - 4      # 'movi' fourcc konumu (idx1 ofsetleri buna göre)
+        self.bytes_written = fh.tell()
+
+    # ------------------------------------------------------------ yazma
+    def isOpened(self) -> bool:
+        return self._fh is not None
+
+    def is_full(self) -> bool:
+        return self.bytes_written >= MAX_BYTES
+
+    def write(self, jpeg) -> None:
+        """Tek bir JPEG karesi (bytes, bytearray, memoryview veya uint8 ndarray) yaz."""
+        if self._fh is None:
+            return
+        mv = memoryview(jpeg).cast("B")
+        n = mv.nbytes
+        offset = self.bytes_written - self._movi_pos
+        self._fh.write(b"00dc" + struct.pack("<I", n))
+        self._fh.write(mv)
+        if n & 1:
+            self._fh.write(b"\0")
+        self._index.append(offset)
+        self._index.append(n)
+        self.frames += 1
+        self._max_chunk = max(self._max_chunk, n)
+        self.bytes_written += 8 + n + (n & 1)
+
+    def sync(self) -> None:
+        """Tamponu boşalt ve yazılan veriyi diske indir (fdatasync)."""
+        if self._fh is None:
+            return
+        self._fh.flush()
+        os.fdatasync(self._fh.fileno())
+
+    def release(self) -> None:
+        fh = self._fh
+        if fh is None:
+            return
+        try:
+            movi_end = self.bytes_written
+            # idx1
+            idx = array("I")
+            for i in range(0, len(self._index), 2):
+                idx.extend((_FCC_00DC, _AVIIF_KEYFRAME, self._index[i], self._index[i + 1]))
+            fh.write(b"idx1" + struct.pack("<I", len(idx) * 4))
+            fh.write(idx.tobytes())
+            end = fh.tell()
+
+            max_bps = int(self._max_chunk * self.fps)
+            # RIFF boyutu
+            fh.seek(4); fh.write(struct.pack("<I", end - 8))
+            # avih: dwMaxBytesPerSec, dwTotalFrames, dwSuggestedBufferSize
+            fh.seek(self._avih_data + 4); fh.write(struct.pack("<I", max_bps))
+            fh.seek(self._avih_data + 16); fh.write(struct.pack("<I", self.frames))
+            fh.seek(self._avih_data + 28); fh.write(struct.pack("<I", self._max_chunk + 8))
+            # strh: dwLength, dwSuggestedBufferSize
+            fh.seek(self._strh_data + 32); fh.write(struct.pack("<II", self.frames, self._max_chunk + 8))
+            # movi LIST boyutu
+            fh.seek(self._movi_pos - 4); fh.write(struct.pack("<I", movi_end - self._movi_pos))
+        finally:
+            self._close_file()
+
+    def _close_file(self):
+        try:
+            if self._fh is not None:
+                self._fh.close()
+        finally:
+            self._fh = None
+
+
+_FCC_00DC = struct.unpack("<I", b"00dc")[0]
+
+
+def _chunk(fcc: bytes, data: bytes) -> bytes:
+    pad = b"\0" if len(data) & 1 else b""
+    return fcc + struct.pack("<I", len(data)) + data + pad
+
+
+def _list(payload: bytes) -> bytes:
+    return b"LIST" + struct.pack("<I", len(payload)) + payload
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Kayıt dosyaları için HTTP Range ve koşullu GET destekli dosya yanıtı.
+
+send_range_file(path) bir flask Response döndürür:
+- ETag (inode + boyut + mtime_ns, güçlü) ve Last-Modified
+- If-Match / If-Unmodified-Since  -> 412
+- If-None-Match / If-Modified-Since -> 304
+- Range: bytes=a-b | a- | -n       -> 206 (Content-Range), tek parça
+  Birden çok aralık                 -> 206 multipart/byteranges (en fazla
+                                       DOWNLOAD_MAX_RANGES parça; fazlası tüm dosya)
+  Karşılanamaz aralık               -> 416 (Content-Range: bytes */boyut)
+- If-Range: ETag/tarih eşleşmezse Range yok sayılır ve tüm dosya (200) gider;
+  kesilen indirme ancak dosya değişmediyse kaldığı yerden sürer.
+
+send_range(boyut, etag, mtime, read, close, ad) aynı kuralları boyutu ve
+içeriği önceden belli herhangi bir kaynağa uygular (ör. records_export'un
+anında üretilen oturum arşivi).
+
+Gövde, eventlet altında os.pread ile DOWNLOAD_CHUNK_KB'lık parçalar hâlinde
+OS thread'inde okunur (SD kart okuması hub'ı ve kayıt thread'lerini
+bekletmez). eventlet.wsgi soket erişimi vermediği için sendfile kullanılamaz;
+büyük parça + thread havuzu en yakın karşılıktır.
+"""
+from __future__ import annotations
+
+import os
+import time
+import logging
+import mimetypes
+import unicodedata
+from typing import Callable, Optional, List, Tuple
+from urllib.parse import quote
+
+from flask import request, Response
+from werkzeug.http import http_date, parse_date, parse_etags, quote_etag, unquote_etag
+
+from native_io import native as _native
+
+LOG = logging.getLogger(__name__)
+
+DOWNLOAD_CHUNK_KB = max(16, int(os.environ.get("DOWNLOAD_CHUNK_KB", "256")))
+DOWNLOAD_MAX_RANGES = max(1, int(os.environ.get("DOWNLOAD_MAX_RANGES", "16")))
+
+# Sistem mime tablosunda olmayabilecek kayıt biçimleri
+_MIMETYPES = {
+    ".avi": "video/x-msvideo",
+    ".mp4": "video/mp4",
+    ".mkv": "video/x-matroska",
+}
+
+
+# ============================ Başlıklar ===================================
+def _etag(st: os.stat_result) -> str:
+    return f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def _parse_ranges(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """'bytes=...' başlığını [(başlangıç, bitiş dahil)] listesine çevir.
+    Sözdizimi hatalıysa None (başlık yok sayılır); karşılanabilir aralık
+    yoksa boş liste (416)."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+    out = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        if not sep:
+            return None
+        try:
+            if first.strip() == "":
+                n = int(last)
+                if n < 0:
+                    return None
+                if n == 0:
+                    continue
+                start, end = max(0, size - n), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last.strip() else size - 1
+                if start < 0 or (last.strip() and end < start):
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+        if start < size:
+            out.append((start, end))
+    return out
+
+
+def _coalesce(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Çakışan / bitişik aralıkları birleştir (sıralı)."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+_ASCII_FOLD = str.maketrans({"ı": "i", "İ": "I"})
+
+
+def _disposition(name: str, as_attachment: bool) -> str:
+    kind = "attachment" if as_attachment else "inline"
+    try:
+        name.encode("ascii")
+        return f'{kind}; filename="{name}"'
+    except UnicodeEncodeError:
+        # ı/İ NFKD ile ayrışmaz; ASCII yedek adda harf kaybolmasın
+        simple = unicodedata.normalize("NFKD", name.translate(_ASCII_FOLD)).encode("ascii", "ignore").decode("ascii")
+        return f"{kind}; filename=\"{simple}\"; filename*=UTF-8''{quote(name, safe='')}"
+
+
+def _if_range_ok(header: str, etag: str, mtime: float) -> bool:
+    header = header.strip()
+    if header.startswith('"') or header.startswith("W/"):
+        tag, weak = unquote_etag(header)
+        return not weak and tag == etag  # If-Range yalnızca güçlü karşılaştırma
+    date = parse_date(header)
+    return date is not None and int(mtime) == int(date.timestamp())
+
+
+# ============================ Gövde =======================================
+class _RangeBody:
+    """Yanıt gövdesi: parts = [(önek, başlangıç, bitiş dahil)], ardından trailer.
+    read(n, konum) en fazla n byte döndürür (boş = kaynak bitti). close() kaynağı
+    her durumda kapatır (HEAD/304'te gövde hiç okunmasa da)."""
+
+    def __init__(self, read: Callable[[int, int], bytes], parts: List[Tuple[bytes, int, int]],
+                 trailer: bytes = b"", close: Optional[Callable[[], None]] = None):
+        self.read, self.parts, self.trailer, self._close = read, parts, trailer, close
+
+    def __iter__(self):
+        chunk = DOWNLOAD_CHUNK_KB * 1024
+        for prefix, start, end in self.parts:
+            if prefix:
+                yield prefix
+            pos = start
+            while pos <= end:
+                data = self.read(min(chunk, end - pos + 1), pos)
+                if not data:
+                    return  # kaynak kısaldı (saklama/silme)
+                pos += len(data)
+                yield data
+        if self.trailer:
+            yield self.trailer
+
+    def close(self):
+        if self._close is not None:
+            fn, self._close = self._close, None
+            fn()
+
+
+def send_range_file(path: str, download_name: Optional[str] = None, as_attachment: bool = True,
+                    mimetype: Optional[str] = None, cache_control: str = "private, no-cache") -> Response:
+    """path'i Range/koşullu GET kurallarıyla sun. Dosya yoksa FileNotFoundError."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        st = os.fstat(fd)
+    except OSError:
+        os.close(fd)
+        raise
+    return send_range(st.st_size, _etag(st), st.st_mtime,
+                      lambda n, pos: _native(os.pread, fd, n, pos), lambda: os.close(fd),
+                      download_name or os.path.basename(path), as_attachment, mimetype, cache_control)
+
+
+def send_range(size: int, etag: str, mtime: float, read: Callable[[int, int], bytes],
+               close: Optional[Callable[[], None]], download_name: str, as_attachment: bool = True,
+               mimetype: Optional[str] = None, cache_control: str = "private, no-cache") -> Response:
+    """Boyutu ve içeriği önceden belli (deterministik) herhangi bir kaynağı
+    Range/koşullu GET kurallarıyla sun. read(n, konum) -> bytes; close yanıt
+    kapanınca (gövdesiz yanıtlarda hemen) bir kez çağrılır. etag güçlü olmalıdır:
+    aynı etag her zaman byte byte aynı içerik demektir."""
+    name = download_name
+    if mimetype is None:
+        ext = os.path.splitext(name)[1].lower()
+        mimetype = _MIMETYPES.get(ext) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+    headers = {
+        "ETag": quote_etag(etag),
+        "Last-Modified": http_date(mtime),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control,
+        "Content-Disposition": _disposition(name, as_attachment),
+    }
+
+    def _bodyless(status: int, **extra) -> Response:
+        if close is not None:
+            close()
+        h = dict(headers)
+        h.update(extra)
+        return Response(b"", status=status, headers=h)
+
+    # Ön koşullar (RFC 9110 13.2.2 sırası)
+    if_match = request.headers.get("If-Match")
+    if if_match is not None:
+        if not parse_etags(if_match).contains(etag):
+            return _bodyless(412)
+    else:
+        ius = parse_date(request.headers.get("If-Unmodified-Since"))
+        if ius is not None and int(mtime) > int(ius.timestamp()):
+            return _bodyless(412)
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        if parse_etags(if_none_match).contains_weak(etag):
+            return _bodyless(304)
+    else:
+        ims = parse_date(request.headers.get("If-Modified-Since"))
+        if ims is not None and int(mtime) <= int(ims.timestamp()):
+            return _bodyless(304)
+
+    ranges = None
+    range_header = request.headers.get("Range")
+    if range_header and size > 0:
+        if_range = request.headers.get("If-Range")
+        if if_range is None or _if_range_ok(if_range, etag, mtime):
+            ranges = _parse_ranges(range_header, size)
+            if ranges is not None and not ranges:
+                return _bodyless(416, **{"Content-Range": f"bytes */{size}"})
+            if ranges is not None:
+                ranges = _coalesce(ranges)
+                if len(ranges) > DOWNLOAD_MAX_RANGES:
+                    ranges = None  # aşırı parçalı istek: tüm dosyayı gönder
+
+    if not ranges:
+        headers.update({"Content-Type": mimetype, "Content-Length": str(size)})
+        body = _RangeBody(read, [(b"", 0, size - 1)], close=close)
+        return Response(body, status=200, headers=headers, direct_passthrough=True)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers.update({"Content-Type": mimetype, "Content-Length": str(end - start + 1),
+                        "Content-Range": f"bytes {start}-{end}/{size}"})
+        body = _RangeBody(read, [(b"", start, end)], close=close)
+        return Response(body, status=206, headers=headers, direct_passthrough=True)
+
+    boundary = f"{etag}-{int(time.time() * 1000):x}"
+    parts = []
+    length = 0
+    for start, end in ranges:
+        prefix = (f"\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n"
+                  f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode("ascii")
+        parts.append((prefix, start, end))
+        length += len(prefix) + end - start + 1
+    trailer = f"\r\n--{boundary}--\r\n".encode("ascii")
+    length += len(trailer)
+    headers.update({"Content-Type": f"multipart/byteranges; boundary={boundary}",
+                    "Content-Length": str(length)})
+    return Response(_RangeBody(read, parts, trailer, close), status=206, headers=headers, direct_passthrough=True)
+
+
+def is_resume_request() -> bool:
+    """Range başlığı var ve baştan başlamıyor mu? (indirme logunu tekrarlamamak için)"""
+    rng = request.headers.get("Range", "").replace(" ", "")
+    return bool(rng) and not rng.startswith("bytes=0-")
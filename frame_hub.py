@@ -0,0 +1,483 @@
+# -*- coding: utf-8 -*-
+"""
+Kamera karelerini tek bir yakalama thread'inden tüm tüketicilere dağıtan
+yayın merkezi (broadcast hub).
+
+Kamera yalnızca main.background_camera_updater tarafından okunur; her kare
+artan bir nesil (generation) numarasıyla küçük bir halka tampona yazılır.
+/video_feed istemcileri kamerayı okumak yerine yeni nesli bekler, böylece
+izleyici sayısı arttıkça kamera/CPU maliyeti sabit kalır.
+
+Kareler değişmez Frame nesneleri olarak referansla dolaştırılır: BGR görüntü
+salt okunurdur, kopya yalnızca kareyi değiştirecek tüketici tarafından
+writable_copy() ile alınır ve copy_meter ile sayılır.
+
+Yakalama, FramePool'daki önceden ayrılmış tamponlara okur. Tampon, referans
+sayımıyla (retain/release) tüm tüketiciler (halka tampon, stream, kayıt, QR)
+bıraktığında havuza geri döner; kararlı durumda yakalama döngüsü bellek ayırmaz.
+
+Her kare için JPEG kodlaması da bir kez yapılır: ilk isteyen tüketici kodlar,
+diğerleri (multipart başlığı dahil) aynı byte'ları yeniden kullanır. Kamera
+MJPEG verdiğinde (Frame.jpeg) hiç kodlama yapılmaz; kameranın byte'ları
+doğrudan gönderilir.
+"""
+from __future__ import annotations
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+LOG = logging.getLogger(__name__)
+
+MJPEG_PART_HEADER = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+
+
+# ============================ Kopya sayacı ===============================
+class CopyMeter:
+    """Kare kopyalarının toplam byte'ını ve saniyelik hızını tutar."""
+
+    def __init__(self, window: float = 2.0):
+        self._lock = threading.Lock()
+        self._window = window
+        self.total_bytes = 0
+        self.total_copies = 0
+        self._win_start = time.monotonic()
+        self._win_bytes = 0
+        self._rate = 0.0
+
+    def note(self, nbytes: int):
+        with self._lock:
+            self.total_bytes += int(nbytes)
+            self.total_copies += 1
+            self._win_bytes += int(nbytes)
+            self._roll()
+
+    def _roll(self):
+        now = time.monotonic()
+        dt = now - self._win_start
+        if dt >= self._window:
+            self._rate = self._win_bytes / dt
+            self._win_start = now
+            self._win_bytes = 0
+
+    def bytes_per_sec(self) -> float:
+        """Son tamamlanan penceredeki kopya hızı (byte/s)."""
+        with self._lock:
+            self._roll()
+            return self._rate
+
+    def stats(self) -> dict:
+        return {
+            "bytes_per_sec": round(self.bytes_per_sec(), 1),
+            "total_bytes": self.total_bytes,
+            "total_copies": self.total_copies,
+        }
+
+
+copy_meter = CopyMeter()
+
+
+def copy_image(img):
+    """Sayaçlı ndarray kopyası (kareyi değiştirecek tüketiciler için)."""
+    copy_meter.note(img.nbytes)
+    return img.copy()
+
+
+# ============================ Tampon havuzu ==============================
+class FramePool:
+    """Yakalama için önceden ayrılmış, sabit boyutlu kare tamponları.
+
+    acquire() boş tampon verir; havuz boşsa yeni tampon ayrılır (miss) ve
+    bırakıldığında havuza katılır. Boş listede en fazla `count` tampon tutulur,
+    fazlası GC'ye bırakılır.
+    """
+
+    def __init__(self, count: int = 8):
+        self._count = max(1, int(count))
+        self._lock = threading.Lock()
+        self._free = []
+        self._shape = None
+        self._dtype = None
+        self.allocated = 0
+        self.reused = 0
+        self.misses = 0
+        self.recycled = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        """Verilen şekilde yazılabilir bir tampon döndür."""
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        with self._lock:
+            if shape != self._shape or dtype != self._dtype:
+                # Çözünürlük değişti (veya ilk kare): havuzu yeniden kur
+                self._shape, self._dtype = shape, dtype
+                self._free = [np.empty(shape, dtype) for _ in range(self._count)]
+                self.allocated += self._count
+            if self._free:
+                self.reused += 1
+                return self._free.pop()
+            self.misses += 1
+            self.allocated += 1
+        return np.empty(shape, dtype)
+
+    def recycle(self, buf):
+        """Tüm tüketicilerin bıraktığı tamponu havuza geri koy."""
+        with self._lock:
+            if buf is None or buf.shape != self._shape or buf.dtype != self._dtype:
+                return
+            if len(self._free) >= self._count:
+                return
+            buf.flags.writeable = True
+            self._free.append(buf)
+            self.recycled += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self._count,
+                "free": len(self._free),
+                "allocated": self.allocated,
+                "reused": self.reused,
+                "misses": self.misses,
+                "recycled": self.recycled,
+            }
+
+
+# ============================ Değişmez kare ==============================
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """JPEG SOFn başlığından (w, h) oku; çözümleme yapmaz."""
+    i, n = 2, len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        seg_len = (data[i + 2] << 8) | data[i + 3]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            h = (data[i + 5] << 8) | data[i + 6]
+            w = (data[i + 7] << 8) | data[i + 8]
+            return (w, h)
+        i += 2 + seg_len
+    return None
+
+
+def jpeg_from_buffer(raw) -> Optional[Tuple[bytes, Tuple[int, int]]]:
+    """cv2 CAP_PROP_CONVERT_RGB=0 ile okunan ham tampondan (jpeg_bytes, (w, h)).
+    Tampon geçerli bir JPEG değilse None döner.
+    """
+    if raw is None:
+        return None
+    data = raw.tobytes() if isinstance(raw, np.ndarray) else bytes(raw)
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    # V4L2 tamponu sonda dolgu içerebilir: EOI'den sonrasını at
+    if data[-2:] != b"\xff\xd9":
+        end = data.rfind(b"\xff\xd9")
+        if end < 0:
+            return None
+        data = data[:end + 2]
+    size = _jpeg_size(data)
+    if size is None:
+        return None
+    return data, size
+
+
+# Frame referans sayaçları için (retain/release nadir ve kısa)
+_ref_lock = threading.Lock()
+
+
+class Frame:
+    """Değişmez kare: seq, ts, boyut ve salt okunur BGR görüntü ve/veya JPEG byte'ları.
+
+    image: salt okunur ndarray. Kare JPEG olarak geldiyse (MJPEG pass-through)
+    ilk erişimde bir kez çözülür ve saklanır.
+    jpeg: kameranın verdiği sıkıştırılmış byte'lar (yoksa None).
+
+    Görüntü bir FramePool tamponundaysa kare referans sayımlıdır: kareyi
+    yakalama thread'inin ötesinde tutan her tüketici retain() ile alır ve işi
+    bitince release() ile bırakır. Son release tamponu havuza döndürür.
+    Havuzsuz karelerde retain/release etkisizdir.
+    """
+    __slots__ = ("seq", "ts", "size", "jpeg", "_image", "_pool", "_refs")
+
+    def __init__(self, seq: int, ts: float, image=None, jpeg: Optional[bytes] = None,
+                 size: Optional[Tuple[int, int]] = None, pool: Optional[FramePool] = None):
+        if image is not None:
+            # Sahiplik bu nesneye geçti: kimse yerinde değiştiremesin
+            image.flags.writeable = False
+            h, w = image.shape[:2]
+            size = (w, h)
+        self.seq = seq
+        self.ts = ts
+        self.size = size  # (w, h)
+        self.jpeg = jpeg
+        self._image = image
+        self._pool = pool if image is not None else None
+        self._refs = 1
+
+    def retain(self) -> "Frame":
+        if self._pool is not None:
+            with _ref_lock:
+                self._refs += 1
+        return self
+
+    def release(self):
+        if self._pool is None:
+            return
+        with _ref_lock:
+            self._refs -= 1
+            if self._refs > 0:
+                return
+            buf, self._image, pool, self._pool = self._image, None, self._pool, None
+        pool.recycle(buf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @property
+    def image(self):
+        if self._image is None and self.jpeg is not None:
+            img = cv2.imdecode(np.frombuffer(self.jpeg, np.uint8), cv2.IMREAD_COLOR)
+            if img is not None:
+                img.flags.writeable = False
+            self._image = img
+        return self._image
+
+    @property
+    def shape(self):
+        return (self.size[1], self.size[0], 3)
+
+    def writable_copy(self):
+        """Kareyi değiştirmesi gereken tüketiciler için (sayaçlı) kopya."""
+        return copy_image(self.image)
+
+
+# ============================ JPEG önbelleği =============================
+class JpegCache:
+    """(seq, kalite) anahtarlı kodlanmış multipart parça önbelleği.
+
+    Aynı kare için eşzamanlı istekler tek bir kodlamayı bekler; böylece kare
+    başına kodlama sayısı izleyici sayısından bağımsız olarak 1 kalır.
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self._max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (seq, quality) -> bytes
+        self._pending = {}             # (seq, quality) -> threading.Event
+        self.hits = 0
+        self.misses = 0
+        self.passthrough = 0
+        self.encode_sec = 0.0
+
+    def get_part(self, frame: Frame, quality: int = 85) -> Optional[bytes]:
+        """Karenin multipart parçasını döndür; önbellekte yoksa bir kez kodla."""
+        key = (frame.seq, int(quality))
+        while True:
+            with self._lock:
+                part = self._entries.get(key)
+                if part is not None:
+                    self.hits += 1
+                    return part
+                ev = self._pending.get(key)
+                if ev is None:
+                    ev = threading.Event()
+                    self._pending[key] = ev
+                    break
+            # Başka bir tüketici bu kareyi kodluyor, sonucunu bekle
+            ev.wait(1.0)
+
+        part = None
+        try:
+            t0 = time.perf_counter()
+            if frame.jpeg is not None:
+                # Kamera zaten JPEG verdi: kodlama yok, yalnızca parça başlığı
+                part = MJPEG_PART_HEADER + frame.jpeg + b"\r\n"
+                encoded = False
+            else:
+                ok, buf = cv2.imencode(".jpg", frame.image, [int(cv2.IMWRITE_JPEG_QUALITY), key[1]])
+                if ok:
+                    part = MJPEG_PART_HEADER + buf.tobytes() + b"\r\n"
+                encoded = True
+            dt = time.perf_counter() - t0
+            with self._lock:
+                if encoded:
+                    self.misses += 1
+                    self.encode_sec += dt
+                else:
+                    self.passthrough += 1
+                if part is not None:
+                    self._entries[key] = part
+                    while len(self._entries) > self._max_entries:
+                        self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            ev.set()
+        return part
+
+    def peek_jpeg(self, frame: Frame) -> Optional[bytes]:
+        """Karenin zaten elde olan JPEG'i (kamera JPEG'i ya da bir izleyici için
+        kodlanmış parça); yoksa None. Kodlama yapmaz."""
+        if frame.jpeg is not None:
+            return frame.jpeg
+        with self._lock:
+            part = None
+            for (seq, _q), p in self._entries.items():
+                if seq == frame.seq:
+                    part = p
+        if part is None:
+            return None
+        return part[len(MJPEG_PART_HEADER):-2]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "passthrough": self.passthrough,
+                "hit_ratio": round(self.hits / total, 3) if total else None,
+                "avg_encode_ms": round(self.encode_sec * 1000.0 / self.misses, 2) if self.misses else None,
+            }
+
+
+# ============================ Yayın merkezi ==============================
+class FrameHub:
+    """Nesil sayaçlı halka tampon. Tek yazar, çok okuyucu."""
+
+    def __init__(self, capacity: int = 4, pool_size: Optional[int] = None):
+        self._capacity = max(1, int(capacity))
+        # Halka tampon + stream/kayıt/QR tüketicileri için pay bırak
+        self.pool = FramePool(pool_size if pool_size is not None else self._capacity + 8)
+        self._slots = [None] * self._capacity  # type: list
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._clients = 0
+        self._published_ts = 0.0
+        self.jpeg = JpegCache(max_entries=self._capacity * 2)
+        self._subscribers = []  # fn(frame), yakalama thread'inde çağrılır
+
+    @property
+    def seq(self) -> int:
+        """Son yayınlanan karenin nesil numarası (0: henüz kare yok)."""
+        return self._seq
+
+    def publish(self, image=None, ts: Optional[float] = None, jpeg: Optional[bytes] = None,
+                size: Optional[Tuple[int, int]] = None, pooled: bool = False) -> Frame:
+        """Yeni kareyi Frame olarak halka tampona yaz ve bekleyen okuyucuları uyandır.
+        image verilirse sahipliği hub'a geçer (salt okunur yapılır); çağıran onu
+        artık değiştirmemelidir. pooled=True: image self.pool'dan alınmıştır ve
+        son tüketici bıraktığında havuza döner.
+
+        Dönen Frame'in referansı halka tampona aittir; çağıran kareyi dönüşten
+        sonra da tutacaksa retain() etmelidir.
+        """
+        if ts is None:
+            ts = time.time()
+        with self._cond:
+            self._seq += 1
+            frame = Frame(self._seq, ts, image=image, jpeg=jpeg, size=size,
+                          pool=self.pool if pooled else None)
+            idx = frame.seq % self._capacity
+            evicted = self._slots[idx]
+            self._slots[idx] = frame
+            self._published_ts = ts
+            self._cond.notify_all()
+            subscribers = list(self._subscribers)
+        for fn in subscribers:
+            try:
+                fn(frame)
+            except Exception as e:
+                LOG.error(f"FrameHub abone hatası ({getattr(fn, '__name__', fn)}): {e}")
+        # Halka tampondan düşen karenin referansını bırak
+        if evicted is not None:
+            evicted.release()
+        return frame
+
+    def subscribe(self, fn):
+        """Her yeni karede fn(frame) çağır (HTTP istemcisinden bağımsız).
+        Abone hızlı olmalı; ağır işleri kendi kuyruğuna bırakmalıdır. Kare
+        yalnızca çağrı süresince geçerlidir; saklanacaksa retain() edilmelidir.
+        """
+        with self._cond:
+            if fn not in self._subscribers:
+                self._subscribers.append(fn)
+
+    def unsubscribe(self, fn):
+        with self._cond:
+            if fn in self._subscribers:
+                self._subscribers.remove(fn)
+
+    # Aşağıdaki okuyucular kareyi retain() edilmiş olarak döndürür;
+    # çağıran işi bitince release() etmelidir (veya `with frame:` kullanmalıdır).
+    def latest(self) -> Optional[Frame]:
+        """Son kareyi döndür (yoksa None)."""
+        with self._cond:
+            if self._seq == 0:
+                return None
+            return self._slots[self._seq % self._capacity].retain()
+
+    def get(self, seq: int) -> Optional[Frame]:
+        """Belirli bir nesli döndür; halka tampondan düştüyse None."""
+        with self._cond:
+            frame = self._slots[seq % self._capacity]
+            if frame is None or frame.seq != seq:
+                return None
+            return frame.retain()
+
+    def wait_next(self, after_seq: int, timeout: float = 1.0) -> Optional[Frame]:
+        """after_seq'ten daha yeni bir kare gelene kadar bekle.
+        Yavaş okuyucular ara kareleri atlar ve her zaman en yeni kareyi alır.
+        Zaman aşımında None döner.
+        """
+        deadline = time.monotonic() + max(0.0, timeout)
+        with self._cond:
+            while self._seq <= after_seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._slots[self._seq % self._capacity].retain()
+
+    def jpeg_part(self, frame: Frame, quality: int = 85) -> Optional[bytes]:
+        """Karenin kodlanmış multipart parçası (kare başına tek kodlama)."""
+        return self.jpeg.get_part(frame, quality)
+
+    # ------------------------------------------------------------ istemciler
+    def client_enter(self):
+        with self._cond:
+            self._clients += 1
+
+    def client_exit(self):
+        with self._cond:
+            self._clients = max(0, self._clients - 1)
+
+    def stats(self) -> dict:
+        with self._cond:
+            info = {
+                "seq": self._seq,
+                "clients": self._clients,
+                "capacity": self._capacity,
+                "last_frame_age": (time.time() - self._published_ts) if self._seq else None,
+            }
+        info["jpeg_cache"] = self.jpeg.stats()
+        if self._seq:
+            info["jpeg_cache"]["encodes_per_frame"] = round(self.jpeg.misses / self._seq, 3)
+        info["copies"] = copy_meter.stats()
+        info["pool"] = self.pool.stats()
+        return info
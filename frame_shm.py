@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Süreçler arası kare kanalı: /dev/shm üzerinde mmap'lenmiş küçük bir halka tampon.
+
+main.py yakalama thread'i son kareleri buraya yazar; recovery_gpio_monitor.py
+gibi harici süreçler SD karta hiç dokunmadan ve kilit tutmadan en son kareyi
+okur. Eski np.save(.npy) yönteminin yerini alır.
+
+Dosya düzeni (küçük endian):
+    başlık (64 B): magic, version, slots, slot_bytes, latest_seq
+    her slot: slot başlığı (64 B) + slot_bytes veri
+        slot başlığı: lock, seq, ts, h, w, c, dtype, nbytes
+
+Slot erişimi (tek yazar, çok okuyucu):
+    yazar: slot aralığına özel fcntl kaydı kilidi (bloklamaz; slot o an
+           okunuyorsa kare kanala yazılmaz) -> lock += 1 (tek) -> veri + meta
+           -> lock += 1 (çift) -> kilidi bırak -> latest_seq
+    okuyucu: latest_seq -> slot aralığına paylaşımlı kilit (bloklamaz) ->
+             meta + veri kopyala -> kilidi bırak
+Python'daki düz mmap okuma/yazmaları bellek bariyeri içermez; ARM gibi zayıf
+sıralı işlemcilerde yalnızca seq sayaçlarına güvenmek, okuyucunun yeni sayacı
+eski veriyle birlikte görmesine izin verebilir. Kayıt kilidini alıp bırakmak
+birer sistem çağrısıdır ve çekirdekteki kilit edinme/bırakma tam bellek
+sıralaması sağlar: yazarın kilidi bırakmadan önceki tüm yazmaları, aynı slotu
+sonradan kilitleyen okuyucuya görünür. Çift/tek sayaç ve seq kontrolü,
+okuyucunun yarım yazılmış ya da başka tura ait slotu ayırt etmesi için
+korunur. Halkada birden çok slot olduğundan yazar ile okuyucu nadiren aynı
+slotta karşılaşır.
+
+Kare boyutu slot kapasitesini aşarsa yazar dosyayı yeni boyutla yeniden
+oluşturup atomik olarak yerine koyar; okuyucular inode değişimini görüp
+yeniden bağlanır.
+"""
+from __future__ import annotations
+
+import os
+import mmap
+import time
+import fcntl
+import struct
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+LOG = logging.getLogger(__name__)
+
+SHM_PATH = os.environ.get("CAMERA_SHM_PATH", "/dev/shm/clary_camera_frames")
+SHM_SLOTS = int(os.environ.get("CAMERA_SHM_SLOTS", "3"))
+
+_MAGIC = b"CLRYSHM1"
+_VERSION = 1
+_HDR = struct.Struct("<8sIIQQ")            # magic, version, slots, slot_bytes, latest_seq
+_HDR_SIZE = 64
+_LATEST_OFF = 24                           # latest_seq alanının ofseti
+_SLOT = struct.Struct("<QQdIII8sQ")        # lock, seq, ts, h, w, c, dtype, nbytes
+_SLOT_HDR_SIZE = 64
+_LOCK = struct.Struct("<Q")
+
+
+def _stride(slot_bytes: int) -> int:
+    # Slotları 64 byte sınırına hizala (önbellek satırı)
+    return _SLOT_HDR_SIZE + ((slot_bytes + 63) & ~63)
+
+
+class SharedFrameWriter:
+    """Kareleri paylaşımlı belleğe yazan tek yazar (yakalama thread'i)."""
+
+    def __init__(self, path: str = SHM_PATH, slots: int = SHM_SLOTS):
+        self.path = path
+        self.slots = max(2, int(slots))
+        self._mm = None
+        self._fd = None  # slot kilitleri için açık tutulur
+        self._slot_bytes = 0
+        self._seq = 0
+        self.frames = 0
+        self.skipped = 0  # slot okunurken gelen, yazılmayan kareler
+
+    def _create(self, slot_bytes: int):
+        """Dosyayı verilen slot kapasitesiyle (yeniden) oluştur ve yerine koy."""
+        self.close()
+        total = _HDR_SIZE + self.slots * _stride(slot_bytes)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, total)
+            mm = mmap.mmap(fd, total)
+        except Exception:
+            os.close(fd)
+            raise
+        _HDR.pack_into(mm, 0, _MAGIC, _VERSION, self.slots, slot_bytes, 0)
+        os.replace(tmp, self.path)
+        self._mm, self._fd = mm, fd
+        self._slot_bytes = slot_bytes
+        LOG.info(f"Paylaşımlı kare kanalı hazır: {self.path} ({self.slots} x {slot_bytes} B)")
+
+    def publish(self, image: np.ndarray, ts: Optional[float] = None) -> int:
+        """Kareyi sıradaki slota yaz ve yayınla; yayınlanan seq'i döndür."""
+        img = np.ascontiguousarray(image)
+        nbytes = img.nbytes
+        if self._mm is None or nbytes > self._slot_bytes:
+            self._create(nbytes)
+        mm = self._mm
+        seq = self._seq + 1
+        stride = _stride(self._slot_bytes)
+        off = _HDR_SIZE + (seq % self.slots) * stride
+        h, w = img.shape[:2]
+        c = img.shape[2] if img.ndim == 3 else 1
+
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, stride, off)
+        except OSError:
+            # Bir okuyucu bu slotu kopyalıyor: yakalama thread'ini bekletme, kareyi atla
+            self.skipped += 1
+            return self._seq
+        try:
+            lock = _LOCK.unpack_from(mm, off)[0]
+            _LOCK.pack_into(mm, off, lock + 1)              # yazma başladı (tek)
+            dst = np.frombuffer(mm, dtype=np.uint8, count=nbytes, offset=off + _SLOT_HDR_SIZE)
+            np.copyto(dst, img.reshape(-1).view(np.uint8))
+            _SLOT.pack_into(mm, off, lock + 1, seq, ts if ts is not None else time.time(),
+                            h, w, c, img.dtype.str.encode(), nbytes)
+            _LOCK.pack_into(mm, off, lock + 2)              # yazma bitti (çift)
+            del dst
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, stride, off)  # bırakma = bellek bariyeri
+        _LOCK.pack_into(mm, _LATEST_OFF, seq)
+        self._seq = seq
+        self.frames += 1
+        return seq
+
+    def close(self, unlink: bool = False):
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except Exception:
+                pass  # dışa aktarılmış view kaldıysa GC kapatır
+            self._mm = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if unlink:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class SharedFrameReader:
+    """Harici süreçlerden en son kareyi okur. Yalnızca kopyalama süresince
+    okunan slota paylaşımlı kayıt kilidi alır; dosyaya yazmaz."""
+
+    def __init__(self, path: str = SHM_PATH):
+        self.path = path
+        self._mm = None
+        self._f = None  # kayıt kilitleri için açık tutulur
+        self._ino = None
+        self.retries = 0
+
+    def _attach(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self.close()
+            return False
+        if self._mm is not None and st.st_ino == self._ino:
+            return True
+        self.close()
+        f = None
+        try:
+            f = open(self.path, "rb")
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            if f is not None:
+                f.close()
+            return False
+        magic, version, _slots, _slot_bytes, _latest = _HDR.unpack_from(mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            mm.close()
+            f.close()
+            return False
+        self._mm, self._f, self._ino = mm, f, os.fstat(f.fileno()).st_ino
+        return True
+
+    def latest_seq(self) -> int:
+        if not self._attach():
+            return 0
+        return _LOCK.unpack_from(self._mm, _LATEST_OFF)[0]
+
+    def read_latest(self, after_seq: int = 0, max_retries: int = 8
+                    ) -> Optional[Tuple[int, float, np.ndarray]]:
+        """(seq, ts, image) döndür; after_seq'ten yeni kare yoksa None.
+        Dönen görüntü paylaşımlı bellekten bağımsız bir kopyadır.
+        """
+        if not self._attach():
+            return None
+        mm = self._mm
+        _magic, _ver, slots, slot_bytes, _ = _HDR.unpack_from(mm, 0)
+        stride = _stride(slot_bytes)
+        for _ in range(max_retries):
+            seq = _LOCK.unpack_from(mm, _LATEST_OFF)[0]
+            if seq == 0 or seq <= after_seq:
+                return None
+            off = _HDR_SIZE + (seq % slots) * stride
+            try:
+                fcntl.lockf(self._f.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB, stride, off)
+            except OSError:
+                self.retries += 1  # yazar bu slotta
+                time.sleep(0.001)
+                continue
+            try:
+                lock1, slot_seq, ts, h, w, c, dtype, nbytes = _SLOT.unpack_from(mm, off)
+                if lock1 & 1 or slot_seq != seq or nbytes > slot_bytes:
+                    # Yazar bu slota bir tur sonra döndü (latest_seq eski): tekrar dene
+                    self.retries += 1
+                    continue
+                raw = mm[off + _SLOT_HDR_SIZE:off + _SLOT_HDR_SIZE + nbytes]
+            finally:
+                fcntl.lockf(self._f.fileno(), fcntl.LOCK_UN, stride, off)
+            dt = np.dtype(dtype.rstrip(b"\0").decode())
+            shape = (h, w, c) if c > 1 else (h, w)
+            img = np.frombuffer(raw, dtype=dt).reshape(shape)
+            return seq, ts, img
+        return None
+
+    def close(self):
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except Exception:
+                pass
+            self._mm = None
+            self._ino = None
+        if self._f is not None:
+            self._f.close()
+            self._f = None
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 import eventlet; eventlet.monkey_patch()
 
-import os, sys, time, re, subprocess, logging, signal, threading, shlex, errno
+import os, sys, time, re, subprocess, logging, signal, threading, shlex, errno, functools, socket, stat
 from datetime import datetime
 from collections import deque
 from typing import Tuple, Union
@@ -10,7 +10,12 @@ from typing import Tuple, Union
 import numpy as np
 import cv2
 
-from flask import Flask, render_template, Response, request, redirect, url_for, session, flash
+import frame_hub
+import frame_shm
+import qr_reader
+from qr_reader import parse_qr_data
+
+from flask import Flask, render_template, Response, request, redirect, url_for, session, flash, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_socketio import SocketIO
 from flask_wtf import CSRFProtect
@@ -195,15 +200,30 @@ batt_value = 0
 last_10_readings = deque(maxlen=50)
 active_connections = set()
 
+# Tek yakalama thread'inin karelerini /video_feed istemcilerine dağıtan merkez
+camera_hub = frame_hub.FrameHub(capacity=int(os.environ.get("CAMERA_HUB_SLOTS", "4")))
+CAPTURE_INTERVAL = float(os.environ.get("CAPTURE_INTERVAL", "0.055"))  # ~18 fps
+STREAM_JPEG_QUALITY = int(os.environ.get("STREAM_JPEG_QUALITY", "85"))
+# UVC kameranın kendi MJPEG çıktısını çözmeden kullan (stream + kayıt); desteklenmezse BGR'ye dönülür
+CAMERA_MJPEG_PASSTHROUGH = os.environ.get("CAMERA_MJPEG_PASSTHROUGH", "1").strip() not in ("0", "false", "False")
+camera_passthrough = False  # Açık kamera şu an ham JPEG mi veriyor?
+
 # Paylaşımlı kamera karesi - QR okuma için
 shared_camera_frame = None
 shared_frame_lock = threading.Lock()
 shared_frame_timestamp = 0
-shared_frame_file = "/home/rise/clary/clary_camera_frame.npy"  # Paylaşımlı dosya yolu
+# Harici süreçler için /dev/shm kare kanalı (SD karta yazmaz; okuyucu: frame_shm.SharedFrameReader)
+shared_frame_shm = frame_shm.SharedFrameWriter()
 
 # QR modu sinyal dosyası
 # NOT: /tmp yerine /var/run kullanıyoruz çünkü systemd PrivateTmp=true ile /tmp'yi izole ediyor
 CAMERA_SIGNAL_FILE = "/var/run/clary_qr_mode.signal"
+# Sinyal dosyası yazıldığında recovery_gpio_monitor bu sokete bir datagram atar;
+# monitör thread'i dosyayı sürekli yoklamak yerine burada bloklanır.
+CAMERA_SIGNAL_SOCKET = os.environ.get("CAMERA_SIGNAL_SOCKET", "/var/run/clary_qr_mode.sock")
+QR_SIGNAL_SAFETY_POLL = float(os.environ.get("QR_SIGNAL_SAFETY_POLL", "30"))  # soket modunda emniyet kontrolü (s)
+QR_SIGNAL_POLL_INTERVAL = 0.05  # soket açılamazsa dosya yoklama aralığı (s)
+QR_SIGNAL_MAX_AGE = 60  # bu süreden eski sinyal dosyası bayat sayılıp silinir (s)
 _qr_monitor_stop_evt = threading.Event()
 _last_qr_signal_time = 0  # Son QR sinyali zamanı
 
@@ -227,9 +247,9 @@ def check_qr_mode_signal():
                 file_stat = os.stat(CAMERA_SIGNAL_FILE)
                 signal_time = file_stat.st_mtime  # Dosya değiştirilme zamanı
 
-                # Sinyal dosyası 60 saniyeden eski mi? (timeout kontrolü)
+                # Sinyal dosyası QR_SIGNAL_MAX_AGE saniyeden eski mi? (timeout kontrolü)
                 file_age = time.time() - signal_time
-                if file_age > 60:
+                if file_age > QR_SIGNAL_MAX_AGE:
                     logger.warning(f"Eski QR sinyali tespit edildi ({file_age:.1f}s), temizleniyor...")
                     try:
                         os.remove(CAMERA_SIGNAL_FILE)
@@ -330,8 +350,53 @@ def check_qr_mode_signal():
         logger.error(f"QR modu sinyal kontrolü hatası: {e}", exc_info=True)
         return qr_mode_active
 
+def _open_qr_signal_socket():
+    """QR sinyal soketini (AF_UNIX, datagram) bağla. Başarısızsa None döner."""
+    try:
+        try:
+            if stat.S_ISSOCK(os.stat(CAMERA_SIGNAL_SOCKET).st_mode):
+                os.remove(CAMERA_SIGNAL_SOCKET)  # önceki çalıştırmadan kalan soket
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(CAMERA_SIGNAL_SOCKET)
+        try:
+            os.chmod(CAMERA_SIGNAL_SOCKET, 0o666)
+        except Exception:
+            pass
+        sock.settimeout(QR_SIGNAL_SAFETY_POLL)
+        logger.info(f"QR sinyal soketi dinleniyor: {CAMERA_SIGNAL_SOCKET}")
+        return sock
+    except Exception as e:
+        logger.warning(f"QR sinyal soketi açılamadı ({e}) - {QR_SIGNAL_POLL_INTERVAL * 1000:.0f}ms dosya yoklamasına dönülüyor")
+        return None
+
+def _wait_qr_signal(sock):
+    """Bir sonraki sinyal kontrolüne kadar bekle.
+    Soket varsa datagram gelene kadar CPU harcamadan bloklanır. Sinyal dosyası
+    varken uyanma, dosyanın bayatlayacağı ana (QR_SIGNAL_MAX_AGE) kurulur; böylece
+    kaçırılan bir bitiş sinyali QR modunu emniyet süresinden fazla açık tutmaz.
+    Soket yoksa eski yoklama aralığı kadar uyur.
+    """
+    if sock is None:
+        time.sleep(QR_SIGNAL_POLL_INTERVAL)
+        return
+    timeout = QR_SIGNAL_SAFETY_POLL
+    try:
+        remaining = QR_SIGNAL_MAX_AGE - (time.time() - os.stat(CAMERA_SIGNAL_FILE).st_mtime)
+        if remaining > 0:  # zaten bayat ama silinemediyse emniyet aralığında tekrar denenir
+            timeout = min(timeout, remaining + 0.1)
+    except OSError:
+        pass
+    sock.settimeout(timeout)
+    try:
+        msg = sock.recv(256)
+        logger.debug(f"QR sinyal soketi mesajı: {msg[:32]!r}")
+    except socket.timeout:
+        pass
+
 def qr_signal_monitor_loop():
-    """QR modu sinyal dosyasını sürekli izleyen thread"""
+    """QR modu sinyalini izleyen thread (soket bildirimiyle uyanır)"""
     global qr_mode_active
 
     # Thread başlarken QR modunun kapalı olduğundan emin ol
@@ -353,6 +418,8 @@ def qr_signal_monitor_loop():
     except Exception as e:
         logger.warning(f"Başlangıç sinyal temizleme hatası: {e}")
 
+    sock = _open_qr_signal_socket()
+
     while not _qr_monitor_stop_evt.is_set():
         try:
             check_qr_mode_signal()
@@ -366,7 +433,13 @@ def qr_signal_monitor_loop():
 
         except Exception as e:
             logger.error(f"QR sinyal monitör hatası: {e}")
-        time.sleep(0.05)  # 50ms aralıklarla kontrol et (daha hızlı tepki)
+        _wait_qr_signal(sock)
+    if sock is not None:
+        try:
+            sock.close()
+            os.remove(CAMERA_SIGNAL_SOCKET)
+        except Exception:
+            pass
     logger.info("QR sinyal monitörü durdu")
 
 def process_qr_scan():
@@ -453,7 +526,8 @@ def process_qr_scan():
 def read_qr_from_camera_frames(timeout=60):
     """
     Mevcut kamera akışından QR kod okur.
-    Kamerayı kapatmadan mevcut frame'leri kullanır.
+    Kamerayı kapatmadan camera_hub'daki her yeni kareyi qr_reader hattından geçirir
+    (gri ton, küçültülmüş aday arama, ROI takibi).
     """
     global qr_mode_active
 
@@ -465,117 +539,48 @@ def read_qr_from_camera_frames(timeout=60):
     logger.info(f"QR kod taraması başlatıldı (Timeout: {timeout}s)")
 
     start_time = time.time()
-    detector = cv2.QRCodeDetector()
+    scanner = qr_reader.QrRace()
     frame_count = 0
+    last_seq = 0
 
     while (time.time() - start_time) < timeout:
         try:
             # QR modunun hala aktif olduğunu kontrol et
             if not qr_mode_active:
                 logger.info("QR kod taraması durduruluyor - QR modu devre dışı bırakıldı")
+                scanner.close()
                 return None
 
-            # Global kamera frame'ini kullan
-            with shared_frame_lock:
-                if shared_camera_frame is None:
-                    time.sleep(0.1)
-                    continue
-
-                frame = shared_camera_frame.copy()
-
-            frame_count += 1
-
-            # Her 3 frame'de bir kontrol et (performans için)
-            if frame_count % 3 != 0:
-                time.sleep(0.05)
+            # Yeni kareyi bekle (retain edilmiş; salt okunur, kopya gerekmez)
+            frm = camera_hub.wait_next(last_seq, timeout=0.5)
+            if frm is None:
                 continue
+            last_seq = frm.seq
+            frame_count += 1
 
             # QR kod tespiti
-            data, bbox, _ = detector.detectAndDecode(frame)
+            with frm:
+                data = scanner.scan(frm.image)
 
-            if data and len(data.strip()) > 0:
-                logger.info(f"✓ QR kod bulundu! ({frame_count} frame işlendi)")
-                return data.strip()
+            if data:
+                logger.info(f"✓ QR kod bulundu! ({frame_count} frame işlendi, {time.time() - start_time:.2f}s)")
+                logger.info(f"  QR tarayıcı: {scanner.stats()}")
+                scanner.close()
+                return data
 
             # Her 30 frame'de bir log
             if frame_count % 30 == 0:
                 elapsed = time.time() - start_time
-                logger.debug(f"QR taraması devam ediyor... ({frame_count} frame, {elapsed:.1f}s)")
-
-            time.sleep(0.05)
+                logger.debug(f"QR taraması devam ediyor... ({frame_count} frame, {elapsed:.1f}s, {scanner.stats()})")
 
         except Exception as e:
             logger.error(f"QR okuma hatası (frame {frame_count}): {e}")
             time.sleep(0.1)
 
-    logger.warning(f"QR kod bulunamadı - timeout ({frame_count} frame işlendi)")
+    scanner.close()
+    logger.warning(f"QR kod bulunamadı - timeout ({frame_count} frame işlendi, {scanner.stats()})")
     return None
 
-def parse_qr_data(qr_data):
-    """QR kod verisini parse et ve mod/parametreleri döndür"""
-    try:
-        qr_data = qr_data.strip()
-
-        # AP Mode formatı: APMODE2.4gch6 veya APMODE5gch36
-        if qr_data.startswith("APMODE"):
-            band_channel = qr_data[6:]  # "2.4gch6" veya "5gch36"
-
-            if band_channel.startswith("2.4gch"):
-                band = "2.4"
-                hw_mode = "g"
-                channel = int(band_channel[6:])  # "2.4gch6" -> 6
-            elif band_channel.startswith("5gch"):
-                band = "5"
-                hw_mode = "a"
-                channel = int(band_channel[4:])  # "5gch36" -> 36
-            else:
-                return None, f"Geçersiz AP band formatı: {band_channel}"
-
-            # Kanal doğrulama
-            valid_24_channels = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
-            valid_5_channels = [36, 40, 44, 48, 149, 153, 157, 161, 165]
-
-            if band == "2.4" and channel not in valid_24_channels:
-                return None, f"Geçersiz 2.4GHz kanalı: {channel}"
-            if band == "5" and channel not in valid_5_channels:
-                return None, f"Geçersiz 5GHz kanalı: {channel}"
-
-            return {
-                'mode': 'ap',
-                'band': band,
-                'hw_mode': hw_mode,
-                'channel': channel
-            }, None
-
-        # WiFi MECARD formatı: WIFI:T:WPA;S:ssid;P:password;;
-        elif qr_data.startswith("WIFI:"):
-            import re
-
-            ssid_match = re.search(r'S:([^;]+);', qr_data)
-            pass_match = re.search(r'P:([^;]+);', qr_data)
-
-            if not ssid_match:
-                return None, "WiFi QR kodu SSID içermiyor"
-
-            ssid = ssid_match.group(1)
-            password = pass_match.group(1) if pass_match else ""
-
-            if len(ssid) == 0:
-                return None, "WiFi QR kodu boş SSID içeriyor"
-
-            return {
-                'mode': 'sta',
-                'ssid': ssid,
-                'password': password
-            }, None
-
-        else:
-            return None, f"Desteklenmeyen QR formatı: {qr_data[:20]}..."
-
-    except Exception as e:
-        logger.error(f"QR parse hatası: {e}", exc_info=True)
-        return None, str(e)
-
 def apply_wifi_config(config):
     """
     QR koddan okunan WiFi yapılandırmasını uygular.
@@ -817,13 +822,18 @@ def login_required(fn):
 def get_shared_camera_frame():
     """
     QR okuma için paylaşımlı kamera karesini al.
+    Paylaşımlı kare havuz tamponundadır ve geri dönüştürülür; çağırana
+    sayaçlı bir kopya verilir.
     Returns: (frame, timestamp) veya (None, 0)
     """
     global shared_camera_frame, shared_frame_lock, shared_frame_timestamp
     with shared_frame_lock:
-        if shared_camera_frame is not None:
-            return shared_camera_frame.copy(), shared_frame_timestamp
+        frm = shared_camera_frame.retain() if shared_camera_frame is not None else None
+        ts = shared_frame_timestamp
+    if frm is None:
         return None, 0
+    with frm:
+        return frame_hub.copy_image(frm.image), ts
 
 # =========================== Sinyal / Hızlı çıkış =========================
 def _graceful_exit(signum, frame):
@@ -1503,18 +1513,27 @@ def reacquire_camera_after_qr():
         time.sleep(0.5)  # QR okuma modunun kamerayı tamamen serbest bırakması için bekleme
         init_camera()
 
-def init_camera():
-    global camera, qr_mode_active
-
-    # QR modu aktifse kamerayı açma
-    if qr_mode_active:
-        logger.info("QR modu aktif - kamera açılmıyor")
-        return False
-
-    if camera is not None and camera.isOpened():
-        camera.release()
-    camera = None
+def _enable_mjpeg_passthrough(cam):
+    """Kamerayı MJPG formatına al ve ham (çözülmemiş) JPEG karelerini iste.
+    Kamera/backend desteklemiyorsa normal BGR çıktısına geri döner.
+    """
+    try:
+        cam.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+        if cam.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+            ok, raw = cam.read()
+            if ok and frame_hub.jpeg_from_buffer(raw) is not None:
+                return True
+    except Exception as e:
+        logger.debug(f"MJPEG pass-through denemesi başarısız: {e}")
+    try:
+        cam.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+    except Exception:
+        pass
+    return False
 
+def _open_camera_device():
+    """İlk çalışan kamerayı (0..2) aç ve döndür; bulunamazsa None."""
+    global camera_passthrough
     # OpenCV log seviyesini geçici olarak kapat (kamera bulunamadı uyarılarını önlemek için)
     old_log_level = None
     try:
@@ -1524,42 +1543,48 @@ def init_camera():
     except Exception:
         pass
 
-    for idx in range(3):
-        try:
-            # Her denemeden önce QR modunu kontrol et
-            if qr_mode_active:
-                logger.info("QR modu aktif oldu - kamera açma iptal edildi")
-                if old_log_level is not None:
-                    try:
-                        cv2.utils.logging.setLogLevel(old_log_level)
-                    except Exception:
-                        pass
-                return False
+    try:
+        for idx in range(3):
+            try:
+                cam = cv2.VideoCapture(idx)
+                if cam.isOpened():
+                    ok, frame = cam.read()
+                    if ok and frame is not None and frame.size > 0:
+                        cam.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                        camera_passthrough = CAMERA_MJPEG_PASSTHROUGH and _enable_mjpeg_passthrough(cam)
+                        mode = "MJPEG pass-through" if camera_passthrough else "BGR"
+                        logger.info(f"Kamera {idx} bağlandı ({mode}).")
+                        return cam
+                    cam.release()
+            except Exception as e:
+                logger.error(f"Kamera {idx} açma hatası: {e}")
+        return None
+    finally:
+        # Log seviyesini geri yükle
+        if old_log_level is not None:
+            try:
+                cv2.utils.logging.setLogLevel(old_log_level)
+            except Exception:
+                pass
 
-            cam = cv2.VideoCapture(idx)
-            if cam.isOpened():
-                ok, frame = cam.read()
-                if ok and frame is not None and frame.size > 0:
-                    cam.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                    camera = cam
-                    if old_log_level is not None:
-                        try:
-                            cv2.utils.logging.setLogLevel(old_log_level)
-                        except Exception:
-                            pass
-                    logger.info(f"Kamera {idx} bağlandı.")
-                    return True
-                cam.release()
-        except Exception as e:
-            logger.error(f"Kamera {idx} açma hatası: {e}")
+def init_camera():
+    global camera, qr_mode_active
 
-    if old_log_level is not None:
-        try:
-            cv2.utils.logging.setLogLevel(old_log_level)
-        except Exception:
-            pass
-    logger.warning("Kamera bulunamadı.")
-    return False
+    # QR modu aktifse kamerayı açma
+    if qr_mode_active:
+        logger.info("QR modu aktif - kamera açılmıyor")
+        return False
+
+    if camera is not None and camera.isOpened():
+        camera.release()
+    camera = None
+
+    cam = _open_camera_device()
+    if cam is None:
+        logger.warning("Kamera bulunamadı.")
+        return False
+    camera = cam
+    return True
 
 def create_placeholder(text):
     img = np.zeros((480, 640, 3), dtype=np.uint8)
@@ -1569,26 +1594,35 @@ def create_placeholder(text):
     cv2.putText(img, text, (x, y), font, 1, (255,255,255), 2)
     return img
 
+def _encode_placeholder(text):
+    """Yer tutucu kareyi multipart parçası olarak kodla (önbelleksiz; hata metinleri için)."""
+    _, buf = cv2.imencode(".jpg", create_placeholder(text))
+    return frame_hub.MJPEG_PART_HEADER + buf.tobytes() + b"\r\n"
+
+@functools.lru_cache(maxsize=8)
+def _placeholder_part(text):
+    """Sabit yer tutucu mesajları bir kez kodla ve önbellekte tut.
+    Değişken metinler (ör. hata mesajı) _encode_placeholder ile kodlanmalı."""
+    return _encode_placeholder(text)
+
 def background_camera_updater():
     """
-    QR modu için arka planda kamera frame'lerini sürekli güncelleyen thread.
-    Web arayüzü açılmasa bile QR okuma çalışır.
+    Kameranın tek sahibi olan yakalama thread'i.
+    Her kareyi camera_hub'a yayınlar; /video_feed istemcileri, kayıt modülü ve
+    QR okuma kamerayı doğrudan okumak yerine bu thread'in karelerini kullanır.
+    Web arayüzü açılmasa bile kareler üretilir.
     """
-    global camera, shared_camera_frame, shared_frame_lock, shared_frame_timestamp, shared_frame_file
-    global qr_mode_active, _background_camera_stop
+    global camera, shared_camera_frame, shared_frame_lock, shared_frame_timestamp
+    global qr_mode_active, _background_camera_stop, ever_connected
 
     logger.info("Arka plan kamera güncelleyici başlatıldı")
-    connection_retry_timer = 0
     frame_count = 0
     last_camera_init_attempt = 0
+    # Son BGR karenin şekli; havuzdan aynı şekilde tampon alınıp read() içine verilir
+    last_shape = None
 
     while not _background_camera_stop.is_set():
         try:
-            # QR modu aktif değilse bekle
-            if not qr_mode_active:
-                time.sleep(0.2)
-                continue
-
             # Kamera yoksa veya açık değilse, başlat
             if camera is None or not camera.isOpened():
                 now = time.time()
@@ -1596,48 +1630,26 @@ def background_camera_updater():
                 if now - last_camera_init_attempt >= 1:
                     last_camera_init_attempt = now
                     with camera_lock:
-                        if qr_mode_active:  # Yine kontrol et
-                            # Kamera yoksa başlat
-                            if camera is None or not camera.isOpened():
-                                logger.info("Arka plan thread: Kamera başlatılıyor...")
-
-                                # OpenCV log seviyesini geçici olarak kapat
-                                old_log_level = None
-                                try:
-                                    if hasattr(cv2, 'utils') and hasattr(cv2.utils, 'logging'):
-                                        old_log_level = cv2.utils.logging.getLogLevel()
-                                        cv2.utils.logging.setLogLevel(cv2.utils.logging.LOG_LEVEL_ERROR)
-                                except Exception:
-                                    pass
-
-                                for idx in range(3):
-                                    try:
-                                        cam = cv2.VideoCapture(idx)
-                                        if cam.isOpened():
-                                            ok, frame = cam.read()
-                                            if ok and frame is not None and frame.size > 0:
-                                                cam.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                                                camera = cam
-                                                logger.info(f"Arka plan thread: Kamera {idx} bağlandı")
-                                                break
-                                            cam.release()
-                                    except Exception as e:
-                                        logger.error(f"Arka plan thread: Kamera {idx} açma hatası: {e}")
-
-                                # Log seviyesini geri yükle
-                                if old_log_level is not None:
-                                    try:
-                                        cv2.utils.logging.setLogLevel(old_log_level)
-                                    except Exception:
-                                        pass
+                        if camera is None or not camera.isOpened():
+                            logger.info("Arka plan thread: Kamera başlatılıyor...")
+                            camera = _open_camera_device()
 
                 # Hala kamera yoksa bekle ve devam et
                 if camera is None or not camera.isOpened():
                     time.sleep(0.1)
                     continue
 
-            # Kamera frame'i oku
-            ok, frame = camera.read()
+            t_read = time.time()
+
+            # Kamera frame'i oku: BGR modunda havuz tamponuna doğrudan yazdır
+            buf = None
+            if not camera_passthrough and last_shape is not None:
+                buf = camera_hub.pool.acquire(last_shape)
+            ok, frame = camera.read(buf) if buf is not None else camera.read()
+            pooled = buf is not None and frame is buf
+            if buf is not None and not pooled:
+                # Çözünürlük değişti veya sürücü yeni dizi döndürdü: tamponu geri ver
+                camera_hub.pool.recycle(buf)
 
             if not ok or frame is None:
                 logger.warning("Arka plan thread: Kamera frame okunamadı, kamera kapatılıyor")
@@ -1650,33 +1662,55 @@ def background_camera_updater():
                 time.sleep(0.1)
                 continue
 
-            # Frame'i paylaşımlı değişkene kaydet
+            # Pass-through modunda kare ham JPEG tamponudur; çözülmeden taşınır
+            jpeg = None
+            if camera_passthrough:
+                jpeg = frame_hub.jpeg_from_buffer(frame)
+                if jpeg is None:
+                    logger.warning("Arka plan thread: Geçersiz MJPEG karesi atlandı")
+                    continue
+
+            if jpeg is None:
+                last_shape = frame.shape
+
             frame_count += 1
             now = time.time()
+            ever_connected = True
+
+            # Tüm /video_feed istemcilerine ve abonelere (kayıt) yayınla.
+            # Kare sahipliği hub'a geçer; tüketiciler aynı salt okunur Frame'i paylaşır.
+            if jpeg is not None:
+                frm = camera_hub.publish(ts=now, jpeg=jpeg[0], size=jpeg[1])
+            else:
+                frm = camera_hub.publish(frame, now, pooled=pooled)
 
-            with shared_frame_lock:
-                shared_camera_frame = frame.copy()
-                shared_frame_timestamp = now
+            # QR modu: frame'i paylaşımlı değişkene kaydet (salt okunur, kopyasız)
+            if qr_mode_active:
+                bgr = frm.image
+                with shared_frame_lock:
+                    old = shared_camera_frame
+                    shared_camera_frame = frm.retain()
+                    shared_frame_timestamp = now
+                if old is not None:
+                    old.release()
 
-                # Her 3 karede bir dosyaya da yaz
-                if frame_count % 3 == 0:
-                    try:
-                        np.save(shared_frame_file, frame)
-                        # İlk 3 başarılı yazımda log göster
-                        if frame_count <= 9:
-                            logger.info(f"✓ Arka plan thread: Paylaşımlı kare dosyasına yazıldı (kare #{frame_count})")
-                    except Exception as save_err:
-                        logger.warning(f"Arka plan thread: Paylaşımlı kare kaydetme hatası: {save_err}")
-
-            # recordsVideo'ya frame gönder
-            try:
-                if 'recordsVideo' in globals():
-                    recordsVideo.push_frame(frame)
-            except Exception as _e:
-                pass
+                # Süreçler arası kanala da yaz (kilit dışında, bellek kopyası)
+                try:
+                    shm_seq = shared_frame_shm.publish(bgr, now)
+                    # İlk 3 başarılı yazımda log göster
+                    if shm_seq <= 3:
+                        logger.info(f"✓ Arka plan thread: Paylaşımlı kare kanalına yazıldı (kare #{frame_count})")
+                except Exception as save_err:
+                    logger.warning(f"Arka plan thread: Paylaşımlı kare yazma hatası: {save_err}")
+            elif shared_camera_frame is not None:
+                # QR modu bitti: tutulan tamponu havuza geri ver
+                with shared_frame_lock:
+                    old, shared_camera_frame = shared_camera_frame, None
+                if old is not None:
+                    old.release()
 
-            # ~18 fps
-            time.sleep(0.055)
+            # ~18 fps (okuma süresi dahil)
+            time.sleep(max(0.005, CAPTURE_INTERVAL - (time.time() - t_read)))
 
         except Exception as e:
             logger.error(f"Arka plan kamera güncelleyici hatası: {e}", exc_info=True)
@@ -1726,86 +1760,50 @@ def arkaplan_isi():
             time.sleep(5 if error_count >= max_errors else 1)
 
 def generate_frames():
-    global camera, ever_connected, shared_camera_frame, shared_frame_lock, shared_frame_timestamp, shared_frame_file
-    connection_retry_timer = 0
+    """/video_feed istemcisi: kamerayı okumaz, camera_hub'daki yeni nesilleri bekler."""
     error_count, max_errors = 0, 3
-    last_ok = None; last_ts = 0
-    frame_count = 0  # Kare sayacı
+    last_seq = 0
 
-    while True:
-        try:
-            # QR modu aktifse, arka plan thread kamerayı yönetir
-            # Bu fonksiyon sadece paylaşımlı frame'i gösterir
-            if qr_mode_active:
-                with shared_frame_lock:
+    camera_hub.client_enter()
+    try:
+        while True:
+            try:
+                # QR modu aktifse yalnızca bilgi karesi göster
+                if qr_mode_active:
                     if shared_camera_frame is not None:
-                        frame = shared_camera_frame.copy()
-                        ph = create_placeholder("QR Kod Okunuyor...")
-                        _, buf = cv2.imencode(".jpg", ph, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+                        yield _placeholder_part("QR Kod Okunuyor...")
                     else:
-                        ph = create_placeholder("QR modu - kamera başlatılıyor...")
-                        _, buf = cv2.imencode(".jpg", ph)
-                yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + buf.tobytes() + b"\r\n"
-                eventlet.sleep(0.055)
-                continue
-
-            # Normal işlem (QR modu değilse)
-            if camera is None or not camera.isOpened():
-                now = time.time()
-                if now - connection_retry_timer >= 1:
-                    connection_retry_timer = now
-                    with camera_lock:
-                        if not qr_mode_active:
-                            init_camera()
-                if camera is None or not camera.isOpened():
-                    ph = create_placeholder("Kamera bekleniyor...")
-                    _, buf = cv2.imencode(".jpg", ph)
-                    yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + buf.tobytes() + b"\r\n"
-                    eventlet.sleep(0.1); continue
-
-            ok, frame = camera.read()
-            now = time.time()
-            if not ok and last_ok is not None and now - last_ts < 2:
-                _, buf = cv2.imencode(".jpg", last_ok, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
-                yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + buf.tobytes() + b"\r\n"
-                eventlet.sleep(0.04); continue
-
-            if not ok or frame is None:
-                camera.release(); camera = None
-                ph = create_placeholder("Kare yok — yeniden bağlanılıyor…")
-                _, buf = cv2.imencode(".jpg", ph)
-                yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + buf.tobytes() + b"\r\n"
-                eventlet.sleep(0.1); continue
-
-            # Kayıt modülüne son kareyi ilet
-            try:
-                if 'recordsVideo' in globals():
-                    recordsVideo.push_frame(frame)
-            except Exception as _e:
-                logger.error(f"recordsVideo.push_frame hatası: {_e}")
+                        yield _placeholder_part("QR modu - kamera başlatılıyor...")
+                    eventlet.sleep(0.055)
+                    continue
 
-            ever_connected = True; error_count = 0
-            last_ok = frame.copy(); last_ts = now
+                item = camera_hub.wait_next(last_seq, timeout=1.0)
+                if item is None:
+                    # Yakalama thread'i kare üretmiyor (kamera yok / yeniden bağlanıyor)
+                    text = "Kare yok — yeniden bağlanılıyor…" if ever_connected else "Kamera bekleniyor..."
+                    yield _placeholder_part(text)
+                    continue
 
-            # Normal frame göster
-            _, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+                last_seq = item.seq
+                error_count = 0
 
-            yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + buf.tobytes() + b"\r\n"
+                # Kare başına tek kodlama: diğer istemciler aynı byte'ları kullanır.
+                # Kodlamadan sonra kare bırakılır; byte'lar havuz tamponundan bağımsızdır.
+                with item:
+                    part = camera_hub.jpeg_part(item, STREAM_JPEG_QUALITY)
+                if part is not None:
+                    yield part
 
-        except Exception as e:
-            error_count += 1; logger.error(f"generate_frames hata {error_count}/{max_errors}: {e}")
-            if camera is not None:
-                try:
-                    camera.release()
-                except Exception:
-                    pass
-            camera = None
-            if error_count >= max_errors:
-                logger.warning("Çok hata — 3 sn bekleme"); eventlet.sleep(3); error_count = 0
-            ph = create_placeholder(f"Hata: {e}")
-            _, buf = cv2.imencode(".jpg", ph)
-            yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + buf.tobytes() + b"\r\n"
-        eventlet.sleep(0.055)  # ~18 fps
+            except GeneratorExit:
+                raise
+            except Exception as e:
+                error_count += 1; logger.error(f"generate_frames hata {error_count}/{max_errors}: {e}")
+                if error_count >= max_errors:
+                    logger.warning("Çok hata — 3 sn bekleme"); eventlet.sleep(3); error_count = 0
+                yield _encode_placeholder(f"Hata: {e}")
+                eventlet.sleep(0.1)
+    finally:
+        camera_hub.client_exit()
 
 # ================================= Rotalar ================================
 @app.route("/")
@@ -1847,6 +1845,11 @@ def sock_disconnect():
 def video_feed():
     return Response(generate_frames(), mimetype="multipart/x-mixed-replace; boundary=frame")
 
+@app.route("/stream_stats")
+def stream_stats():
+    """Yayın merkezi ve JPEG önbellek sayaçları (izleyici başına maliyet takibi)."""
+    return jsonify(camera_hub.stats())
+
 # --- Kimlik ---
 @app.route("/login", methods=["GET","POST"])
 def login():
@@ -2721,7 +2724,7 @@ if __name__ == "__main__":
         init_camera()
         socketio.start_background_task(arkaplan_isi)
 
-        # Arka plan kamera güncelleyiciyi başlat (QR modu için)
+        # Kameranın tek sahibi olan yakalama thread'ini başlat (stream, kayıt ve QR için)
         start_background_camera_updater()
 
         if USE_GPIOD and BATT_PWM_LINE:
@@ -2743,10 +2746,31 @@ if __name__ == "__main__":
         # Kayıt modülü arkaplan servislerini başlat
         try:
             if 'recordsVideo' in globals():
-                recordsVideo.start_background()
+                recordsVideo.start_background(frame_source=camera_hub)
         except Exception as _e:
             logger.error(f"recordsVideo.start_background hatası: {_e}")
 
+        # Kayıt saklama (eski oturumları otomatik silme) servisini başlat
+        try:
+            import records_retention
+            records_retention.start_background()
+        except Exception as _e:
+            logger.error(f"records_retention başlatılamadı: {_e}")
+
+        # Kayıt küçük resimleri ve video bilgisi
+        try:
+            import records_media
+            records_media.start_background()
+        except Exception as _e:
+            logger.error(f"records_media başlatılamadı: {_e}")
+
+        # Mobil indirmeler için düşük bit hızlı önizleme üretimi
+        try:
+            import records_preview
+            records_preview.start_background()
+        except Exception as _e:
+            logger.error(f"records_preview başlatılamadı: {_e}")
+
         # QR modu sinyal monitörünü başlat
         try:
             threading.Thread(target=qr_signal_monitor_loop, daemon=True).start()
@@ -15,10 +15,16 @@ from functools import wraps
 from typing import Optional, List, Dict
 from datetime import datetime
 import json
+import base64
 import socket
 import shutil
+import hashlib
+import threading
+from collections import OrderedDict
 
-from flask import Blueprint, request, jsonify, send_file, session
+from flask import Blueprint, Response, current_app, request, jsonify, session
+
+import file_response
 
 # recordsVideo modülünden gerekli fonksiyonları import et
 try:
@@ -121,6 +127,129 @@ def format_size(size_bytes: int) -> str:
     return f"{size_bytes:.2f} TB"
 
 
+# ==================== Liste Sayfalama ve ETag ====================
+
+LIST_MAX_LIMIT = int(os.environ.get("LIST_MAX_LIMIT", "500"))
+LIST_CACHE_SIZE = int(os.environ.get("LIST_CACHE_SIZE", "32"))
+_LIST_SORTS = ("mtime", "name", "size")
+_LIST_BOOT = f"{int(time.time()):x}"  # yeniden başlatmada eski ETag'ler geçersiz
+_list_cache = OrderedDict()  # type: OrderedDict  # etag -> JSON gövdesi
+_list_cache_lock = threading.Lock()
+
+
+def _parse_time(value: str) -> float:
+    """Epoch saniye ya da ISO tarih/saat (2024-10-31, 2024-10-31T14:30:00)."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def _encode_cursor(sort: str, order: str, item: dict) -> str:
+    raw = json.dumps([sort, order, item[sort], item["name"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str, order: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        c_sort, c_order, value, name = json.loads(raw)
+    except Exception:
+        raise ValueError("Geçersiz cursor")
+    if (c_sort, c_order) != (sort, order):
+        raise ValueError("cursor farklı sort/order ile üretilmiş")
+    return value, name
+
+
+def _list_params() -> dict:
+    """Liste sorgu parametreleri; hatalıysa ValueError (400)."""
+    args = request.args
+    sort = args.get("sort", "mtime")
+    order = args.get("order", "desc")
+    if sort not in _LIST_SORTS:
+        raise ValueError(f"sort şunlardan biri olmalı: {', '.join(_LIST_SORTS)}")
+    if order not in ("asc", "desc"):
+        raise ValueError("order asc veya desc olmalı")
+    try:
+        limit = args.get("limit")
+        limit = None if limit is None else max(1, min(int(limit), LIST_MAX_LIMIT))
+        since = _parse_time(args["since"]) if args.get("since") else None
+        until = _parse_time(args["until"]) if args.get("until") else None
+        min_size = int(args["min_size"]) if args.get("min_size") else None
+    except ValueError:
+        raise ValueError("limit/min_size tam sayı, since/until epoch ya da ISO tarih olmalı")
+    cursor = _decode_cursor(args["cursor"], sort, order) if args.get("cursor") else None
+    return {"sort": sort, "order": order, "limit": limit, "since": since, "until": until,
+            "min_size": min_size, "prefix": args.get("prefix") or None, "cursor": cursor}
+
+
+def _paginate(items: List[Dict], p: dict) -> tuple:
+    """Filtrele, sırala ve cursor'dan sonraki sayfayı al: (sayfa, toplam, next_cursor).
+    Sıralama (sort alanı, ad) üzerinden olduğundan cursor araya giren/silinen
+    öğelerden etkilenmez (keyset sayfalama)."""
+    if p["prefix"]:
+        items = [it for it in items if it["name"].startswith(p["prefix"])]
+    if p["since"] is not None:
+        items = [it for it in items if it["mtime"] >= p["since"]]
+    if p["until"] is not None:
+        items = [it for it in items if it["mtime"] < p["until"]]
+    if p["min_size"] is not None:
+        items = [it for it in items if it["size"] >= p["min_size"]]
+    sort, desc = p["sort"], p["order"] == "desc"
+    items = sorted(items, key=lambda it: (it[sort], it["name"]), reverse=desc)
+    total = len(items)
+    if p["cursor"] is not None:
+        ck = tuple(p["cursor"])
+        try:
+            items = [it for it in items if ((it[sort], it["name"]) < ck if desc else (it[sort], it["name"]) > ck)]
+        except TypeError:
+            raise ValueError("Geçersiz cursor")
+    next_cursor = None
+    if p["limit"] is not None and len(items) > p["limit"]:
+        items = items[:p["limit"]]
+        next_cursor = _encode_cursor(sort, p["order"], items[-1])
+    return items, total, next_cursor
+
+
+def _list_etag(scope: str, session_name: Optional[str] = None) -> Optional[str]:
+    """Kayıt dizininin değişiklik sayacından güçlü ETag. Dizin hazır değilse None
+    (liste klasör taranarak üretilir, önbelleklenmez)."""
+    idx = getattr(recordsVideo, "records_index", None)
+    if idx is None or not idx.ready():
+        return None
+    # Dışarıdan yapılan değişiklikler dizinin arka plan thread'inde işlenir; burada taranmaz
+    live = recordsVideo.live_current()  # yazılan dosyanın boyutu dizinde güncellenmez
+    if live is not None and session_name is not None and live[0] != session_name:
+        live = None
+    gen = idx.generation()
+    args = sorted((k, v) for k, v in request.args.items(multi=True) if k != "token")
+    key = repr((_LIST_BOOT, gen, live, getattr(recordsVideo, "SESSION_NAME", None), scope, session_name, args))
+    return f"{gen:x}-{hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest()[:16]}"
+
+
+def _cached_list(etag: Optional[str], build):
+    """ETag eşleşirse 304; aynı ETag için üretilmiş gövde varsa onu, yoksa
+    build() -> dict ile üretip önbelleğe alarak gönder."""
+    headers = {"Cache-Control": "private, no-cache"}
+    if etag is not None:
+        headers["ETag"] = f'"{etag}"'
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        with _list_cache_lock:
+            body = _list_cache.get(etag)
+            if body is not None:
+                _list_cache.move_to_end(etag)
+        if body is not None:
+            return Response(body, status=200, headers=headers, mimetype="application/json")
+    body = current_app.json.dumps(build())
+    if etag is not None:
+        with _list_cache_lock:
+            _list_cache[etag] = body
+            while len(_list_cache) > LIST_CACHE_SIZE:
+                _list_cache.popitem(last=False)
+    return Response(body, status=200, headers=headers, mimetype="application/json")
+
+
 def check_camera_status() -> str:
     """
     Kamera durumunu kontrol et
@@ -247,10 +376,20 @@ def api_list_sessions():
     """
     Tüm kayıt oturumlarını listele
 
+    Query (hepsi isteğe bağlı):
+        sort=mtime|name|size, order=desc|asc (varsayılan mtime, desc)
+        limit=<n> (en fazla LIST_MAX_LIMIT; verilmezse hepsi), cursor=<next_cursor>
+        since=<epoch|ISO>, until=<epoch|ISO> (son değişiklik zamanı aralığı)
+        min_size=<byte>, prefix=<ad öneki>
+
+    ETag / If-None-Match: liste değişmediyse 304 Not Modified.
+
     Response:
     {
         "success": true,
         "active_session": "oturum5",
+        "total": 1,
+        "next_cursor": null,
         "sessions": [
             {
                 "name": "oturum5",
@@ -268,30 +407,40 @@ def api_list_sessions():
         if not RECORDS_MODULE_AVAILABLE:
             return jsonify({"success": False, "error": "Kayıt modülü kullanılamıyor"}), 503
 
-        sessions = _list_sessions()
-
-        # Aktif oturumu belirle (runtime + fallback)
-        active_session_name = _get_active_session_name(sessions)
-
-        result = []
-        for s in sessions:
-            is_active = (active_session_name == s["name"]) if active_session_name else False
-            result.append({
-                "name": s["name"],
-                "file_count": s["count"],
-                "total_size": s["size"],
-                "total_size_formatted": format_size(s["size"]),
-                "last_modified": s["mtime"],
-                "last_modified_formatted": datetime.fromtimestamp(s["mtime"]).strftime("%Y-%m-%d %H:%M:%S"),
-                "is_active": is_active
-            })
+        params = _list_params()
+
+        def build():
+            sessions = _list_sessions()
+
+            # Aktif oturumu belirle (runtime + fallback)
+            active_session_name = _get_active_session_name(sessions)
+            page, total, next_cursor = _paginate(sessions, params)
+
+            result = []
+            for s in page:
+                is_active = (active_session_name == s["name"]) if active_session_name else False
+                result.append({
+                    "name": s["name"],
+                    "file_count": s["count"],
+                    "total_size": s["size"],
+                    "total_size_formatted": format_size(s["size"]),
+                    "last_modified": s["mtime"],
+                    "last_modified_formatted": datetime.fromtimestamp(s["mtime"]).strftime("%Y-%m-%d %H:%M:%S"),
+                    "is_active": is_active
+                })
+
+            return {
+                "success": True,
+                "active_session": active_session_name,
+                "total": total,
+                "next_cursor": next_cursor,
+                "sessions": result
+            }
 
-        return jsonify({
-            "success": True,
-            "active_session": active_session_name,
-            "sessions": result
-        }), 200
+        return _cached_list(_list_etag("sessions"), build)
 
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         LOG.error(f"Oturum listesi hatası: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -303,11 +452,16 @@ def api_session_detail(session_name):
     """
     Belirli bir oturumdaki dosyaları listele
 
+    Query: /sessions ile aynı (sort, order, limit, cursor, since, until,
+    min_size, prefix); filtreler dosyalara uygulanır. ETag / 304 desteklenir.
+
     Response:
     {
         "success": true,
         "session": "oturum5",
         "is_active": true,
+        "total": 1,
+        "next_cursor": null,
         "files": [
             {
                 "name": "rec_20241031_143022.avi",
@@ -330,29 +484,49 @@ def api_session_detail(session_name):
         except Exception as e:
             return jsonify({"success": False, "error": "Geçersiz oturum"}), 400
 
-        files = _list_files(safe_session)
-
-        result = []
-        for f in files:
-            result.append({
-                "name": f["name"],
-                "size": f["size"],
-                "size_formatted": format_size(f["size"]),
-                "modified": f["mtime"],
-                "modified_formatted": datetime.fromtimestamp(f["mtime"]).strftime("%Y-%m-%d %H:%M:%S"),
-                "download_url": f"/api/v1/files/{safe_session}/{f['name']}"
-            })
-
-        active_session_name = _get_active_session_name()
-        is_active = (safe_session == active_session_name)
+        params = _list_params()
+
+        def build():
+            files = _list_files(safe_session)
+            page, total, next_cursor = _paginate(files, params)
+
+            result = []
+            for f in page:
+                result.append({
+                    "name": f["name"],
+                    "size": f["size"],
+                    "size_formatted": format_size(f["size"]),
+                    "modified": f["mtime"],
+                    "modified_formatted": datetime.fromtimestamp(f["mtime"]).strftime("%Y-%m-%d %H:%M:%S"),
+                    "download_url": f"/api/v1/files/{safe_session}/{f['name']}",
+                    # Dizinden gelen video bilgisi (henüz yoklanmadıysa null)
+                    "duration": f.get("duration"),
+                    "width": f.get("width"),
+                    "height": f.get("height"),
+                    "fps": f.get("fps"),
+                    "frames": f.get("frames"),
+                    "thumbnail_url": f"/api/v1/files/{safe_session}/{f['name']}/thumbnail?v={_media_key(f)}",
+                    "sprite_url": f"/api/v1/files/{safe_session}/{f['name']}/sprite?v={_media_key(f)}",
+                    "preview_url": f"/api/v1/files/{safe_session}/{f['name']}/preview",
+                })
+
+            active_session_name = _get_active_session_name()
+            is_active = (safe_session == active_session_name)
+
+            return {
+                "success": True,
+                "session": safe_session,
+                "is_active": bool(is_active),
+                "export_url": f"/api/v1/sessions/{safe_session}/export",
+                "total": total,
+                "next_cursor": next_cursor,
+                "files": result
+            }
 
-        return jsonify({
-            "success": True,
-            "session": safe_session,
-            "is_active": bool(is_active),
-            "files": result
-        }), 200
+        return _cached_list(_list_etag("files", safe_session), build)
 
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         LOG.error(f"Oturum detay hatası: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -388,6 +562,7 @@ def api_delete_session(session_name):
         import shutil
         target = os.path.join(getattr(recordsVideo, "RECORDS_DIR", RECORDS_DIR), safe_session)
         shutil.rmtree(target)
+        recordsVideo.index_note("remove_session", safe_session)
 
         return jsonify({
             "success": True,
@@ -399,6 +574,42 @@ def api_delete_session(session_name):
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@mobile_api_bp.route("/sessions/<session_name>/export", methods=["GET"])
+@token_required
+def api_export_session(session_name):
+    """
+    Oturumun tüm dosyalarını tek bağlantıda arşiv olarak indir
+
+    Query: ?format=zip (varsayılan, sıkıştırmasız zip64) | tar
+    Dosyalar mtime sırasıyla <oturum>/<dosya> adıyla yer alır; yazılmakta olan
+    dosya dahil edilmez. Arşiv anında üretilir ancak düzeni deterministiktir:
+    Content-Length, ETag, Range ve If-Range desteklenir (kaldığı yerden devam).
+
+    Response: application/zip veya application/x-tar (binary)
+    """
+    try:
+        if not RECORDS_MODULE_AVAILABLE:
+            return jsonify({"success": False, "error": "Kayıt modülü kullanılamıyor"}), 503
+
+        try:
+            safe_session = _safe_session(session_name)
+        except Exception:
+            return jsonify({"success": False, "error": "Geçersiz oturum"}), 400
+
+        fmt = request.args.get("format", "zip").lower()
+        import records_export
+        if fmt not in records_export.FORMATS:
+            return jsonify({"success": False, "error": "format zip veya tar olmalı"}), 400
+        if not os.path.isdir(os.path.join(RECORDS_DIR, safe_session)):
+            return jsonify({"success": False, "error": "Oturum bulunamadı"}), 404
+
+        return records_export.send_session(safe_session, fmt)
+
+    except Exception as e:
+        LOG.error(f"Oturum arşivleme hatası: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 # ==================== Dosya Yönetimi ====================
 
 @mobile_api_bp.route("/files/<session_name>/<path:filename>", methods=["GET"])
@@ -407,6 +618,10 @@ def api_download_file(session_name, filename):
     """
     Belirli bir dosyayı indir
 
+    Range (206, çoklu aralık), If-Range, ETag / If-None-Match desteklenir:
+    kesilen indirme kaldığı yerden sürer, oynatıcı dosyada atlayabilir.
+    ?inline=1 ile Content-Disposition inline olur.
+
     Response: Video dosyası (binary)
     """
     try:
@@ -424,7 +639,8 @@ def api_download_file(session_name, filename):
         if not os.path.exists(file_path):
             return jsonify({"success": False, "error": "Dosya bulunamadı"}), 404
 
-        return send_file(file_path, as_attachment=True, download_name=safe_filename)
+        return file_response.send_range_file(file_path, download_name=safe_filename,
+                                             as_attachment=not request.args.get("inline"))
 
     except Exception as e:
         LOG.error(f"Dosya indirme hatası: {e}")
@@ -459,6 +675,7 @@ def api_delete_file(session_name, filename):
             return jsonify({"success": False, "error": "Dosya bulunamadı"}), 404
 
         os.remove(file_path)
+        recordsVideo.index_note("remove_file", safe_session, safe_filename)
 
         return jsonify({
             "success": True,
@@ -520,6 +737,7 @@ def api_rename_file(session_name, filename):
             return jsonify({"success": False, "error": "Hedef dosya zaten var"}), 400
 
         os.rename(old_path, new_path)
+        recordsVideo.index_note("rename_file", safe_session, safe_old, safe_new)
 
         return jsonify({
             "success": True,
@@ -532,6 +750,95 @@ def api_rename_file(session_name, filename):
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def _media_key(f: dict) -> str:
+    """Küçük resim URL'lerindeki ?v= önbellek anahtarı (dosya boyutu + mtime)."""
+    try:
+        import records_media
+        return records_media.cache_key(f["size"], f["mtime"])
+    except Exception:
+        return ""
+
+
+def _media_image(session_name: str, filename: str, kind: str):
+    if not RECORDS_MODULE_AVAILABLE:
+        return jsonify({"success": False, "error": "Kayıt modülü kullanılamıyor"}), 503
+    try:
+        safe_session = _safe_session(session_name)
+        safe_filename = _safe_name(filename)
+    except Exception:
+        return jsonify({"success": False, "error": "Geçersiz dosya/oturum"}), 400
+    if not os.path.exists(os.path.join(RECORDS_DIR, safe_session, safe_filename)):
+        return jsonify({"success": False, "error": "Dosya bulunamadı"}), 404
+    try:
+        import records_media
+        resp = records_media.image_response(safe_session, safe_filename, kind, request.args.get("v"))
+    except Exception as e:
+        LOG.error(f"Küçük resim hatası: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+    if resp is None:
+        # Dosya hâlâ yazılıyor ya da okunamadı
+        return jsonify({"success": False, "error": "Küçük resim henüz hazır değil"}), 404
+    return resp
+
+
+@mobile_api_bp.route("/files/<session_name>/<path:filename>/thumbnail", methods=["GET"])
+@token_required
+def api_file_thumbnail(session_name, filename):
+    """
+    Dosyanın küçük resmi (JPEG). ?v=<anahtar> ile çağrılırsa (oturum detayındaki
+    thumbnail_url) yanıt uzun süre önbelleklenebilir; anahtar dosya değişince değişir.
+
+    Response: image/jpeg
+    """
+    return _media_image(session_name, filename, "thumb")
+
+
+@mobile_api_bp.route("/files/<session_name>/<path:filename>/sprite", methods=["GET"])
+@token_required
+def api_file_sprite(session_name, filename):
+    """
+    Dosyanın kontak sayfası: eşit aralıklı karelerden oluşan ızgara (JPEG).
+    İlk istekte üretilebilir (birkaç saniye sürebilir).
+
+    Response: image/jpeg
+    """
+    return _media_image(session_name, filename, "sprite")
+
+
+@mobile_api_bp.route("/files/<session_name>/<path:filename>/preview", methods=["GET"])
+@token_required
+def api_file_preview(session_name, filename):
+    """
+    Dosyanın düşük bit hızlı, düşük çözünürlüklü önizleme kopyası (hızlı
+    gözden geçirme için). İlk istekte arka planda üretilir; MP4 üretim sürerken
+    parça parça aktarılır (Content-Length yok, Range yok), AVI üretim bitince
+    gönderilir. Sonraki istekler önbellekten Range destekli olarak sunulur.
+    Hazır olması PREVIEW_START_WAIT_SEC'i aşarsa 503 + Retry-After.
+
+    Response: video/mp4 (ffmpeg varsa) veya video/x-msvideo
+    """
+    if not RECORDS_MODULE_AVAILABLE:
+        return jsonify({"success": False, "error": "Kayıt modülü kullanılamıyor"}), 503
+    try:
+        safe_session = _safe_session(session_name)
+        safe_filename = _safe_name(filename)
+    except Exception:
+        return jsonify({"success": False, "error": "Geçersiz dosya/oturum"}), 400
+    if not os.path.isfile(os.path.join(RECORDS_DIR, safe_session, safe_filename)):
+        return jsonify({"success": False, "error": "Dosya bulunamadı"}), 404
+    try:
+        import records_preview
+        if records_preview.is_active(safe_session, safe_filename):
+            return jsonify({"success": False, "error": "Dosya hâlâ kaydediliyor"}), 409
+        resp = records_preview.stream_response(safe_session, safe_filename)
+    except Exception as e:
+        LOG.error(f"Önizleme hatası: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+    if resp is None:
+        return jsonify({"success": False, "error": "Önizleme üretilemedi"}), 503
+    return resp
+
+
 # ==================== Kayıt Kontrolü ====================
 
 @mobile_api_bp.route("/recording/status", methods=["GET"])
@@ -546,8 +853,15 @@ def api_recording_status():
         "recording": true,
         "current_file": "rec_20241031_143022.avi",
         "current_session": "oturum5",
+        "current_part": 3,
         "fps": 18.5,
-        "resolution": [1920, 1080]
+        "resolution": [1920, 1080],
+        "timeline": {"frames_in": 540, "frames_out": 545, "duplicated": 5, "dropped": 0, "drift_ms": 12.4, ...},
+        "encoder": {"backend": "ffmpeg", "frames": 545, "dropped": 0, "encode_fps": 18.2, "bitrate_kbps": 1850.3, ...},
+        "preroll": {"enabled": true, "seconds": 2.94, "frames": 54, "bytes": 1843200, "max_sec": 3.0},
+        "queue": {"policy": "drop_oldest", "items": 2, "bytes": 1843200, "dropped": 0, "high_water_bytes": 9216000, ...},
+        "pipeline": {"workers": 2, "buffer": 1, "buffer_high_water": 6, "avg_encode_ms": 4.1, "max_write_ms": 38.2, ...},
+        "disk": {"state": "ok", "free_mb": 10240.5, "busy": 0.12, "disk_kbps": 48000.0, "produced_kbps": 5600.0, ...}
     }
     """
     try:
@@ -564,7 +878,8 @@ def api_recording_status():
         except Exception:
             pass
 
-        current_file = getattr(recordsVideo, "_current_file", None)
+        current = recordsVideo.current_segment()
+        current_file = os.path.basename(current[0]) if current else None
         session_name = _get_active_session_name()
         writer_fps = getattr(recordsVideo, "_writer_fps", None)
         base_fps = getattr(recordsVideo, "RECORD_FPS", RECORD_FPS)
@@ -574,8 +889,15 @@ def api_recording_status():
             "recording": is_recording,
             "current_file": current_file,
             "current_session": session_name,
+            "current_part": current[1] if current else None,
             "fps": writer_fps if is_recording and writer_fps is not None else base_fps,
-            "resolution": resolution
+            "resolution": resolution,
+            "timeline": recordsVideo.get_timeline_stats(),
+            "encoder": recordsVideo.get_backend_stats(),
+            "preroll": recordsVideo.get_preroll_stats(),
+            "queue": recordsVideo.get_queue_stats(),
+            "pipeline": recordsVideo.get_pipeline_stats(),
+            "disk": recordsVideo.get_disk_stats()
         }), 200
 
     except Exception as e:
@@ -665,6 +987,62 @@ def api_stop_recording():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@mobile_api_bp.route("/recording/segments", methods=["GET"])
+@token_required
+def api_recording_segments():
+    """
+    Kapanmış (indirilebilir) kayıt parçalarını listele; kayıt sürerken de çalışır.
+    Yazılmakta olan parça listede yoktur; "current" alanında (yoksa null) döner.
+
+    Query Parameters:
+        since: Unix zamanı; yalnızca bu andan sonra kapanan parçalar (opsiyonel)
+
+    Response:
+    {
+        "success": true,
+        "segments": [
+            {
+                "session": "oturum5",
+                "file": "rec_20241031_143022_part001.avi",
+                "part": 1,
+                "duration": 300.0,
+                "size": 52428800,
+                "closed": 1730385322.5,
+                "download_url": "/api/v1/files/oturum5/rec_20241031_143022_part001.avi"
+            }
+        ],
+        "count": 1,
+        "current": {"session": "oturum5", "file": "rec_20241031_143022_part002.avi", "part": 2},
+        "server_time": 1730385330.1
+    }
+    """
+    try:
+        if not RECORDS_MODULE_AVAILABLE:
+            return jsonify({"success": False, "error": "Kayıt modülü kullanılamıyor"}), 503
+
+        since = request.args.get("since", type=float)
+        segments = recordsVideo.get_published_segments(since=since)
+        for seg in segments:
+            seg["download_url"] = f"/api/v1/files/{seg['session']}/{seg['file']}"
+        current = recordsVideo.current_segment()
+
+        return jsonify({
+            "success": True,
+            "segments": segments,
+            "count": len(segments),
+            "current": {
+                "session": os.path.basename(os.path.dirname(current[0])),
+                "file": os.path.basename(current[0]),
+                "part": current[1],
+            } if current else None,
+            "server_time": time.time()
+        }), 200
+
+    except Exception as e:
+        LOG.error(f"Parça listesi hatası: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 # ==================== Sistem Bilgileri ====================
 
 @mobile_api_bp.route("/system/info", methods=["GET"])
@@ -723,12 +1101,34 @@ def api_system_info():
                 "free_formatted": format_size(usage.free),
                 "used_percent": _pct(used, usage.total),
                 "free_percent": _pct(usage.free, usage.total),
+                "recorder_state": recordsVideo.get_disk_stats().get("state"),
             }
         except Exception as e:
             LOG.warning(f"Disk kullanımı okunamadı: {e}")
 
         active_session_name = _get_active_session_name(sessions)
 
+        retention_info = None
+        try:
+            import records_retention
+            retention_info = records_retention.get_stats()
+        except Exception:
+            pass
+
+        index_info = None
+        try:
+            import records_index
+            index_info = records_index.get_stats()
+        except Exception:
+            pass
+
+        preview_info = None
+        try:
+            import records_preview
+            preview_info = records_preview.get_stats()
+        except Exception:
+            pass
+
         return jsonify({
             "success": True,
             "system": {
@@ -740,7 +1140,10 @@ def api_system_info():
                 "active_session": active_session_name,
                 "camera_status": camera_status,
                 "device_name": device_name,
-                "storage": storage_info
+                "storage": storage_info,
+                "retention": retention_info,
+                "index": index_info,
+                "preview": preview_info
             }
         }), 200
 
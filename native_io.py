@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Eventlet altında gerçek OS thread'i yardımcıları (tek yerde).
+
+main.py eventlet.monkey_patch() ile çalışır; cv2, disk ve SQLite gibi
+bloklayan C çağrıları hub'ı durdurmasın diye eventlet.tpool ile gerçek bir OS
+thread'inde yürütülür. Benchmark gibi bağımsız araçlar eventlet'i içe
+aktarmaz; o zaman her şey çağıran thread'de doğrudan çalışır.
+
+Ayrıca arka plan disk işleri (saklama, önizleme) için thread başına G/Ç
+önceliğini idle sınıfına indiren IdleIo burada durur.
+
+Algılama bu modül ilk içe aktarıldığında bir kez yapılır; main.py
+monkey_patch()'i diğer modüllerden önce çağırdığı için sonuç tutarlıdır.
+"""
+from __future__ import annotations
+
+import sys
+import time
+import ctypes
+import platform
+import threading
+from typing import Optional
+
+GREEN = False
+_ev_tpool = None
+if "eventlet" in sys.modules:
+    try:
+        from eventlet import patcher as _ev_patcher, tpool as _ev_tpool
+        GREEN = _ev_patcher.is_monkey_patched("thread")
+    except Exception:
+        _ev_tpool = None
+
+# OS thread'inde yeşil olmayan sleep ve yamasız Thread gerekir
+os_sleep = _ev_patcher.original("time").sleep if GREEN else time.sleep
+OsThread = _ev_patcher.original("threading").Thread if GREEN else threading.Thread
+
+
+def native(fn, *args):
+    """fn'i (eventlet varsa) gerçek OS thread'inde çalıştır."""
+    if GREEN and _ev_tpool is not None:
+        return _ev_tpool.execute(fn, *args)
+    return fn(*args)
+
+
+# ============================ G/Ç önceliği ================================
+# ioprio_set/get sistem çağrı numaraları (glibc sarmalayıcısı yok)
+_IOPRIO_SYSCALLS = {
+    "x86_64": (251, 252),
+    "aarch64": (30, 31),
+    "arm64": (30, 31),
+    "armv7l": (314, 315),
+    "armv6l": (314, 315),
+    "i686": (289, 290),
+    "i386": (289, 290),
+}
+_IOPRIO_WHO_PROCESS = 1          # who=0 ile çağıran thread
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_CLASS_IDLE = 3
+
+try:
+    _libc = ctypes.CDLL(None, use_errno=True)
+except Exception:
+    _libc = None
+
+
+def ioprio_get() -> Optional[int]:
+    nrs = _IOPRIO_SYSCALLS.get(platform.machine())
+    if _libc is None or nrs is None:
+        return None
+    prio = _libc.syscall(nrs[1], _IOPRIO_WHO_PROCESS, 0)
+    return prio if prio >= 0 else None
+
+
+def ioprio_set(prio: int) -> bool:
+    nrs = _IOPRIO_SYSCALLS.get(platform.machine())
+    if _libc is None or nrs is None:
+        return False
+    return _libc.syscall(nrs[0], _IOPRIO_WHO_PROCESS, 0, prio) == 0
+
+
+class IdleIo:
+    """Blok süresince çağıran thread'in G/Ç önceliğini idle sınıfına indir.
+    enabled=False iken hiçbir şey yapmaz; desteklenmeyen platformda da etkisizdir."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.active = False
+
+    def __enter__(self):
+        self._old = ioprio_get() if self.enabled else None
+        self.active = self._old is not None and ioprio_set(_IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT)
+        return self
+
+    def __exit__(self, *exc):
+        if self.active:
+            ioprio_set(self._old)
+        return False
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+QR okuma hattı için çevrimdışı benchmark.
+
+Kayıtlı kareleri (png/jpg/npy veya avi/mp4 kayıtları içeren bir klasör) ya da
+sentetik olarak üretilmiş kareleri qr_reader hattından geçirir ve her senaryo
+için şunları raporlar:
+  - ilk çözüme kadar geçen süre (kare sayısı ve saniye)
+  - saniyede işlenen kare
+  - kare başına CPU süresi (tüm thread'ler dahil, time.process_time)
+  - çözülen metnin beklenen yük ile ve parse_qr_data ile uyumu
+
+Sentetik kareler APMODE ve WIFI: yükleriyle, değişen bulanıklık, ölçek,
+döndürme ve gürültü ile üretilir; karelere küçük titreme eklenir (elde tutulan
+telefon). Kamera veya kart gerekmez, sıradan bir Linux makinede çalışır.
+
+Örnekler:
+  python3 qr_benchmark.py                         # sentetik, tüm çözücüler
+  python3 qr_benchmark.py --decoder race --quick
+  python3 qr_benchmark.py --frames /home/rise/clary/records/oturum1 --expect APMODE2.4gch6
+  python3 qr_benchmark.py --json sonuc.json
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+from typing import Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import qr_reader
+from qr_reader import parse_qr_data
+
+DEFAULT_PAYLOADS = [
+    "APMODE2.4gch6",
+    "APMODE5gch36",
+    "WIFI:T:WPA;S:Clary-Lab;P:gizli-parola-123;;",
+]
+IMAGE_EXT = (".png", ".jpg", ".jpeg", ".bmp", ".npy")
+VIDEO_EXT = (".avi", ".mp4", ".mkv", ".mov")
+
+
+# ============================ Sentetik kareler ============================
+def render_qr(payload: str, module_px: float) -> np.ndarray:
+    """Yükü sessiz bölgeli (4 modül) gri QR görüntüsüne çevir."""
+    qr = cv2.QRCodeEncoder.create().encode(payload)
+    qr = cv2.copyMakeBorder(qr, 4, 4, 4, 4, cv2.BORDER_CONSTANT, value=255)
+    side = max(8, int(round(qr.shape[0] * module_px)))
+    return cv2.resize(qr, (side, side), interpolation=cv2.INTER_NEAREST)
+
+
+def synth_frames(payload: str, module_px: float, angle: float, blur: float, noise: float,
+                 count: int, size: Tuple[int, int] = (640, 480), seed: int = 0) -> Iterator[np.ndarray]:
+    """Sahneye yerleştirilmiş, titreyen QR karelerini üret (BGR)."""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    qr = render_qr(payload, module_px)
+    # Sabit arka plan: yumuşak gradyan + doku
+    yy, xx = np.mgrid[0:h, 0:w]
+    base = (90 + 60 * xx / w + 30 * yy / h).astype(np.float32)
+    base += rng.normal(0, 6, (h, w)).astype(np.float32)
+
+    # Kodu döndür (beyaz kenarla) ve merkeze yakın yerleştir
+    side = qr.shape[0]
+    diag = int(np.ceil(side * 1.5))
+    canvas = np.full((diag, diag), 255, np.uint8)
+    o = (diag - side) // 2
+    canvas[o:o + side, o:o + side] = qr
+    m = cv2.getRotationMatrix2D((diag / 2, diag / 2), angle, 1.0)
+    rot = cv2.warpAffine(canvas, m, (diag, diag), flags=cv2.INTER_LINEAR, borderValue=255)
+    mask = cv2.warpAffine(np.full((diag, diag), 255, np.uint8), m, (diag, diag), flags=cv2.INTER_NEAREST)
+    mask = cv2.erode(mask, np.ones((3, 3), np.uint8)) > 0
+
+    cx, cy = (w - diag) // 2, (h - diag) // 2
+    for _ in range(count):
+        frame = base.copy()
+        jx, jy = rng.integers(-4, 5, 2)
+        x0 = int(np.clip(cx + jx, 0, max(0, w - diag)))
+        y0 = int(np.clip(cy + jy, 0, max(0, h - diag)))
+        region = frame[y0:y0 + diag, x0:x0 + diag]
+        rh, rw = region.shape
+        sub_mask = mask[:rh, :rw]
+        region[sub_mask] = rot[:rh, :rw][sub_mask]
+        if blur > 0:
+            frame = cv2.GaussianBlur(frame, (0, 0), blur)
+        if noise > 0:
+            frame += rng.normal(0, noise, frame.shape).astype(np.float32)
+        gray = np.clip(frame, 0, 255).astype(np.uint8)
+        yield cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+def synthetic_cases(payloads: List[str], quick: bool, count: int):
+    """(isim, yük, kare üreteci fabrikası) senaryoları."""
+    if quick:
+        grid = itertools.product([5.0, 3.0], [0, 30], [0.0, 1.5], [0.0, 12.0])
+    else:
+        grid = itertools.product([6.0, 4.0, 3.0, 2.0], [0, 15, 45], [0.0, 1.0, 2.0], [0.0, 8.0, 20.0])
+    for i, ((module_px, angle, blur, noise), payload) in enumerate(itertools.product(list(grid), payloads)):
+        name = f"{payload[:14]:<14} mod={module_px:<3} rot={angle:<2} blur={blur:<3} noise={noise:<4}"
+
+        def factory(payload=payload, module_px=module_px, angle=angle, blur=blur, noise=noise, seed=i):
+            return synth_frames(payload, module_px, angle, blur, noise, count, seed=seed)
+        yield name, payload, factory
+
+
+# ============================ Kayıtlı kareler =============================
+def load_dir_cases(path: str, expect: Optional[str], count: int):
+    """Klasördeki görüntüleri tek senaryo, her video dosyasını ayrı senaryo olarak döndür."""
+    images = sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(IMAGE_EXT))
+    videos = sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(VIDEO_EXT))
+    if images:
+        def image_factory(images=images):
+            for p in images:
+                img = np.load(p) if p.endswith(".npy") else cv2.imread(p, cv2.IMREAD_COLOR)
+                if img is not None:
+                    yield img
+        yield f"{os.path.basename(path.rstrip('/'))}/ ({len(images)} görüntü)", expect, image_factory
+    for v in videos:
+        def video_factory(v=v):
+            cap = cv2.VideoCapture(v)
+            try:
+                n = 0
+                while count <= 0 or n < count:
+                    ok, img = cap.read()
+                    if not ok:
+                        break
+                    n += 1
+                    yield img
+            finally:
+                cap.release()
+        yield os.path.basename(v), expect, video_factory
+
+
+# ============================ Çözücüler ==================================
+class BaselineDecoder:
+    """Eski yöntem: her karede tam çözünürlüklü BGR detectAndDecode."""
+
+    def __init__(self):
+        self._det = cv2.QRCodeDetector()
+
+    def scan(self, image):
+        data, _, _ = self._det.detectAndDecode(image)
+        return data.strip() or None
+
+    def close(self):
+        pass
+
+
+def make_decoder(name: str):
+    if name == "baseline":
+        return BaselineDecoder()
+    if name == "pipeline":
+        return qr_reader.QrScanner()
+    if name == "race":
+        return qr_reader.QrRace()
+    # Tek arka uç, yarış olmadan
+    backends = qr_reader.available_backends(name)
+    if not backends or backends[0].name != name:
+        raise SystemExit(f"Çözücü kullanılamıyor: {name}")
+    return qr_reader.QrRace(backends)
+
+
+def available_decoders() -> List[str]:
+    names = ["baseline", "pipeline"]
+    for b in ("wechat", "pyzbar"):
+        cls = qr_reader._BACKEND_TYPES[b]
+        if cls.available():
+            names.append(b)
+    names.append("race")
+    return names
+
+
+# ============================ Ölçüm ======================================
+def run_case(decoder_name: str, frames: Iterator[np.ndarray], expect: Optional[str]) -> dict:
+    dec = make_decoder(decoder_name)
+    n = decoded = 0
+    first_frame = first_sec = None
+    wrong = 0
+    parsed_ok = None
+    wall = cpu = 0.0
+    try:
+        for img in frames:
+            w0, c0 = time.perf_counter(), time.process_time()
+            data = dec.scan(img)
+            wall += time.perf_counter() - w0
+            cpu += time.process_time() - c0
+            n += 1
+            if not data:
+                continue
+            if expect is not None and data != expect:
+                wrong += 1
+                continue
+            decoded += 1
+            if first_frame is None:
+                first_frame, first_sec = n, wall
+                parsed_ok = parse_qr_data(data)[1] is None
+    finally:
+        if hasattr(dec, "close"):
+            dec.close()
+    return {
+        "frames": n,
+        "decoded": decoded,
+        "wrong": wrong,
+        "first_frame": first_frame,
+        "ttfd_ms": round(first_sec * 1000, 1) if first_sec is not None else None,
+        "fps": round(n / wall, 1) if wall > 0 else None,
+        "cpu_ms_per_frame": round(cpu * 1000 / n, 2) if n else None,
+        "parse_ok": parsed_ok,
+    }
+
+
+def summarize(rows: List[dict]) -> dict:
+    found = [r for r in rows if r["first_frame"] is not None]
+    frames = sum(r["frames"] for r in rows)
+    return {
+        "cases": len(rows),
+        "solved": len(found),
+        "median_ttfd_ms": float(np.median([r["ttfd_ms"] for r in found])) if found else None,
+        "mean_first_frame": round(float(np.mean([r["first_frame"] for r in found])), 2) if found else None,
+        "fps": round(frames / sum(r["frames"] / r["fps"] for r in rows if r["fps"]), 1) if frames else None,
+        "cpu_ms_per_frame": round(float(np.average([r["cpu_ms_per_frame"] for r in rows if r["frames"]],
+                                                   weights=[r["frames"] for r in rows if r["frames"]])), 2)
+        if frames else None,
+        "wrong": sum(r["wrong"] for r in rows),
+        "parse_fail": sum(1 for r in found if r["parse_ok"] is False),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="QR okuma hattı benchmark'ı")
+    ap.add_argument("--frames", help="Kayıtlı kare/video klasörü (verilmezse sentetik)")
+    ap.add_argument("--expect", help="Kayıtlı karelerde beklenen QR metni")
+    ap.add_argument("--payload", action="append", help="Sentetik yük (birden çok verilebilir)")
+    ap.add_argument("--decoder", action="append",
+                    help="baseline, pipeline, opencv, wechat, pyzbar, race (varsayılan: kurulu olanların hepsi)")
+    ap.add_argument("--count", type=int, default=30, help="Senaryo başına kare (sentetik) / en fazla kare (video)")
+    ap.add_argument("--quick", action="store_true", help="Küçük sentetik senaryo ızgarası")
+    ap.add_argument("--verbose", "-v", action="store_true", help="Her senaryonun satırını yazdır")
+    ap.add_argument("--json", help="Tüm sonuçları bu dosyaya JSON olarak yaz")
+    args = ap.parse_args(argv)
+
+    decoders = args.decoder or available_decoders()
+    if args.frames:
+        cases = list(load_dir_cases(args.frames, args.expect, args.count))
+        if not cases:
+            raise SystemExit(f"Klasörde görüntü/video yok: {args.frames}")
+    else:
+        cases = list(synthetic_cases(args.payload or DEFAULT_PAYLOADS, args.quick, args.count))
+
+    print(f"OpenCV {cv2.__version__} | {len(cases)} senaryo | çözücüler: {', '.join(decoders)}")
+    report = {"opencv": cv2.__version__, "decoders": {}}
+    for dname in decoders:
+        rows = []
+        for name, expect, factory in cases:
+            r = run_case(dname, factory(), expect)
+            r["case"] = name
+            rows.append(r)
+            if args.verbose:
+                ttfd = f"{r['ttfd_ms']:>7} ms @#{r['first_frame']}" if r["first_frame"] else "      - ms     "
+                print(f"  [{dname:<8}] {name}  {ttfd}  {r['fps']:>6} fps  {r['cpu_ms_per_frame']:>6} ms/kare")
+        summary = summarize(rows)
+        report["decoders"][dname] = {"summary": summary, "cases": rows}
+        print(f"{dname:<9} çözülen {summary['solved']:>3}/{summary['cases']:<3} "
+              f"ilk çözüm (medyan) {summary['median_ttfd_ms']} ms, ort. kare #{summary['mean_first_frame']} | "
+              f"{summary['fps']} fps | CPU {summary['cpu_ms_per_frame']} ms/kare | "
+              f"yanlış {summary['wrong']} | parse hatası {summary['parse_fail']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"JSON yazıldı: {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
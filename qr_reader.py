@@ -0,0 +1,467 @@
+# -*- coding: utf-8 -*-
+"""
+Kamera karelerinden QR kod okuma hattı.
+
+Tam çözünürlüklü BGR karede her seferinde detectAndDecode çalıştırmak yerine
+çok aşamalı bir hat kullanılır:
+
+1. Kare gri tona çevrilir (tüm aşamalar tek kanal üzerinde çalışır).
+2. Önceki karede bulunan bölge (ROI) varsa önce yalnızca o bölge çözülür:
+   önce bilinen köşelerle doğrudan decode() (detect yok), olmazsa ROI içinde
+   detectAndDecode. QR kodu genelde kareler arasında az hareket ettiğinden
+   çoğu karede tam kare taramasına gerek kalmaz.
+3. ROI yoksa veya kaybolduysa küçültülmüş karede yalnızca detect() ile aday
+   bölge aranır; bulunan köşeler tam çözünürlüğe ölçeklenir ve decode o
+   bölge üzerinde (küçükse büyütülerek) yapılır.
+4. Uzaktaki küçük kodlar küçültmede kaybolabileceği için birkaç karede bir
+   tam çözünürlüklü tarama yapılır.
+
+parse_qr_data() çözülen metni WiFi yapılandırmasına çevirir; main.py ve
+qr_benchmark.py aynı ayrıştırıcıyı kullanır.
+
+Bu hat OpenCV arka ucudur. QrRace aynı gri kareyi kurulu diğer arka uçlarla
+(OpenCV WeChat, pyzbar) küçük bir işçi havuzunda yarıştırır; ilk başarılı
+çözüm kazanır. Eventlet altında çözücüler tpool ile gerçek OS thread'lerinde
+çalışır, böylece hem paralel yürürler hem de web sunucusunu bloklamazlar.
+"""
+from __future__ import annotations
+
+import os
+import re
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from native_io import native as _offload
+
+try:
+    from pyzbar import pyzbar as _pyzbar
+except Exception:  # paket veya libzbar yok
+    _pyzbar = None
+
+
+LOG = logging.getLogger(__name__)
+
+# Aday arama genişliği (px). OpenCV kısa kenarı ~512 px'den küçük görüntüleri
+# kendi içinde büyüttüğü için bunun altına küçültmek kazanç sağlamaz.
+QR_DETECT_WIDTH = int(os.environ.get("QR_DETECT_WIDTH", "640"))
+QR_ROI_MARGIN = float(os.environ.get("QR_ROI_MARGIN", "0.5"))        # ROI kenar payı (boyutun oranı)
+QR_ROI_MIN_SIDE = int(os.environ.get("QR_ROI_MIN_SIDE", "240"))      # daha küçük ROI'ler büyütülür
+QR_ROI_MAX_MISSES = int(os.environ.get("QR_ROI_MAX_MISSES", "6"))    # ROI bu kadar karede çözülmezse bırakılır
+QR_FULL_SCAN_EVERY = int(os.environ.get("QR_FULL_SCAN_EVERY", "8"))  # N karede bir tam kare taraması
+QR_BACKENDS = os.environ.get("QR_BACKENDS", "opencv,wechat,pyzbar")  # yarışacak arka uçlar (sıra önemsiz)
+QR_RACE_TIMEOUT = float(os.environ.get("QR_RACE_TIMEOUT", "0.5"))    # kare başına en uzun bekleme (s)
+QR_WECHAT_MODEL_DIR = os.environ.get("QR_WECHAT_MODEL_DIR", "/home/rise/clary/wechat_qrcode")
+
+
+def parse_qr_data(qr_data):
+    """QR kod verisini parse et ve mod/parametreleri döndür"""
+    try:
+        qr_data = qr_data.strip()
+
+        # AP Mode formatı: APMODE2.4gch6 veya APMODE5gch36
+        if qr_data.startswith("APMODE"):
+            band_channel = qr_data[6:]  # "2.4gch6" veya "5gch36"
+
+            if band_channel.startswith("2.4gch"):
+                band = "2.4"
+                hw_mode = "g"
+                channel = int(band_channel[6:])  # "2.4gch6" -> 6
+            elif band_channel.startswith("5gch"):
+                band = "5"
+                hw_mode = "a"
+                channel = int(band_channel[4:])  # "5gch36" -> 36
+            else:
+                return None, f"Geçersiz AP band formatı: {band_channel}"
+
+            # Kanal doğrulama
+            valid_24_channels = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
+            valid_5_channels = [36, 40, 44, 48, 149, 153, 157, 161, 165]
+
+            if band == "2.4" and channel not in valid_24_channels:
+                return None, f"Geçersiz 2.4GHz kanalı: {channel}"
+            if band == "5" and channel not in valid_5_channels:
+                return None, f"Geçersiz 5GHz kanalı: {channel}"
+
+            return {
+                'mode': 'ap',
+                'band': band,
+                'hw_mode': hw_mode,
+                'channel': channel
+            }, None
+
+        # WiFi MECARD formatı: WIFI:T:WPA;S:ssid;P:password;;
+        elif qr_data.startswith("WIFI:"):
+            ssid_match = re.search(r'S:([^;]+);', qr_data)
+            pass_match = re.search(r'P:([^;]+);', qr_data)
+
+            if not ssid_match:
+                return None, "WiFi QR kodu SSID içermiyor"
+
+            ssid = ssid_match.group(1)
+            password = pass_match.group(1) if pass_match else ""
+
+            if len(ssid) == 0:
+                return None, "WiFi QR kodu boş SSID içeriyor"
+
+            return {
+                'mode': 'sta',
+                'ssid': ssid,
+                'password': password
+            }, None
+
+        else:
+            return None, f"Desteklenmeyen QR formatı: {qr_data[:20]}..."
+
+    except Exception as e:
+        LOG.error(f"QR parse hatası: {e}", exc_info=True)
+        return None, str(e)
+
+
+def to_gray(image: np.ndarray) -> np.ndarray:
+    """BGR/BGRA/gri kareyi tek kanala indir (gri ise olduğu gibi döner)."""
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+class QrScanner:
+    """Kare kare QR tarayıcı. Tek thread'den kullanılmalıdır (ROI durumu tutar)."""
+
+    def __init__(self, detect_width: int = QR_DETECT_WIDTH):
+        self.detect_width = max(64, int(detect_width))
+        self._detector = cv2.QRCodeDetector()
+        self._roi: Optional[Tuple[int, int, int, int]] = None  # x0, y0, x1, y1 (tam çözünürlük)
+        self._pts: Optional[np.ndarray] = None  # son köşeler (tam çözünürlük)
+        self._roi_misses = 0
+        self.frames = 0
+        self.roi_hits = 0
+        self.detect_hits = 0
+        self.full_scans = 0
+        self.decodes = 0
+        self.total_sec = 0.0
+
+    def reset(self):
+        """Takip edilen bölgeyi unut (yeni tarama oturumu)."""
+        self._roi = None
+        self._pts = None
+        self._roi_misses = 0
+
+    # ------------------------------------------------------------ aşamalar
+    def _decode_known(self, gray: np.ndarray) -> str:
+        """Son köşelerle doğrudan decode (detect maliyeti yok). Kod kıpırdamadıysa yeterli."""
+        x0, y0, x1, y1 = self._roi
+        pts = (self._pts - (x0, y0)).astype(np.float32).reshape(1, -1, 2)
+        try:
+            data, _ = self._detector.decode(gray[y0:y1, x0:x1], pts)
+        except cv2.error:
+            return ""
+        return data or ""
+
+    def _decode_region(self, gray: np.ndarray, roi: Tuple[int, int, int, int]) -> Tuple[str, Optional[np.ndarray]]:
+        """ROI'yi tam çözünürlükte kes, gerekirse büyüt ve çöz.
+        (data, köşeler) döndürür; köşeler tam kare koordinatındadır.
+        """
+        x0, y0, x1, y1 = roi
+        crop = gray[y0:y1, x0:x1]
+        if crop.size == 0:
+            return "", None
+        scale = 1.0
+        side = min(crop.shape[:2])
+        if side < QR_ROI_MIN_SIDE:
+            scale = QR_ROI_MIN_SIDE / float(side)
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        data, pts, _ = self._detector.detectAndDecode(crop)
+        if pts is None:
+            return data or "", None
+        return data or "", pts.reshape(-1, 2) / scale + (x0, y0)
+
+    def _roi_from_points(self, pts: np.ndarray, shape) -> Tuple[int, int, int, int]:
+        h, w = shape[:2]
+        xmin, ymin = pts.min(axis=0)
+        xmax, ymax = pts.max(axis=0)
+        mx = (xmax - xmin) * QR_ROI_MARGIN + 8
+        my = (ymax - ymin) * QR_ROI_MARGIN + 8
+        return (max(0, int(xmin - mx)), max(0, int(ymin - my)),
+                min(w, int(xmax + mx) + 1), min(h, int(ymax + my) + 1))
+
+    def _find_candidate(self, gray: np.ndarray) -> Optional[np.ndarray]:
+        """Küçültülmüş karede aday QR köşelerini bul (tam kare koordinatında)."""
+        h, w = gray.shape[:2]
+        scale = min(1.0, self.detect_width / float(w))
+        small = gray if scale >= 1.0 else cv2.resize(gray, (int(w * scale), int(h * scale)),
+                                                     interpolation=cv2.INTER_AREA)
+        ok, pts = self._detector.detect(small)
+        if not ok or pts is None:
+            return None
+        return pts.reshape(-1, 2) / scale
+
+    # ------------------------------------------------------------ giriş noktası
+    def scan(self, image: np.ndarray) -> Optional[str]:
+        """Tek kareyi tara; çözülen metni (boş olmayan) veya None döndür."""
+        t0 = time.perf_counter()
+        try:
+            return self._scan(to_gray(image))
+        finally:
+            self.frames += 1
+            self.total_sec += time.perf_counter() - t0
+
+    def _scan(self, gray: np.ndarray) -> Optional[str]:
+        # 1) Takip edilen bölge
+        if self._roi is not None:
+            data = self._decode_known(gray) if self._pts is not None else ""
+            if data.strip():
+                self.roi_hits += 1
+                self.decodes += 1
+                self._roi_misses = 0
+                return data.strip()
+            data, pts = self._decode_region(gray, self._roi)
+            if data.strip():
+                self.roi_hits += 1
+                self.decodes += 1
+                self._track(pts, gray.shape)
+                return data.strip()
+            if pts is not None:
+                # Kod hâlâ orada ama bu karede okunamadı: bölgeyi güncelle
+                self._track(pts, gray.shape, decoded=False)
+            else:
+                self._roi_misses += 1
+            if self._roi_misses < QR_ROI_MAX_MISSES:
+                return None
+            self.reset()
+
+        # 2) Küçük karede aday arama, tam çözünürlükte decode
+        pts = self._find_candidate(gray)
+        if pts is not None:
+            self.detect_hits += 1
+            roi = self._roi_from_points(pts, gray.shape)
+            data, found = self._decode_region(gray, roi)
+            self._track(found if found is not None else pts, gray.shape, decoded=bool(data.strip()))
+            if data.strip():
+                self.decodes += 1
+                return data.strip()
+            return None
+
+        # 3) Ara sıra tam kare (uzaktaki küçük kodlar için)
+        if QR_FULL_SCAN_EVERY > 0 and self.frames % QR_FULL_SCAN_EVERY == 0:
+            self.full_scans += 1
+            data, pts, _ = self._detector.detectAndDecode(gray)
+            if pts is not None:
+                self._track(pts.reshape(-1, 2), gray.shape, decoded=bool(data))
+            if data and data.strip():
+                self.decodes += 1
+                return data.strip()
+        return None
+
+    def _track(self, pts: np.ndarray, shape, decoded: bool = True):
+        self._pts = pts
+        self._roi = self._roi_from_points(pts, shape)
+        if decoded:
+            self._roi_misses = 0
+        else:
+            self._roi_misses += 1
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "decodes": self.decodes,
+            "roi_hits": self.roi_hits,
+            "detect_hits": self.detect_hits,
+            "full_scans": self.full_scans,
+            "avg_ms": round(self.total_sec * 1000.0 / self.frames, 2) if self.frames else None,
+        }
+
+
+# ============================ Arka uçlar =================================
+class QrBackend(ABC):
+    """Çözücü arka ucu: decode(gray) -> metin veya None. Tek thread'den çağrılır."""
+    name = "base"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.busy = False
+        self.calls = 0
+        self.successes = 0
+        self.wins = 0
+        self.skipped = 0
+        self.total_sec = 0.0
+
+    @abstractmethod
+    def decode(self, gray: np.ndarray) -> Optional[str]:
+        ...
+
+    def timed_decode(self, gray: np.ndarray) -> Optional[str]:
+        t0 = time.perf_counter()
+        data = None
+        try:
+            data = self.decode(gray)
+        except Exception as e:
+            LOG.debug(f"QR arka ucu {self.name} hata: {e}")
+        finally:
+            with self._lock:
+                self.calls += 1
+                self.total_sec += time.perf_counter() - t0
+                if data:
+                    self.successes += 1
+                self.busy = False
+        return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "successes": self.successes,
+                "wins": self.wins,
+                "skipped": self.skipped,
+                "success_rate": round(self.successes / self.calls, 3) if self.calls else None,
+                "avg_ms": round(self.total_sec * 1000.0 / self.calls, 2) if self.calls else None,
+            }
+
+
+class OpenCvBackend(QrBackend):
+    """cv2.QRCodeDetector + ROI takibi (QrScanner)."""
+    name = "opencv"
+
+    def __init__(self):
+        super().__init__()
+        self.scanner = QrScanner()
+
+    def decode(self, gray):
+        return self.scanner.scan(gray)
+
+
+class WeChatBackend(QrBackend):
+    """opencv-contrib WeChat QR (CNN modelleri varsa onlarla, yoksa klasik dedektörle)."""
+    name = "wechat"
+
+    def __init__(self, model_dir: str = QR_WECHAT_MODEL_DIR):
+        super().__init__()
+        files = [os.path.join(model_dir, f) for f in
+                 ("detect.prototxt", "detect.caffemodel", "sr.prototxt", "sr.caffemodel")]
+        if all(os.path.isfile(f) for f in files):
+            self._det = cv2.wechat_qrcode_WeChatQRCode(*files)
+        else:
+            self._det = cv2.wechat_qrcode_WeChatQRCode()
+
+    @staticmethod
+    def available() -> bool:
+        return hasattr(cv2, "wechat_qrcode_WeChatQRCode")
+
+    def decode(self, gray):
+        texts, _ = self._det.detectAndDecode(gray)
+        for t in texts or ():
+            if t and t.strip():
+                return t.strip()
+        return None
+
+
+class PyzbarBackend(QrBackend):
+    """ZBar (pyzbar); düşük ışıkta ve bulanık karelerde OpenCV'den toleranslı."""
+    name = "pyzbar"
+
+    @staticmethod
+    def available() -> bool:
+        return _pyzbar is not None
+
+    def decode(self, gray):
+        for sym in _pyzbar.decode(gray, symbols=[_pyzbar.ZBarSymbol.QRCODE]):
+            text = sym.data.decode("utf-8", errors="replace").strip()
+            if text:
+                return text
+        return None
+
+
+_BACKEND_TYPES = {
+    "opencv": OpenCvBackend,
+    "wechat": WeChatBackend,
+    "pyzbar": PyzbarBackend,
+}
+
+
+def available_backends(names: str = QR_BACKENDS) -> List[QrBackend]:
+    """İsimleri verilen ve bu sistemde kurulu olan arka uçları oluştur."""
+    backends = []
+    for name in (n.strip().lower() for n in names.split(",")):
+        cls = _BACKEND_TYPES.get(name)
+        if cls is None:
+            if name:
+                LOG.warning(f"Bilinmeyen QR arka ucu: {name}")
+            continue
+        if hasattr(cls, "available") and not cls.available():
+            LOG.info(f"QR arka ucu kullanılamıyor (kurulu değil): {name}")
+            continue
+        try:
+            backends.append(cls())
+        except Exception as e:
+            LOG.warning(f"QR arka ucu başlatılamadı ({name}): {e}")
+    if not backends:
+        backends.append(OpenCvBackend())
+    return backends
+
+
+class QrRace:
+    """Aynı gri kareyi tüm arka uçlarda yarıştır; ilk başarılı çözüm kazanır.
+
+    Önceki karede hâlâ çalışan (yavaş) bir arka uç o kare için atlanır; böylece
+    en yavaş çözücü diğerlerinin kare hızını düşürmez.
+    """
+
+    def __init__(self, backends: Optional[List[QrBackend]] = None, timeout: float = QR_RACE_TIMEOUT):
+        self.backends = backends if backends is not None else available_backends()
+        self.timeout = timeout
+        self.frames = 0
+        self._pool = ThreadPoolExecutor(max_workers=len(self.backends), thread_name_prefix="QrRace")
+        LOG.info(f"QR arka uçları: {', '.join(b.name for b in self.backends)}")
+
+    def scan(self, image: np.ndarray) -> Optional[str]:
+        gray = to_gray(image)
+        if gray is image:
+            # Kaybeden arka uçlar kare bırakıldıktan sonra da çalışabilir
+            gray = image.copy()
+        self.frames += 1
+        pending = set()
+        owner = {}
+        for b in self.backends:
+            with b._lock:
+                if b.busy:
+                    b.skipped += 1
+                    continue
+                b.busy = True
+            fut = self._pool.submit(_offload, b.timed_decode, gray)
+            owner[fut] = b
+            pending.add(fut)
+
+        deadline = time.monotonic() + self.timeout
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break  # zaman aşımı: kalanlar arka planda bitecek
+            for fut in done:
+                data = fut.result()
+                if data:
+                    b = owner[fut]
+                    with b._lock:
+                        b.wins += 1
+                    return data
+        return None
+
+    def stats(self) -> dict:
+        info = {"frames": self.frames}
+        for b in self.backends:
+            info[b.name] = b.stats()
+        opencv = next((b for b in self.backends if isinstance(b, OpenCvBackend)), None)
+        if opencv is not None:
+            info["opencv_pipeline"] = opencv.scanner.stats()
+        return info
+
+    def close(self):
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,459 @@
+# -*- coding: utf-8 -*-
+"""
+Kayıt writer arka uçları.
+
+recordsVideo her dosya için open_backend() ile bir writer alır. Tüm arka uçlar
+aynı arayüzü sunar: isOpened(), write(frame), release(), is_full(), stats()
+ve iki özellik:
+    accepts_jpeg: True ise write() hazır JPEG byte'larını bekler, değilse
+                  hedef boyutta BGR ndarray.
+    ext:          dosya uzantısı (".avi", ".mp4", ".mkv").
+
+Arka uçlar:
+    mjpeg-passthrough  Kameranın JPEG'lerini yeniden kodlamadan AVI'ye yazar
+                       (avi_mjpeg.MjpegAviWriter).
+    mjpeg              cv2.VideoWriter MJPG/AVI (eski davranış, her zaman var).
+    ffmpeg             Ham BGR kareleri stdin borusuyla ffmpeg'e verir; H.264
+                       (libx264 ultrafast/zerolatency veya h264_v4l2m2m) MP4/MKV.
+    gstreamer          Aynısı gst-launch-1.0 ile (x264enc veya v4l2h264enc), MKV.
+
+RECORD_BACKEND=auto iken sıra: ffmpeg -> gstreamer -> MJPG. Harici kodlayıcı
+açılamazsa her zaman MJPG'ye dönülür.
+"""
+from __future__ import annotations
+
+import os
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from abc import ABC, abstractmethod
+from queue import Queue, Full, Empty
+from typing import Optional, Tuple
+
+import cv2
+
+import frame_hub
+from avi_mjpeg import MjpegAviWriter
+
+LOG = logging.getLogger(__name__)
+
+RECORD_BACKEND = os.environ.get("RECORD_BACKEND", "auto").strip().lower()        # auto|mjpeg|ffmpeg|gstreamer
+RECORD_H264_ENCODER = os.environ.get("RECORD_H264_ENCODER", "auto").strip()      # auto|libx264|h264_v4l2m2m|x264enc|v4l2h264enc
+RECORD_CONTAINER = os.environ.get("RECORD_CONTAINER", "mp4").strip().lower()     # ffmpeg için mp4|mkv
+RECORD_BITRATE_KBPS = int(os.environ.get("RECORD_BITRATE_KBPS", "2000"))         # donanım kodlayıcı / x264enc hedefi
+RECORD_X264_CRF = int(os.environ.get("RECORD_X264_CRF", "26"))                   # libx264 kalite (düşük = iyi)
+RECORD_PIPE_QUEUE = int(os.environ.get("RECORD_PIPE_QUEUE", "8"))                # kodlayıcıya bekleyen en fazla kare
+RECORD_PIPE_CLOSE_TIMEOUT = float(os.environ.get("RECORD_PIPE_CLOSE_TIMEOUT", "15"))
+RECORD_WRITE_BUFFER_KB = int(os.environ.get("RECORD_WRITE_BUFFER_KB", "1024"))   # muxer dosya tamponu (büyük blok yazma)
+
+
+# ============================ Yetenek tespiti ==============================
+_probe_lock = threading.Lock()
+_probe_cache = {}
+
+
+def _probe(key: str, fn):
+    """Pahalı sistem sorgularını (encoder listesi vb.) bir kez çalıştır."""
+    with _probe_lock:
+        if key not in _probe_cache:
+            try:
+                _probe_cache[key] = fn()
+            except Exception as e:
+                LOG.debug(f"Yetenek sorgusu başarısız ({key}): {e}")
+                _probe_cache[key] = None
+        return _probe_cache[key]
+
+
+def _ffmpeg_encoders() -> str:
+    exe = shutil.which("ffmpeg")
+    if not exe:
+        return ""
+    out = subprocess.run([exe, "-hide_banner", "-encoders"], capture_output=True, text=True,
+                         timeout=10, stdin=subprocess.DEVNULL)
+    return out.stdout
+
+
+def _gst_has(element: str) -> bool:
+    exe = shutil.which("gst-inspect-1.0")
+    if not exe:
+        return False
+    out = subprocess.run([exe, element], capture_output=True, timeout=10, stdin=subprocess.DEVNULL)
+    return out.returncode == 0
+
+
+def _has_v4l2_m2m() -> bool:
+    """Çekirdekte bir V4L2 bellekten belleğe (M2M) kodlayıcı aygıtı var mı?"""
+    base = "/sys/class/video4linux"
+    try:
+        for dev in os.listdir(base):
+            try:
+                with open(os.path.join(base, dev, "name")) as f:
+                    name = f.read().lower()
+            except OSError:
+                continue
+            if "enc" in name or "m2m" in name or "cedrus" in name:
+                return True
+    except OSError:
+        pass
+    return False
+
+
+def ffmpeg_encoder() -> Optional[str]:
+    """Kullanılacak ffmpeg H.264 kodlayıcısı (yoksa None)."""
+    def pick():
+        encoders = _ffmpeg_encoders()
+        if not encoders:
+            return None
+        wanted = RECORD_H264_ENCODER
+        if wanted not in ("", "auto"):
+            return wanted if wanted in encoders else None
+        if "h264_v4l2m2m" in encoders and _has_v4l2_m2m():
+            return "h264_v4l2m2m"
+        if "libx264" in encoders:
+            return "libx264"
+        return None
+    return _probe("ffmpeg_encoder", pick)
+
+
+def gst_encoder() -> Optional[str]:
+    """Kullanılacak GStreamer H.264 elemanı (yoksa None)."""
+    def pick():
+        if not shutil.which("gst-launch-1.0"):
+            return None
+        wanted = RECORD_H264_ENCODER
+        if wanted not in ("", "auto"):
+            return wanted if _gst_has(wanted) else None
+        for element in ("v4l2h264enc", "x264enc"):
+            if _gst_has(element):
+                return element
+        return None
+    return _probe("gst_encoder", pick)
+
+
+# ============================ Ortak istatistik ============================
+def sync_path(path: str):
+    """Dosyanın sayfa önbelleğindeki verisini diske indir (herhangi bir fd yeterli)."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fdatasync(fd)
+    finally:
+        os.close(fd)
+
+
+class _StatsMixin:
+    name = "base"
+    accepts_jpeg = False
+    ext = ".avi"
+
+    def _init_stats(self, path: str, fps: float):
+        self.path = path
+        self.fps = fps
+        self.frames = 0
+        self.dropped = 0
+        self._t_start = time.monotonic()
+        # Disk G/Ç ölçümü (muxer note_io/sync ile besler)
+        self.io_ms = 0.0
+        self.sync_count = 0
+        self.sync_ms_max = 0.0
+        self.disk_kbps = None      # son pencerede G/Ç süresine göre disk hızı
+        self.produced_kbps = None  # son pencerede üretilen veri hızı
+        self._win_t = self._t_start
+        self._win_io_ms = 0.0
+        self._win_bytes = 0
+
+    def _file_bytes(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def note_io(self, ms: float):
+        """Muxer'ın write() içinde geçirdiği süre."""
+        self.io_ms += ms
+        self._win_io_ms += ms
+
+    def _sync_data(self):
+        sync_path(self.path)
+
+    def sync(self) -> float:
+        """Yazılanı diske indir (fdatasync); süreyi (ms) döndür."""
+        t0 = time.monotonic()
+        self._sync_data()
+        ms = (time.monotonic() - t0) * 1000.0
+        self.sync_count += 1
+        self.sync_ms_max = max(self.sync_ms_max, ms)
+        self.note_io(ms)
+        return ms
+
+    def take_window(self) -> Tuple[int, float, float]:
+        """Son pencerenin (byte, G/Ç saniyesi, duvar saniyesi) değerlerini döndür
+        ve disk/üretim hızlarını güncelle."""
+        now = time.monotonic()
+        nbytes = self._file_bytes()
+        delta = max(0, nbytes - self._win_bytes)
+        io_s = self._win_io_ms / 1000.0
+        wall_s = max(1e-6, now - self._win_t)
+        self.produced_kbps = round(delta * 8 / wall_s / 1000.0, 1)
+        self.disk_kbps = round(delta * 8 / io_s / 1000.0, 1) if io_s > 0 else None
+        self._win_t, self._win_io_ms, self._win_bytes = now, 0.0, nbytes
+        return delta, io_s, wall_s
+
+    def stats(self) -> dict:
+        elapsed = max(1e-6, time.monotonic() - self._t_start)
+        media_sec = self.frames / self.fps if self.fps else 0.0
+        nbytes = self._file_bytes()
+        return {
+            "backend": self.name,
+            "file": os.path.basename(self.path),
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "encode_fps": round(self.frames / elapsed, 2),
+            "bytes": nbytes,
+            "bitrate_kbps": round(nbytes * 8 / media_sec / 1000.0, 1) if media_sec > 0 else None,
+            "io_ms": round(self.io_ms, 1),
+            "io_busy": round(self.io_ms / 1000.0 / elapsed, 3),
+            "disk_kbps": self.disk_kbps,
+            "produced_kbps": self.produced_kbps,
+            "syncs": self.sync_count,
+            "sync_ms_max": round(self.sync_ms_max, 1),
+        }
+
+    def is_full(self) -> bool:
+        return False
+
+
+# ============================ MJPG arka uçları =============================
+class MjpegPassthroughBackend(_StatsMixin):
+    """Hazır JPEG'leri yeniden kodlamadan AVI'ye yazar."""
+    name = "mjpeg-passthrough"
+    accepts_jpeg = True
+    ext = ".avi"
+
+    def __init__(self, path: str, fps: float, size: Tuple[int, int]):
+        self._init_stats(path, fps)
+        self._w = MjpegAviWriter(path, fps, size, buffer_size=max(64, RECORD_WRITE_BUFFER_KB) * 1024)
+
+    def isOpened(self) -> bool:
+        return self._w.isOpened()
+
+    def is_full(self) -> bool:
+        return self._w.is_full()
+
+    def write(self, jpeg) -> None:
+        self._w.write(jpeg)
+        self.frames += 1
+
+    def release(self) -> None:
+        self._w.release()
+
+    def _sync_data(self):
+        self._w.sync()
+
+    def _file_bytes(self) -> int:
+        return self._w.bytes_written or super()._file_bytes()
+
+
+class CvMjpgBackend(_StatsMixin):
+    """cv2.VideoWriter ile MJPG/AVI (her karede yeniden kodlama)."""
+    name = "mjpeg"
+    accepts_jpeg = False
+    ext = ".avi"
+
+    def __init__(self, path: str, fps: float, size: Tuple[int, int]):
+        self._init_stats(path, fps)
+        self._w = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+
+    def isOpened(self) -> bool:
+        return bool(self._w) and self._w.isOpened()
+
+    def write(self, frame) -> None:
+        self._w.write(frame)
+        self.frames += 1
+
+    def release(self) -> None:
+        self._w.release()
+
+
+# ============================ Harici kodlayıcı borusu ======================
+class PipeEncoderBackend(_StatsMixin, ABC):
+    """Ham BGR kareleri bir kodlayıcı sürecinin stdin'ine yazar.
+
+    write() kareyi küçük bir kuyruğa kopyalar ve hemen döner; besleyici thread
+    boruya yazar. Kodlayıcı yetişemezse kuyruk dolar ve kare düşürülür
+    (dropped), böylece writer döngüsü ve CFR zaman çizelgesi bloklanmaz.
+    """
+    accepts_jpeg = False
+
+    def __init__(self, path: str, fps: float, size: Tuple[int, int]):
+        self._init_stats(path, fps)
+        self.size = (int(size[0]), int(size[1]))
+        self._frame_bytes = self.size[0] * self.size[1] * 3
+        self._q: Queue = Queue(maxsize=max(1, RECORD_PIPE_QUEUE))
+        self._stderr_tail = []
+        self._broken = False
+        cmd = self.command()
+        LOG.info(f"Kodlayıcı başlatılıyor: {' '.join(cmd)}")
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                      stderr=subprocess.PIPE, bufsize=0)
+        self._feeder = threading.Thread(target=self._feed, daemon=True, name=f"{self.name}-feed")
+        self._feeder.start()
+        threading.Thread(target=self._drain_stderr, daemon=True, name=f"{self.name}-err").start()
+
+    @abstractmethod
+    def command(self) -> list:
+        ...
+
+    def isOpened(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None and not self._broken
+
+    def write(self, frame) -> None:
+        if self._broken:
+            self.dropped += 1
+            return
+        if frame.shape[1] != self.size[0] or frame.shape[0] != self.size[1]:
+            frame = cv2.resize(frame, self.size)
+        # Kare havuz tamponuna ait olabilir: boruya gidene kadar bağımsız kopya tut
+        data = frame.tobytes()
+        frame_hub.copy_meter.note(len(data))
+        try:
+            self._q.put_nowait(data)
+        except Full:
+            self.dropped += 1
+
+    def _feed(self):
+        stdin = self._proc.stdin
+        while True:
+            data = self._q.get()
+            if data is None:
+                break
+            if self._broken:
+                continue
+            try:
+                stdin.write(data)
+                self.frames += 1
+            except (BrokenPipeError, OSError, ValueError) as e:
+                self._broken = True
+                LOG.error(f"{self.name} borusu kapandı: {e} {' | '.join(self._stderr_tail[-3:])}")
+
+    def _drain_stderr(self):
+        try:
+            for line in iter(self._proc.stderr.readline, b""):
+                text = line.decode(errors="replace").strip()
+                if text:
+                    self._stderr_tail = (self._stderr_tail + [text])[-20:]
+        except Exception:
+            pass
+
+    def release(self) -> None:
+        if self._proc is None:
+            return
+        self._q.put(None)
+        self._feeder.join(timeout=RECORD_PIPE_CLOSE_TIMEOUT)
+        try:
+            self._proc.stdin.close()  # EOF: kodlayıcı dosyayı sonlandırır
+        except Exception:
+            pass
+        try:
+            rc = self._proc.wait(timeout=RECORD_PIPE_CLOSE_TIMEOUT)
+            if rc != 0:
+                LOG.error(f"{self.name} çıkış kodu {rc}: {' | '.join(self._stderr_tail[-5:])}")
+        except subprocess.TimeoutExpired:
+            LOG.error(f"{self.name} kapanmadı, sonlandırılıyor")
+            self._proc.kill()
+            self._proc.wait()
+        self._proc = None
+        # Kuyrukta kalanlar (boru kırıldıysa) düşmüş sayılır
+        try:
+            while True:
+                if self._q.get_nowait() is not None:
+                    self.dropped += 1
+        except Empty:
+            pass
+
+
+class FfmpegBackend(PipeEncoderBackend):
+    name = "ffmpeg"
+    ext = ".mkv" if RECORD_CONTAINER == "mkv" else ".mp4"
+
+    def __init__(self, path: str, fps: float, size: Tuple[int, int]):
+        self.encoder = ffmpeg_encoder()
+        super().__init__(path, fps, size)
+
+    def command(self) -> list:
+        w, h = self.size
+        gop = max(1, int(round(self.fps * 2)))
+        cmd = [shutil.which("ffmpeg") or "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostats", "-y",
+               "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{w}x{h}", "-r", f"{self.fps:.3f}", "-i", "-",
+               "-c:v", self.encoder, "-g", str(gop)]
+        if self.encoder == "libx264":
+            cmd += ["-preset", "ultrafast", "-tune", "zerolatency", "-crf", str(RECORD_X264_CRF), "-pix_fmt", "yuv420p"]
+        else:
+            cmd += ["-b:v", f"{RECORD_BITRATE_KBPS}k", "-pix_fmt", "nv12"]
+        if self.path.endswith(".mp4"):
+            # Parçalı MP4: süreç çökse bile yazılan kısım oynatılabilir
+            cmd += ["-movflags", "+frag_keyframe+empty_moov+default_base_moof"]
+        return cmd + [self.path]
+
+
+class GstreamerBackend(PipeEncoderBackend):
+    name = "gstreamer"
+    ext = ".mkv"
+
+    def __init__(self, path: str, fps: float, size: Tuple[int, int]):
+        self.encoder = gst_encoder()
+        super().__init__(path, fps, size)
+
+    def command(self) -> list:
+        w, h = self.size
+        fps_num = int(round(self.fps * 1000))
+        if self.encoder == "x264enc":
+            enc = ["x264enc", "speed-preset=ultrafast", "tune=zerolatency",
+                   f"bitrate={RECORD_BITRATE_KBPS}", f"key-int-max={max(1, int(self.fps * 2))}"]
+        else:
+            enc = [self.encoder, f"extra-controls=encode,video_bitrate={RECORD_BITRATE_KBPS * 1000}"]
+        pipeline = (["fdsrc", "fd=0", "!",
+                     "rawvideoparse", f"width={w}", f"height={h}", "format=bgr", f"framerate={fps_num}/1000", "!",
+                     "videoconvert", "!"] + enc +
+                    ["!", "h264parse", "!", "matroskamux", "!", "filesink", f"location={self.path}"])
+        return [shutil.which("gst-launch-1.0") or "gst-launch-1.0", "-q", "-e"] + pipeline
+
+
+# ============================ Seçim ======================================
+def _candidates(passthrough: bool):
+    kind = RECORD_BACKEND
+    chain = []
+    if kind in ("auto", "ffmpeg") and ffmpeg_encoder():
+        chain.append(FfmpegBackend)
+    if kind in ("auto", "gstreamer") and gst_encoder():
+        chain.append(GstreamerBackend)
+    if kind not in ("auto", "ffmpeg", "gstreamer", "mjpeg"):
+        LOG.warning(f"Bilinmeyen RECORD_BACKEND={kind}, MJPG kullanılacak")
+    elif kind in ("ffmpeg", "gstreamer") and not chain:
+        LOG.warning(f"RECORD_BACKEND={kind} kullanılamıyor (kodlayıcı yok), MJPG'ye dönülüyor")
+    # Yedek: kamera JPEG veriyorsa yeniden kodlamasız AVI, değilse cv2 MJPG
+    if passthrough:
+        chain.append(MjpegPassthroughBackend)
+    chain.append(CvMjpgBackend)
+    return chain
+
+
+def open_backend(base_path: str, fps: float, size: Tuple[int, int], passthrough: bool = False):
+    """base_path (uzantısız) için ilk açılabilen arka ucu döndür; hiçbiri açılmazsa None."""
+    for cls in _candidates(passthrough):
+        path = base_path + cls.ext
+        try:
+            writer = cls(path, fps, size)
+            if writer.isOpened():
+                return writer
+            writer.release()
+            LOG.error(f"Kayıt arka ucu açılamadı: {cls.name}")
+        except Exception as e:
+            LOG.error(f"Kayıt arka ucu başlatılamadı ({cls.name}): {e}")
+        try:
+            if os.path.exists(path) and os.path.getsize(path) == 0:
+                os.remove(path)
+        except OSError:
+            pass
+    return None
@@ -1,29 +1,50 @@
 # -*- coding: utf-8 -*-
 """
 GPIO 260 yükselince video kaydını başlatır, düşünce durdurur.
-Kayıtlar clary/records/oturumN klasörlerine AVI (MJPG) formatında kaydedilir.
+Kayıtlar clary/records/oturumN klasörlerine kaydedilir; biçim record_backends
+arka ucuna bağlıdır (ffmpeg/GStreamer varsa H.264 MP4/MKV, yoksa AVI MJPG).
+Uzun kayıtlar rec_<zaman>_partNNN parçalarına bölünür; kapanan parçalar
+get_published_segments() ile kayıt sürerken indirilebilir. Kayıt kapalıyken
+son PREROLL_SEC saniye (etkinse) JPEG olarak tutulur ve yeni kaydın başına yazılır.
+Kareler frame_hub.Frame (değişmez, salt okunur) olarak referansla alınır;
+kopyalanmaz. Kamera MJPEG veriyorsa (Frame.jpeg) kareler çözülüp yeniden
+kodlanmadan avi_mjpeg ile doğrudan dosyaya yazılır.
 Ayrıca dosyaları listeleme, indirme, isim değiştirme ve silme için
 Flask Blueprint sağlar.
 
 Main uygulamasıyla entegrasyon için:
-- main.generate_frames içinde her kare için push_frame(frame) çağrılmalı.
-- uygulama başlarken start_background() çağrılmalı.
+- uygulama başlarken start_background(frame_source=camera_hub) çağrılmalı;
+  kayıt, yakalama thread'inin yayınladığı karelere süreç içinde abone olur
+  (HTTP istemcisi bağlı olmasa da kareler gelir).
 - blueprint main üzerinde register_blueprint ile bağlanmalı.
 """
 from __future__ import annotations
 import os
 import cv2
+import math
 import time
 import threading
 import logging
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Callable
 from queue import Queue, Empty
-import http.client
+from concurrent.futures import ThreadPoolExecutor
 from collections import deque
 import shutil
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory, session
+import frame_hub
+import record_backends
+import file_response
+from frame_hub import Frame
+from native_io import native as _native
+
+# Oturum/dosya dizini (yoksa listeler her istekte klasör taranarak üretilir)
+try:
+    import records_index
+except Exception:
+    records_index = None
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, abort
 
 # Merkezi loglama sistemi
 try:
@@ -41,11 +62,6 @@ SESSION_PREFIX = os.environ.get("SESSION_PREFIX", "oturum")
 SESSION_NAME: Optional[str] = None
 SESSION_DIR: Optional[str]  = None
 
-# Local feed ayarı
-_FEED_HOST = os.environ.get("FEED_HOST", "127.0.0.1")
-_FEED_PORT = int(os.environ.get("PORT", os.environ.get("FEED_PORT", "7447")))
-_FEED_PATH = os.environ.get("FEED_PATH", "/video_feed")
-
 LOG = logging.getLogger(__name__)
 if not LOG.handlers:
     LOG.setLevel(logging.INFO)
@@ -55,7 +71,7 @@ if not LOG.handlers:
 
 # ============================ Frame Akışı ==============================
 _last_frame_lock = threading.Lock()
-_last_frame = None  # type: Optional[any]  # numpy.ndarray
+_last_frame = None  # type: Optional[Frame]
 _last_frame_ts = 0.0
 
 RECORD_FPS = float(os.environ.get("RECORD_FPS", "18"))
@@ -64,6 +80,12 @@ RECORD_FPS_MAX = float(os.environ.get("RECORD_FPS_MAX", "30"))
 FILL_MISSING_FRAMES = (os.environ.get("FILL_MISSING_FRAMES", "1").strip() not in ("0","false","False"))
 FILL_MAX_GAP_SEC = float(os.environ.get("FILL_MAX_GAP_SEC", "10"))  # boşluk doldurma üst limiti
 
+# AVI için kendi MJPEG muxer'ımızı kullan: kamera JPEG veriyorsa kareler yeniden
+# kodlanmadan yazılır, vermiyorsa kodlama havuzunda JPEG'e çevrilir.
+# Kapalıysa (veya muxer açılamazsa) cv2.VideoWriter kullanılır.
+RECORD_MJPEG_PASSTHROUGH = (os.environ.get("RECORD_MJPEG_PASSTHROUGH", "1").strip() not in ("0","false","False"))
+RECORD_JPEG_QUALITY = int(os.environ.get("RECORD_JPEG_QUALITY", "85"))
+
 FRAME_SIZE = None  # son gelen gerçek frame boyutu (w,h)
 WRITER_SIZE = None  # aktif writer hedef boyutu (w,h)
 
@@ -72,21 +94,463 @@ _manual_control_mode = threading.Lock()  # Manuel kontrol aktif mi?
 _manual_control_active = False  # True ise GPIO watcher pasif
 _stop_all = threading.Event()
 _writer_lock = threading.Lock()
-_writer = None  # type: Optional[cv2.VideoWriter]
+_writer = None  # record_backends writer'ı
+_writer_passthrough = False  # aktif writer sıkıştırılmış JPEG mi bekliyor?
+_last_backend_stats = None  # type: Optional[dict]  # son kapanan writer'ın istatistikleri
 _current_file = None  # type: Optional[str]
 _writer_fps = RECORD_FPS  # aktif writer fps
 
-# Yeni: kayıt için zaman damgalı kare kuyruğu (drop-on-full)
-# Eleman: (frame: np.ndarray, ts: float)
-_frame_q: Queue = Queue(maxsize=int(os.environ.get("RECORD_QUEUE_MAX", "300")))
+# Kayıt kuyruğu: byte bütçeli (kare sayısı değil); dolunca RECORD_QUEUE_POLICY uygulanır
+#   drop_oldest: en eski kareler atılır (varsayılan)
+#   drop_newest: gelen kare atılır (eski davranış)
+#   decimate:    kuyruktaki karelerin yarısı (her iki kareden biri) atılır; süre
+#                kapsamı korunur, CFR boşlukları tekrarla doldurur
+#   degrade:     kuyruk RECORD_QUEUE_DEGRADE_AT doluluğunu aşınca gelen ham kareler
+#                küçültülerek saklanır (writer hedef boyuta geri büyütür); bütçe
+#                yine aşılırsa en eskiler atılır
+RECORD_QUEUE_MAX_MB = float(os.environ.get("RECORD_QUEUE_MAX_MB", "48"))
+RECORD_QUEUE_MAX = int(os.environ.get("RECORD_QUEUE_MAX", "300"))  # kare sayısı üst sınırı (ikincil)
+RECORD_QUEUE_POLICY = os.environ.get("RECORD_QUEUE_POLICY", "drop_oldest").strip().lower()
+RECORD_QUEUE_DEGRADE_AT = float(os.environ.get("RECORD_QUEUE_DEGRADE_AT", "0.5"))
+RECORD_QUEUE_DEGRADE_SCALE = float(os.environ.get("RECORD_QUEUE_DEGRADE_SCALE", "0.5"))
+
+
+def _frame_nbytes(frame) -> int:
+    """Karenin kuyrukta tuttuğu bellek: çözülmemiş JPEG ise byte'ları, değilse BGR."""
+    if frame.jpeg is not None and frame._image is None:
+        return len(frame.jpeg)
+    w, h = frame.size
+    return w * h * 3
+
+
+class _FrameQueue:
+    """Byte ile sınırlı, tek tüketicili kare kuyruğu (queue.Queue arayüzü).
+
+    put_nowait() hiç beklemez; bütçe aşılırsa politika uygulanır ve atılan
+    kareler release() edilir. Sayaçlar stats() ile okunur.
+    """
+
+    POLICIES = ("drop_oldest", "drop_newest", "decimate", "degrade")
+
+    def __init__(self, max_bytes: int, max_items: int, policy: str = "drop_oldest"):
+        if policy not in self.POLICIES:
+            LOG.warning(f"Bilinmeyen RECORD_QUEUE_POLICY={policy}, drop_oldest kullanılacak")
+            policy = "drop_oldest"
+        self.max_bytes = max(1, int(max_bytes))
+        self.max_items = max(1, int(max_items))
+        self.policy = policy
+        self._items = deque()  # (frame, nbytes)
+        self._bytes = 0
+        self._cond = threading.Condition()
+        self.enqueued = 0
+        self.dropped = 0
+        self.degraded = 0
+        self.high_water_bytes = 0
+        self.high_water_items = 0
+        self._last_warn = 0.0
+
+    def _full(self, extra: int = 0, extra_items: int = 0) -> bool:
+        return (self._bytes + extra > self.max_bytes
+                or len(self._items) + extra_items > self.max_items)
+
+    def _pop_oldest(self):
+        frame, n = self._items.popleft()
+        self._bytes -= n
+        return frame
+
+    @staticmethod
+    def _degrade(frame):
+        """Ham kareyi küçültülmüş, havuzsuz bir kopyayla değiştir (kilit dışında
+        çağrılır; küçültme OS thread'inde). Küçültülmediyse None."""
+        if frame._image is None and frame.jpeg is not None:
+            return None  # zaten sıkıştırılmış
+        w, h = frame.size
+        size = (max(2, int(w * RECORD_QUEUE_DEGRADE_SCALE)), max(2, int(h * RECORD_QUEUE_DEGRADE_SCALE)))
+        small = _native(cv2.resize, frame.image, size, None, 0, 0, cv2.INTER_AREA)
+        return Frame(frame.seq, frame.ts, image=small)
+
+    def put_nowait(self, frame):
+        victims = []
+        degraded = False
+        if self.policy == "degrade":
+            with self._cond:
+                backlog = self._bytes > self.max_bytes * RECORD_QUEUE_DEGRADE_AT
+            if backlog:
+                # Küçültme kuyruk kilidi dışında: tüketici ve diğer üreticiler beklemez
+                small = self._degrade(frame)
+                if small is not None:
+                    frame.release()
+                    frame, degraded = small, True
+        with self._cond:
+            self.degraded += degraded
+            n = _frame_nbytes(frame)
+            if self._full(n, 1):
+                if self.policy == "drop_newest":
+                    victims.append(frame)
+                    frame = None
+                elif self.policy == "decimate" and len(self._items) > 1:
+                    # her iki kareden birini at (en yenisi korunur)
+                    kept = deque()
+                    for i, (f, fn) in enumerate(reversed(self._items)):
+                        if i % 2:
+                            victims.append(f)
+                            self._bytes -= fn
+                        else:
+                            kept.appendleft((f, fn))
+                    self._items = kept
+                while frame is not None and self._items and self._full(n, 1):
+                    victims.append(self._pop_oldest())
+            if frame is not None:
+                self._items.append((frame, n))
+                self._bytes += n
+                self.enqueued += 1
+                self.high_water_bytes = max(self.high_water_bytes, self._bytes)
+                self.high_water_items = max(self.high_water_items, len(self._items))
+                self._cond.notify()
+            self.dropped += len(victims)
+        for f in victims:
+            f.release()
+        if victims and time.monotonic() - self._last_warn > 10.0:
+            self._last_warn = time.monotonic()
+            LOG.warning(f"Kayıt kuyruğu dolu ({self.policy}): writer geride kalıyor, "
+                        f"toplam {self.dropped} kare atıldı, {self.degraded} küçültüldü")
+
+    def get(self, timeout: Optional[float] = None):
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+                if not self._items:
+                    raise Empty
+            return self._pop_oldest()
+
+    def get_nowait(self):
+        with self._cond:
+            if not self._items:
+                raise Empty
+            return self._pop_oldest()
+
+    def qsize(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "policy": self.policy,
+                "items": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_items": self.max_items,
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "degraded": self.degraded,
+                "high_water_bytes": self.high_water_bytes,
+                "high_water_items": self.high_water_items,
+            }
+
+
+# Kayıt için zaman damgalı kare kuyruğu. Eleman: frame_hub.Frame (ts alanı zaman damgasıdır)
+_frame_q = _FrameQueue(int(RECORD_QUEUE_MAX_MB * 1024 * 1024), RECORD_QUEUE_MAX, RECORD_QUEUE_POLICY)
+
+
+def get_queue_stats() -> dict:
+    """Kayıt kuyruğu sayaçları: doluluk, atılan/küçültülen kareler ve en yüksek seviye."""
+    return _frame_q.stats()
+
+
+# Kodlama/yazma hattı: writer thread'i (aşama 1) CFR yerleşimini yapıp her kareyi
+# kodlama havuzuna verir; tek muxer thread'i (aşama 2) sonuçları sırayla dosyaya
+# yazar. Kodlanmış kare tamponu (RECORD_MUX_BUFFER) disk takılmalarını emer;
+# tampon da dolarsa baskı byte bütçeli kare kuyruğuna geri yansır.
+RECORD_ENCODE_WORKERS = max(1, int(os.environ.get("RECORD_ENCODE_WORKERS", "2")))
+RECORD_MUX_BUFFER = max(2, int(os.environ.get("RECORD_MUX_BUFFER", "64")))
+RECORD_CLOSE_TIMEOUT = float(os.environ.get("RECORD_CLOSE_TIMEOUT", "30"))
+
+
+_encode_pool = ThreadPoolExecutor(max_workers=RECORD_ENCODE_WORKERS, thread_name_prefix="rec-enc")
+_mux_q: Queue = Queue(maxsize=RECORD_MUX_BUFFER)
+_mux_thread = None  # type: Optional[threading.Thread]
+_pipe_lock = threading.Lock()
+_pipe_stats = {
+    "encoded": 0, "encode_ms_total": 0.0,
+    "written": 0, "write_ms_total": 0.0, "write_ms_max": 0.0,
+    "buffer_high_water": 0,
+}
+
+
+def get_pipeline_stats() -> dict:
+    """Kodlama havuzu ve muxer istatistikleri (kare başına ortalama süreler, tampon doluluğu)."""
+    with _pipe_lock:
+        st = dict(_pipe_stats)
+    return {
+        "workers": RECORD_ENCODE_WORKERS,
+        "buffer": _mux_q.qsize(),
+        "buffer_max": RECORD_MUX_BUFFER,
+        "buffer_high_water": st["buffer_high_water"],
+        "encoded": st["encoded"],
+        "avg_encode_ms": round(st["encode_ms_total"] / st["encoded"], 2) if st["encoded"] else None,
+        "written": st["written"],
+        "avg_write_ms": round(st["write_ms_total"] / st["written"], 2) if st["written"] else None,
+        "max_write_ms": round(st["write_ms_max"], 1),
+    }
+
+
+# Disk izleme: boş alan RECORD_DISK_CHECK_SEC'de bir kontrol edilir.
+#   RECORD_DISK_DEGRADE_MB altında "low": JPEG kalitesi düşürülür (kamera JPEG'leri
+#       de yeniden kodlanır), JPEG kabul etmeyen arka uçlarda kareler seyreltilir
+#   RECORD_DISK_STOP_MB altında "full": dosya kapatılır, alan açılana dek kayıt yapılmaz
+# Muxer her RECORD_FSYNC_SEC saniyede fdatasync yapar (güç kesintisinde kayıp
+# en fazla bu kadar olur) ve pencere başına disk hızını ölçer: G/Ç süresi duvar
+# süresinin RECORD_DISK_BUSY_WARN oranını aşarsa disk üretilen veri hızına yetişemiyordur.
+RECORD_FSYNC_SEC = float(os.environ.get("RECORD_FSYNC_SEC", "2"))           # 0 = yalnızca dosya kapanırken
+RECORD_DISK_WINDOW_SEC = float(os.environ.get("RECORD_DISK_WINDOW_SEC", "2"))
+RECORD_DISK_CHECK_SEC = float(os.environ.get("RECORD_DISK_CHECK_SEC", "5"))
+RECORD_DISK_DEGRADE_MB = float(os.environ.get("RECORD_DISK_DEGRADE_MB", "1024"))
+RECORD_DISK_STOP_MB = float(os.environ.get("RECORD_DISK_STOP_MB", "256"))
+RECORD_DISK_DEGRADE_QUALITY = int(os.environ.get("RECORD_DISK_DEGRADE_QUALITY", "60"))
+RECORD_DISK_BUSY_WARN = float(os.environ.get("RECORD_DISK_BUSY_WARN", "0.8"))
+
+_disk_lock = threading.Lock()
+_disk_state = "ok"  # ok | low | full
+_disk_stats = {
+    "free_mb": None, "checked": None,
+    "busy": None, "disk_kbps": None, "produced_kbps": None, "last_sync_ms": None,
+    "slow_windows": 0, "slow_warnings": 0, "degraded_since": None, "stopped_since": None,
+}
+
+
+def _check_disk() -> str:
+    """Boş alanı ölç, durumu güncelle ve döndür (geçişler loglanır)."""
+    global _disk_state
+    try:
+        free_mb = shutil.disk_usage(RECORDS_DIR).free / (1024 * 1024)
+    except Exception as e:
+        LOG.error(f"Disk alanı okunamadı: {e}")
+        return _disk_state
+    if free_mb < RECORD_DISK_STOP_MB:
+        state = "full"
+    elif free_mb < RECORD_DISK_DEGRADE_MB:
+        state = "low"
+    else:
+        state = "ok"
+    with _disk_lock:
+        old = _disk_state
+        _disk_state = state
+        _disk_stats["free_mb"] = round(free_mb, 1)
+        _disk_stats["checked"] = time.time()
+        if state != old:
+            _disk_stats["degraded_since"] = time.time() if state == "low" else None
+            _disk_stats["stopped_since"] = time.time() if state == "full" else None
+    if state != old:
+        level = "INFO" if state == "ok" else ("WARNING" if state == "low" else "ERROR")
+        msg = {"ok": "Disk alanı normale döndü",
+               "low": "Disk alanı azaldı, kayıt kalitesi düşürülüyor",
+               "full": "Disk dolmak üzere, kayıt durduruldu"}[state]
+        getattr(LOG, level.lower())(f"{msg} (boş: {free_mb:.0f} MB)")
+        if syslog:
+            try:
+                syslog.log_system_event("RECORD_DISK_STATE", msg, level, state=state, free_mb=round(free_mb, 1))
+            except Exception:
+                pass
+    return state
+
+
+def _disk_loop():
+    while not _stop_all.is_set():
+        _check_disk()
+        _stop_all.wait(RECORD_DISK_CHECK_SEC)
+
+
+def _note_disk_window(writer, sync_ms: Optional[float]):
+    """Muxer'dan: writer'ın son penceresini değerlendir, disk yetişemiyorsa uyar."""
+    delta, io_s, wall_s = writer.take_window()
+    busy = io_s / wall_s
+    warn = False
+    with _disk_lock:
+        prev = _disk_stats["busy"]
+        _disk_stats["busy"] = round(busy if prev is None else 0.7 * prev + 0.3 * busy, 3)
+        _disk_stats["disk_kbps"] = writer.disk_kbps
+        _disk_stats["produced_kbps"] = writer.produced_kbps
+        if sync_ms is not None:
+            _disk_stats["last_sync_ms"] = round(sync_ms, 1)
+        if _disk_stats["busy"] > RECORD_DISK_BUSY_WARN:
+            _disk_stats["slow_windows"] += 1
+            # Sürekli yavaşlık: art arda 3 pencere
+            if _disk_stats["slow_windows"] == 3:
+                _disk_stats["slow_warnings"] += 1
+                warn = True
+        else:
+            _disk_stats["slow_windows"] = 0
+    if warn:
+        LOG.warning(f"Disk yazma hızı üretilen veriye yetişmiyor: disk {writer.disk_kbps} kbps, "
+                    f"üretilen {writer.produced_kbps} kbps (G/Ç meşguliyeti {busy:.0%})")
+        if syslog:
+            try:
+                syslog.log_system_event("RECORD_DISK_SLOW", "Disk yazma hızı yetersiz", "WARNING",
+                                        disk_kbps=writer.disk_kbps, produced_kbps=writer.produced_kbps)
+            except Exception:
+                pass
+
+
+def _jpeg_quality() -> int:
+    return RECORD_DISK_DEGRADE_QUALITY if _disk_state == "low" else RECORD_JPEG_QUALITY
 
-# FPS ölçümü için kısa zaman geçmişi
-_ts_hist = deque(maxlen=120)
+
+def get_disk_stats() -> dict:
+    """Disk durumu (ok/low/full), boş alan, G/Ç meşguliyeti ve disk/üretim hızları."""
+    with _disk_lock:
+        info = dict(_disk_stats)
+        info["state"] = _disk_state
+    info.update({
+        "degrade_below_mb": RECORD_DISK_DEGRADE_MB,
+        "stop_below_mb": RECORD_DISK_STOP_MB,
+        "fsync_sec": RECORD_FSYNC_SEC,
+    })
+    return info
+
+
+class _FpsMeter:
+    """Kare aralığının üstel hareketli ortalaması (kare başına O(1))."""
+
+    def __init__(self, alpha: float = 0.05, max_dt: float = 1.0):
+        self.alpha = alpha
+        self.max_dt = max_dt  # daha uzun aralıklar (kesinti) ortalamaya katılmaz
+        self._last_ts = None
+        self._dt = None
+        self.samples = 0
+
+    def note(self, ts: float):
+        last, self._last_ts = self._last_ts, ts
+        if last is None:
+            return
+        dt = ts - last
+        if dt <= 0 or dt > self.max_dt:
+            return
+        self._dt = dt if self._dt is None else self._dt + self.alpha * (dt - self._dt)
+        self.samples += 1
+
+    def fps(self) -> Optional[float]:
+        if self._dt is None or self._dt <= 0:
+            return None
+        return 1.0 / self._dt
+
+
+class _CfrResampler:
+    """Yakalama zaman damgalarını sabit kare hızlı (CFR) çıktı slotlarına eşler.
+
+    Slot k'nin zamanı t0 + k/fps'tir; her kare kendisine en yakın slota düşer.
+    Arada boş kalan slotlar önceki kareyle doldurulur (çoğaltma), zaten dolu
+    slota düşen kare atılır. Karar yalnızca zaman damgasına bağlıdır, bu yüzden
+    aynı girdi her zaman aynı dosyayı üretir ve zaman çizelgesi kaymaz.
+    FILL_MAX_GAP_SEC'ten uzun kesintiler doldurulmaz; çizelge yeni kareye
+    yeniden bağlanır ve atlanan süre istatistiklere yazılır.
+    """
+
+    def __init__(self, fps: float, max_gap_sec: float = FILL_MAX_GAP_SEC, fill: bool = FILL_MISSING_FRAMES):
+        self.fps = fps
+        self.period = 1.0 / max(1e-3, fps)
+        self.max_gap = max(0.0, max_gap_sec)
+        self.fill = fill
+        self._t0 = None
+        self._first_ts = None
+        self._last_ts = None
+        self._next_slot = 0
+        self.frames_in = 0
+        self.emitted = 0
+        self.duplicated = 0
+        self.dropped = 0
+        self.gaps_skipped = 0
+        self.skipped_sec = 0.0
+        self._err_sum = 0.0
+        self._err_max = 0.0
+
+    def place(self, ts: float) -> int:
+        """Karenin kapladığı slot sayısını döndür.
+        0: kare atılır; n >= 1: önceki kare (n-1) kez, ardından bu kare yazılır.
+        """
+        self.frames_in += 1
+        if self._t0 is None:
+            self._t0 = self._first_ts = ts
+        slot = int(math.floor((ts - self._t0) / self.period + 0.5))
+        if slot < self._next_slot:
+            self.dropped += 1
+            return 0
+        gap = slot - self._next_slot
+        if gap and (not self.fill or (self.max_gap > 0 and gap * self.period >= self.max_gap)):
+            # Doldurulmayacak boşluk: çizelgeyi bu kareye yeniden bağla
+            self.gaps_skipped += 1
+            self.skipped_sec += gap * self.period
+            self._t0 += gap * self.period
+            slot, gap = self._next_slot, 0
+        err = ts - (self._t0 + slot * self.period)
+        self._err_sum += err
+        self._err_max = max(self._err_max, abs(err))
+        self._next_slot = slot + 1
+        self._last_ts = ts
+        self.duplicated += gap
+        self.emitted += gap + 1
+        return gap + 1
+
+    def stats(self) -> dict:
+        """Dosya başına zaman çizelgesi istatistikleri.
+        drift_ms: dosya süresi ile yakalanan (doldurulmayan boşluklar hariç) süre farkı.
+        """
+        captured = 0.0
+        if self._first_ts is not None:
+            captured = self._last_ts - self._first_ts + self.period - self.skipped_sec
+        return {
+            "fps": round(self.fps, 3),
+            "frames_in": self.frames_in,
+            "frames_out": self.emitted,
+            "duplicated": self.duplicated,
+            "dropped": self.dropped,
+            "gaps_skipped": self.gaps_skipped,
+            "skipped_sec": round(self.skipped_sec, 3),
+            "drift_ms": round((self.emitted * self.period - captured) * 1000.0, 2),
+            "mean_err_ms": round(self._err_sum * 1000.0 / self.emitted, 2) if self.emitted else None,
+            "max_err_ms": round(self._err_max * 1000.0, 2),
+        }
+
+
+# FPS ölçümü (EWMA) ve aktif dosyanın CFR eşleyicisi
+_fps_meter = _FpsMeter()
+_cfr = None  # type: Optional[_CfrResampler]
+_last_timeline_stats = None  # type: Optional[dict]  # son kapanan dosyanın istatistikleri
 
 # Video süresi kontrolü için (2 saniyeden kısa videoları silmek için)
 _record_start_time = None
 MIN_VIDEO_DURATION = float(os.environ.get("MIN_VIDEO_DURATION", "2.0"))  # Minimum video süresi (saniye)
 
+# Parçalı kayıt: bir kayıt rec_<zaman>_partNNN dosyalarına bölünür. Kesim kare
+# sınırında, writer thread'i içinde yapılır; kuyruktaki kareler yeni parçaya
+# yazılır (kare kaybı yok). Kapanan parça hemen yayınlanır (indirilebilir).
+RECORD_SEGMENT_SEC = float(os.environ.get("RECORD_SEGMENT_SEC", "300"))     # 0 = süreye göre bölme yok
+RECORD_SEGMENT_MAX_MB = float(os.environ.get("RECORD_SEGMENT_MAX_MB", "0"))  # 0 = boyuta göre bölme yok
+RECORD_SEGMENT_HISTORY = int(os.environ.get("RECORD_SEGMENT_HISTORY", "200"))
+SEGMENTING = RECORD_SEGMENT_SEC > 0 or RECORD_SEGMENT_MAX_MB > 0
+
+_current_path = None  # type: Optional[str]
+_take_stamp = None  # type: Optional[str]  # kaydın (tüm parçaların) ortak zaman damgası
+_segment_index = 0
+_segment_frames = 0  # aktif parçaya yazılan kare (slot) sayısı
+_segments_lock = threading.Lock()
+_published_segments = deque(maxlen=RECORD_SEGMENT_HISTORY)  # kapanan parçalar (eskiden yeniye)
+_segment_listeners = []  # type: List[Callable[[dict], None]]
+
+# Ön kayıt (pre-roll): kayıt kapalıyken son PREROLL_SEC saniyenin kareleri
+# sıkıştırılmış JPEG olarak halkada tutulur ve yeni kaydın başına yazılır.
+# Varsayılan kapalıdır (0): açıkken kareler kayıt yokken de sürekli işlenir.
+# Kamera JPEG veriyorsa ya da kare bir izleyici için zaten kodlandıysa o byte'lar
+# kullanılır; yalnızca ikisi de yoksa writer thread'inde kodlanır. Bellek hem
+# süre hem byte ile sınırlıdır.
+PREROLL_SEC = float(os.environ.get("PREROLL_SEC", "0"))
+PREROLL_MAX_MB = float(os.environ.get("PREROLL_MAX_MB", "24"))
+PREROLL_JPEG_QUALITY = int(os.environ.get("PREROLL_JPEG_QUALITY", str(RECORD_JPEG_QUALITY)))
+_preroll_lock = threading.Lock()
+_preroll = deque()  # type: deque  # (ts, jpeg bytes, (w, h)) eskiden yeniye
+_preroll_bytes = 0
+_frame_source = None  # start_background'a verilen FrameHub (JPEG önbelleği için)
+
 
 # ----------------------- Oturum klasörü yönetimi ------------------------
 import re
@@ -113,6 +577,7 @@ def _ensure_session_dir():
     try:
         os.makedirs(SESSION_DIR, exist_ok=True)
         LOG.info(f"Oturum klasörü hazır: {SESSION_NAME}")
+        index_note("note_session", SESSION_NAME)
     except Exception as e:
         LOG.error(f"Oturum klasörü oluşturulamadı: {e}")
         # geri dönüş: kök klasör
@@ -123,49 +588,82 @@ def _ensure_session_dir():
 # _ensure_session_dir()  # Bu satırı kaldırıyoruz - sadece start_background'da çağrılacak
 
 
-def push_frame(frame):
-    """Ana akıştan son kareyi paylaş. Frame kopyası alınır.
-    Kayıt açıkken kare kuyruğuna (taşma olursa drop) zaman damgasıyla eklenir.
+def push_frame(frame, ts: Optional[float] = None):
+    """Ana akıştan son kareyi paylaş. Frame değişmez olduğundan kopya alınmaz;
+    çıplak ndarray verilirse (sahipliği bizde olmadığı için) bir kez kopyalanır.
+    Kayıt açıkken (ön kayıt etkinse her zaman) kare kuyruğuna (taşma olursa
+    drop) eklenir. Havuz tamponlu karelerde son kare ve kuyruktaki her kare için ayrı referans
+    tutulur (retain); writer işi bitince bırakır.
     """
     global _last_frame, _last_frame_ts, FRAME_SIZE
     try:
         if frame is None:
             return
-        ts = time.time()
+        if not isinstance(frame, Frame):
+            frame = Frame(0, ts if ts is not None else time.time(), image=frame_hub.copy_image(frame))
+        ts = frame.ts
         # Son kareyi güncelle
         with _last_frame_lock:
-            _last_frame = frame.copy()
+            old = _last_frame
+            _last_frame = frame.retain()
             _last_frame_ts = ts
-            h, w = _last_frame.shape[:2]
-            FRAME_SIZE = (w, h)
-        # fps ölçüm geçmişi
-        _ts_hist.append(ts)
-        # Kayıt açıkken kuyruğa ekle (non-blocking)
-        if _recording_flag.is_set():
-            try:
-                _frame_q.put_nowait((_last_frame, ts))
-            except Exception:
-                # kuyruk dolu: kare düşür
-                pass
+            FRAME_SIZE = frame.size
+        if old is not None:
+            old.release()
+        # fps ölçümü (O(1))
+        _fps_meter.note(ts)
+        # Kayıt açıkken kuyruğa ekle (non-blocking); kayıt kapalıyken writer
+        # thread'i kuyruktaki kareleri ön kayıt halkasına alır
+        if _recording_flag.is_set() or PREROLL_SEC > 0:
+            # Bütçe aşılırsa kuyruk politikası uygular (atılanları release eder)
+            _frame_q.put_nowait(frame.retain())
     except Exception as e:
         LOG.error(f"push_frame hatası: {e}")
 
 
 def _estimate_fps() -> float:
-    """Son zaman damgalarından yaklaşık FPS tahmin et ve sınırla."""
-    if len(_ts_hist) >= 10:
-        dts = [b - a for a, b in zip(list(_ts_hist)[:-1], list(_ts_hist)[1:]) if b > a]
-        if dts:
-            avg_dt = sum(dts) / len(dts)
-            if avg_dt > 0:
-                fps = 1.0 / avg_dt
-                return max(RECORD_FPS_MIN, min(RECORD_FPS_MAX, fps))
+    """Ölçülen (EWMA) FPS'i sınırlayarak döndür; yeterli örnek yoksa RECORD_FPS."""
+    fps = _fps_meter.fps()
+    if _fps_meter.samples >= 10 and fps:
+        return max(RECORD_FPS_MIN, min(RECORD_FPS_MAX, fps))
     return RECORD_FPS
 
 
-def _open_writer(size: Optional[tuple]=None, fps: Optional[float]=None) -> Optional[cv2.VideoWriter]:
-    """Yeni bir dosya aç ve writer döndür."""
-    global _current_file, WRITER_SIZE, _writer_fps, _record_start_time
+def get_timeline_stats() -> Optional[dict]:
+    """Aktif (yoksa son kapanan) kayıt dosyasının CFR zaman çizelgesi istatistikleri."""
+    cfr = _cfr
+    if cfr is not None:
+        info = cfr.stats()
+        info["file"] = _current_file
+    else:
+        info = dict(_last_timeline_stats) if _last_timeline_stats else None
+    if info is not None:
+        measured = _fps_meter.fps()
+        info["measured_fps"] = round(measured, 2) if measured else None
+    return info
+
+
+def get_backend_stats() -> Optional[dict]:
+    """Aktif (yoksa son kapanan) kayıt arka ucunun istatistikleri:
+    backend, frames, dropped, encode_fps, bitrate_kbps."""
+    writer = _writer
+    if writer is not None:
+        try:
+            return writer.stats()
+        except Exception:
+            return None
+    return dict(_last_backend_stats) if _last_backend_stats else None
+
+
+def _open_writer(size: Optional[tuple]=None, fps: Optional[float]=None, passthrough: bool=False,
+                 part: Optional[int]=None):
+    """Yeni bir dosya aç ve writer döndür.
+    Arka uç record_backends.open_backend ile seçilir; passthrough=True ise
+    harici kodlayıcı yoksa hazır JPEG'leri doğrudan yazan MJPEG muxer kullanılır.
+    part verilirse aynı kaydın sıradaki parçası açılır, aksi halde yeni kayıt başlar.
+    """
+    global _current_file, WRITER_SIZE, _writer_fps, _record_start_time, _writer_passthrough, _cfr
+    global _current_path, _take_stamp, _segment_index, _segment_frames
     if size is None:
         size = FRAME_SIZE or (640, 480)
     # FPS seçimi
@@ -173,19 +671,23 @@ def _open_writer(size: Optional[tuple]=None, fps: Optional[float]=None) -> Optio
     # Çok uç değerleri sınırlama
     fps_use = max(RECORD_FPS_MIN, min(RECORD_FPS_MAX, fps_use))
 
-    timestr = datetime.now().strftime("%Y%m%d_%H%M%S")
-    fname = f"rec_{timestr}.avi"
+    if part is None or _take_stamp is None:
+        take_stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        part = 1
+    else:
+        take_stamp = _take_stamp
+    stem = f"rec_{take_stamp}_part{part:03d}" if SEGMENTING else f"rec_{take_stamp}"
     # Oturum klasörü varsa oraya yaz
     target_dir = SESSION_DIR if SESSION_DIR else RECORDS_DIR
     try:
         os.makedirs(target_dir, exist_ok=True)
     except Exception:
         target_dir = RECORDS_DIR
-    path = os.path.join(target_dir, fname)
-    fourcc = cv2.VideoWriter_fourcc(*"MJPG")
-    writer = cv2.VideoWriter(path, fourcc, fps_use, size)
-    if not writer or not writer.isOpened():
-        LOG.error("VideoWriter açılamadı; farklı codec/uzantı deneyin.")
+    base = os.path.join(target_dir, stem)
+    writer = record_backends.open_backend(base, fps_use, tuple(size), passthrough=passthrough)
+    if writer is None:
+        path = base + ".avi"
+        LOG.error("Hiçbir kayıt arka ucu açılamadı; farklı codec/uzantı deneyin.")
         # Hata logu
         if syslog:
             try:
@@ -196,11 +698,22 @@ def _open_writer(size: Optional[tuple]=None, fps: Optional[float]=None) -> Optio
             except Exception:
                 pass
         return None
+    path = writer.path
+    fname = os.path.basename(path)
     WRITER_SIZE = size
     _current_file = fname
+    _current_path = path
+    _take_stamp = take_stamp
+    _segment_index = part
+    _segment_frames = 0
     _writer_fps = fps_use
+    _writer_passthrough = writer.accepts_jpeg
+    _cfr = _CfrResampler(fps_use)
     _record_start_time = time.time()  # Kayıt başlangıç zamanını kaydet
-    LOG.info(f"Kayıt başladı: {fname} @ {_writer_fps:.2f}fps {size} -> {target_dir}")
+    LOG.info(f"Kayıt başladı: {fname} @ {_writer_fps:.2f}fps {size} [{writer.name}] -> {target_dir}")
+    if target_dir != RECORDS_DIR:
+        index_note("note_file", os.path.basename(target_dir), fname, fps=round(fps_use, 3),
+                    width=size[0], height=size[1], backend=writer.name)
 
     # Kayıt başlama logu
     if syslog:
@@ -215,155 +728,488 @@ def _open_writer(size: Optional[tuple]=None, fps: Optional[float]=None) -> Optio
     return writer
 
 
-def _close_writer():
-    global _writer, _current_file, _record_start_time
+def _detach_writer() -> Optional[dict]:
+    """Aktif writer'ı ve dosya bilgisini globallerden ayır (_writer_lock altında).
+    Dönen kayıt _finish_segment ile kapatılır."""
+    global _writer, _current_file, _current_path, _record_start_time, _writer_passthrough, _cfr
+    if _writer is None:
+        return None
+    seg = {
+        "writer": _writer,
+        "file": _current_file,
+        "path": _current_path,
+        "session": os.path.basename(os.path.dirname(_current_path)) if _current_path else None,
+        "part": _segment_index,
+        "started": _record_start_time,
+        "frames": _segment_frames,
+        "fps": _writer_fps,
+        "resolution": WRITER_SIZE,
+        "cfr": _cfr,
+    }
+    _writer = None
+    _writer_passthrough = False
+    _cfr = None
+    _current_file = None
+    _current_path = None
+    _record_start_time = None
+    return seg
+
+
+def _finish_segment(seg: dict, final: bool = True):
+    """Ayrılmış writer'ı kapat, istatistikleri kaydet ve dosyayı yayınla.
+    final=True kaydın sonudur (LED söner); yalnızca tek parçalı kısa kayıtlar silinir,
+    parçalı kaydın kısa son parçası kaydın devamı olduğu için tutulur."""
+    global _last_timeline_stats, _last_backend_stats
+    fname = seg["file"]
     try:
-        if _writer is not None:
-            _writer.release()
-            LOG.info(f"Kayıt durdu: {_current_file}")
-
-            # Video süresini kontrol et
-            if _record_start_time is not None and _current_file is not None:
-                duration = time.time() - _record_start_time
-
-                # 2 saniyeden kısa ise dosyayı sil
-                if duration < MIN_VIDEO_DURATION:
-                    target_dir = SESSION_DIR if SESSION_DIR else RECORDS_DIR
-                    file_path = os.path.join(target_dir, _current_file)
-
-                    try:
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                            LOG.info(f"Kısa video silindi: {_current_file} (süre: {duration:.2f}s < {MIN_VIDEO_DURATION}s)")
-
-                            # Silme logu
-                            if syslog:
-                                try:
-                                    syslog.log_system_event("SHORT_VIDEO_DELETED",
-                                                          f"Kısa video otomatik silindi: {_current_file}",
-                                                          "INFO",
-                                                          file=_current_file,
-                                                          duration=duration,
-                                                          min_duration=MIN_VIDEO_DURATION)
-                                except Exception:
-                                    pass
-                        else:
-                            LOG.warning(f"Silinecek dosya bulunamadı: {file_path}")
-                    except Exception as e:
-                        LOG.error(f"Kısa video silinirken hata: {e}")
-                else:
-                    LOG.info(f"Video kaydedildi: {_current_file} (süre: {duration:.2f}s)")
-
-                # Kayıt süresini sıfırla
-                _record_start_time = None
-
-            # LED'i kapat
-            _set_led(False)
+        seg["writer"].release()
+        if RECORD_FSYNC_SEC > 0 and seg["path"]:
+            try:
+                record_backends.sync_path(seg["path"])
+            except OSError as e:
+                LOG.error(f"Kapanışta fdatasync hatası: {e}")
+        LOG.info(f"Kayıt durdu: {fname}")
+        try:
+            bs = seg["writer"].stats()
+            _last_backend_stats = bs
+            LOG.info(f"Kodlayıcı ({bs['backend']}): {bs['frames']} kare, {bs['dropped']} düşen, "
+                     f"{bs['encode_fps']}fps, {bs['bitrate_kbps']} kbps")
+        except Exception:
+            bs = None
+        if seg["cfr"] is not None:
+            tl = seg["cfr"].stats()
+            tl["file"] = fname
+            _last_timeline_stats = tl
+            LOG.info(f"Zaman çizelgesi ({fname}): {tl['frames_in']} kare -> {tl['frames_out']} slot "
+                     f"@ {tl['fps']}fps, +{tl['duplicated']} çoğaltma, -{tl['dropped']} atılan, "
+                     f"drift {tl['drift_ms']}ms, en büyük hata {tl['max_err_ms']}ms")
+
+        # Video süresini kontrol et
+        if seg["started"] is not None and fname is not None:
+            duration = time.time() - seg["started"]
+            file_path = seg["path"]
+
+            # 2 saniyeden kısa ise dosyayı sil (parçalı kaydın devam parçaları hariç)
+            if duration < MIN_VIDEO_DURATION and seg["part"] <= 1:
+                try:
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                        index_note("remove_file", seg["session"], fname)
+                        LOG.info(f"Kısa video silindi: {fname} (süre: {duration:.2f}s < {MIN_VIDEO_DURATION}s)")
+
+                        # Silme logu
+                        if syslog:
+                            try:
+                                syslog.log_system_event("SHORT_VIDEO_DELETED",
+                                                      f"Kısa video otomatik silindi: {fname}",
+                                                      "INFO",
+                                                      file=fname,
+                                                      duration=duration,
+                                                      min_duration=MIN_VIDEO_DURATION)
+                            except Exception:
+                                pass
+                    else:
+                        LOG.warning(f"Silinecek dosya bulunamadı: {file_path}")
+                except Exception as e:
+                    LOG.error(f"Kısa video silinirken hata: {e}")
+            else:
+                LOG.info(f"Video kaydedildi: {fname} (süre: {duration:.2f}s)")
+                _publish_segment(seg, duration, bs)
     except Exception as e:
         LOG.error(f"Writer kapatma hatası: {e}")
     finally:
-        _writer = None
-        _current_file = None
-        _record_start_time = None
+        if final:
+            # LED'i kapat
+            _set_led(False)
+
+
+def _publish_segment(seg: dict, duration: float, backend_stats: Optional[dict]):
+    """Kapanmış parçayı listeye ekle ve dinleyicilere (yükleyici vb.) bildir."""
+    try:
+        size = os.path.getsize(seg["path"])
+    except OSError:
+        return
+    info = {
+        "session": seg["session"],
+        "file": seg["file"],
+        "part": seg["part"],
+        "started": seg["started"],
+        "closed": time.time(),
+        "duration": round(duration, 2),
+        "frames": seg["frames"],
+        "fps": seg["fps"],
+        "size": size,
+        "backend": backend_stats.get("backend") if backend_stats else None,
+    }
+    res = seg.get("resolution") or (None, None)
+    index_note("note_file", seg["session"], seg["file"], duration=info["duration"],
+                frames=seg["frames"], fps=round(seg["fps"], 3) if seg["fps"] else None,
+                width=res[0], height=res[1], backend=info["backend"])
+    with _segments_lock:
+        _published_segments.append(info)
+        listeners = list(_segment_listeners)
+    for fn in listeners:
+        try:
+            fn(dict(info))
+        except Exception as e:
+            LOG.error(f"Parça dinleyicisi hatası: {e}")
+
+
+def add_segment_listener(fn: Callable[[dict], None]):
+    """Her parça kapanıp yayınlandığında fn(info) çağrılır (finalize thread'inde)."""
+    with _segments_lock:
+        _segment_listeners.append(fn)
+
+
+def get_published_segments(since: Optional[float] = None) -> List[dict]:
+    """Kapanmış ve indirilebilir parçalar (eskiden yeniye); since verilirse
+    o andan sonra kapananlar."""
+    with _segments_lock:
+        items = list(_published_segments)
+    if since is not None:
+        items = [i for i in items if i["closed"] > since]
+    return [dict(i) for i in items]
 
 
-def _get_latest_frame():
+def _close_writer():
+    """Kaydı bitir: aktif parçayı kapat ve yayınla. Muxer çalışıyorsa kapanış
+    kuyruğa girer; tampondaki kareler yazıldıktan sonra dosya kapatılır."""
+    seg = _detach_writer()
+    if seg is None:
+        return
+    if _mux_thread is None or not _mux_thread.is_alive():
+        _finish_segment(seg, final=True)
+        return
+    done = threading.Event()
+    _mux_q.put(("finish", seg, True, done))
+    if not done.wait(RECORD_CLOSE_TIMEOUT):
+        LOG.error(f"Kayıt kapanışı zaman aşımına uğradı: {seg['file']}")
+
+
+def _segment_due() -> bool:
+    """Aktif parça kesilmeli mi? (arka uç dosya sınırı, süre veya boyut)"""
+    # stop_background writer'ı aynı anda kapatabilir: yerel kopya kilit altında
+    with _writer_lock:
+        writer, path = _writer, _current_path
+    if writer is None or path is None:
+        return False
+    if writer.is_full():
+        return True
+    if RECORD_SEGMENT_SEC > 0 and _segment_frames >= RECORD_SEGMENT_SEC * _writer_fps:
+        return True
+    if RECORD_SEGMENT_MAX_MB > 0:
+        try:
+            return os.path.getsize(path) >= RECORD_SEGMENT_MAX_MB * 1024 * 1024
+        except OSError:
+            return False
+    return False
+
+
+def _rotate_segment() -> bool:
+    """Aynı kaydın sıradaki parçasına geç. Yeni parça aynı writer thread'inde
+    hemen açılır; eskisi muxer sırasında, kendi karelerinden sonra kapatılır.
+    """
+    global _writer
+    with _writer_lock:
+        size, fps, passthrough = WRITER_SIZE, _writer_fps, _writer_passthrough
+        seg = _detach_writer()
+        if seg is None:
+            return False
+        _writer = _open_writer(size, fps=fps, passthrough=passthrough, part=seg["part"] + 1)
+    # Muxer eski parçanın tampondaki karelerini yazdıktan sonra kapatır
+    _mux_q.put(("finish", seg, _writer is None, None))
+    if _writer is None:
+        LOG.error(f"Sıradaki parça açılamadı: {seg['file']}")
+        return False
+    return True
+
+
+def _get_latest_frame() -> Optional[Frame]:
+    """Son kare (retain edilmiş); çağıran release() etmelidir."""
     with _last_frame_lock:
-        return (None if _last_frame is None else _last_frame.copy())
+        return _last_frame.retain() if _last_frame is not None else None
+
+
+def _prepare_for_writer(frame, target, jpeg_out: bool, quality: int = RECORD_JPEG_QUALITY):
+    """Kareyi writer'ın beklediği biçime getir (kodlama havuzunda çalışır).
+    jpeg_out (MJPEG muxer): JPEG byte'ları; kamera JPEG'i boyut uyuyorsa ve kalite
+    düşürülmüyorsa çözülmeden. Diğer arka uçlar (VideoWriter, ffmpeg/GStreamer
+    borusu): hedef boyutta BGR ndarray.
+    """
+    target = tuple(target or frame.size)
+    if frame.jpeg is not None and jpeg_out and frame.size == target and quality == RECORD_JPEG_QUALITY:
+        return frame.jpeg
+    img = frame.image
+    h, w = img.shape[:2]
+    if (w, h) != target:
+        img = cv2.resize(img, target)
+    if jpeg_out:
+        ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        return buf if ok else None
+    return img
+
+
+def _encode_job(frame, target, jpeg_out: bool, quality: int):
+    t0 = time.monotonic()
+    data = _native(_prepare_for_writer, frame, target, jpeg_out, quality)
+    dt = (time.monotonic() - t0) * 1000.0
+    with _pipe_lock:
+        _pipe_stats["encoded"] += 1
+        _pipe_stats["encode_ms_total"] += dt
+    return data
+
+
+def _mux_loop():
+    """Aşama 2: kodlanmış kareleri gönderim sırasıyla yaz; boş slotları önceki
+    kareyle doldur; "finish" mesajında o parçayı (önceki kareleri yazıldıktan
+    sonra) kapat. Yazma çağrıları OS thread'inde çalışır, disk takılması
+    yalnızca bu thread'i bekletir."""
+    prev = None  # (writer, data, item): tekrar için elde tutulan son kare
+    last_sync = last_window = time.monotonic()
+    while True:
+        msg = _mux_q.get()
+        kind = msg[0]
+        if kind == "stop":
+            break
+        if kind == "finish":
+            _, seg, final, done = msg
+            if prev is not None and prev[0] is seg["writer"]:
+                prev[2].release()
+                prev = None
+            if done is not None:
+                _finish_segment(seg, final)
+                done.set()
+            else:
+                # Parça geçişi: kodlayıcının kapanmasını beklemeden sıradaki karelere geç
+                threading.Thread(target=_finish_segment, args=(seg, final),
+                                 name="rec-segment-close", daemon=True).start()
+            continue
+
+        _, writer, fut, item, slots = msg
+        try:
+            data = fut.result()
+        except Exception as e:
+            LOG.error(f"Kare kodlama hatası: {e}")
+            data = None
+        if data is None:
+            item.release()
+            continue
+        if prev is not None and prev[0] is not writer:
+            prev[2].release()
+            prev = None
+        t0 = time.monotonic()
+        written = 0
+        try:
+            # Boş kalan slotları önceki kareyle doldur (hazır veri; yeniden kodlanmaz)
+            if prev is not None:
+                for _ in range(slots - 1):
+                    _native(writer.write, prev[1])
+                    written += 1
+            _native(writer.write, data)
+            written += 1
+        except Exception as e:
+            LOG.error(f"Frame yazma hatası: {e}")
+        dt = (time.monotonic() - t0) * 1000.0
+        writer.note_io(dt)
+        with _pipe_lock:
+            _pipe_stats["written"] += written
+            _pipe_stats["write_ms_total"] += dt
+            _pipe_stats["write_ms_max"] = max(_pipe_stats["write_ms_max"], dt)
+        # Periyodik fdatasync ve disk hızı penceresi
+        now = time.monotonic()
+        sync_ms = None
+        if RECORD_FSYNC_SEC > 0 and now - last_sync >= RECORD_FSYNC_SEC:
+            try:
+                sync_ms = _native(writer.sync)
+            except Exception as e:
+                LOG.error(f"fdatasync hatası: {e}")
+            last_sync = now
+        if now - last_window >= RECORD_DISK_WINDOW_SEC:
+            _note_disk_window(writer, sync_ms)
+            last_window = now
+        if prev is not None:
+            prev[2].release()
+        # item, data ondan türediği (havuz tamponu olabilir) için tekrar bitene dek tutulur
+        prev = (writer, data, item)
+    if prev is not None:
+        prev[2].release()
+
+
+def _preroll_absorb(timeout: float = 0.02):
+    """Kayıt kapalıyken kuyruktaki kareleri JPEG olarak ön kayıt halkasına al.
+    Kamera JPEG veriyorsa ya da hub'ın JPEG önbelleğinde (canlı izleyici için
+    kodlanmış) varsa byte'lar olduğu gibi tutulur; kodlama yalnızca gerekirse."""
+    global _preroll_bytes
+    try:
+        item = _frame_q.get(timeout=timeout)
+    except Empty:
+        return
+    while item is not None:
+        try:
+            data = _frame_source.jpeg.peek_jpeg(item) if _frame_source is not None else item.jpeg
+            if data is None:
+                ok, buf = _native(cv2.imencode, ".jpg", item.image,
+                                  [int(cv2.IMWRITE_JPEG_QUALITY), PREROLL_JPEG_QUALITY])
+                data = buf.tobytes() if ok else None
+            if data is not None:
+                with _preroll_lock:
+                    _preroll.append((item.ts, data, item.size))
+                    _preroll_bytes += len(data)
+        except Exception as e:
+            LOG.error(f"Ön kayıt karesi alınamadı: {e}")
+        finally:
+            item.release()
+        try:
+            item = _frame_q.get_nowait()
+        except Empty:
+            break
+    # Süre ve byte sınırı: en eski kareleri at
+    max_bytes = PREROLL_MAX_MB * 1024 * 1024
+    with _preroll_lock:
+        newest = _preroll[-1][0] if _preroll else 0.0
+        while _preroll and (newest - _preroll[0][0] > PREROLL_SEC or _preroll_bytes > max_bytes):
+            _preroll_bytes -= len(_preroll.popleft()[1])
+
+
+def _preroll_take() -> List[Frame]:
+    """Ön kayıt halkasını boşalt ve kareleri (eskiden yeniye) Frame olarak döndür."""
+    global _preroll_bytes
+    with _preroll_lock:
+        items = list(_preroll)
+        _preroll.clear()
+        _preroll_bytes = 0
+    return [Frame(0, ts, jpeg=data, size=size) for ts, data, size in items]
+
+
+def get_preroll_stats() -> dict:
+    """Ön kayıt halkasının durumu (kayıt açıkken boştur)."""
+    with _preroll_lock:
+        span = _preroll[-1][0] - _preroll[0][0] if len(_preroll) > 1 else 0.0
+        frames, nbytes = len(_preroll), _preroll_bytes
+    return {
+        "enabled": PREROLL_SEC > 0,
+        "seconds": round(span, 2),
+        "frames": frames,
+        "bytes": nbytes,
+        "max_sec": PREROLL_SEC,
+    }
 
 
 def _drain_queue():
     """Kuyruğu hızlıca boşalt (kayıt kapanırken)."""
     try:
         while True:
-            _frame_q.get_nowait()
+            item = _frame_q.get_nowait()
+            if item is not None:
+                item.release()
     except Exception:
         pass
 
 
 def _writer_loop():
-    """Zaman damgalarına göre kareleri yaz. Eksik aralıklarda önceki kareyi tekrar et."""
-    global _writer
-    last_emit_ts = None  # son yazılan kare zaman damgası
-    prev_frame = None    # tekrar için elde tutulan kare
-    period = 1.0 / max(1e-3, RECORD_FPS)  # writer açılana kadar varsayılan
+    """Aşama 1: kareleri _CfrResampler'ın verdiği slotlara yerleştir ve kodlama
+    havuzuna gönder; yazma muxer thread'indedir. Boş slotlarda önceki kare
+    tekrarlanır, dolu slota düşen kare kodlanmadan atılır."""
+    global _writer, _segment_frames
+    pending = deque()    # yeni kaydın başına yazılacak ön kayıt kareleri
+    fed = None           # son kare gönderilen writer (parçanın ilk karesini ayırt etmek için)
+    thin = False         # disk azken JPEG kabul etmeyen arka uçlarda kare seyreltme
 
     while not _stop_all.is_set():
         try:
-            if not _recording_flag.is_set():
-                # kayıt değilken writer kapalı tut ve kuyruğu boşalt
+            if _recording_flag.is_set() and _disk_state == "full":
+                # Disk dolmak üzere: dosyayı kapat, alan açılana dek kareleri at
                 if _writer is not None:
                     with _writer_lock:
                         _close_writer()
+                pending.clear()
                 _drain_queue()
-                last_emit_ts = None
-                prev_frame = None
-                time.sleep(0.02)
+                time.sleep(0.2)
                 continue
 
-            # Kayıt açık: puller'ı çalıştır
-            _ensure_puller_running()
+            if not _recording_flag.is_set():
+                # kayıt değilken writer kapalı tut; kuyruk ön kayda alınır (kapalıysa boşaltılır)
+                if _writer is not None:
+                    with _writer_lock:
+                        _close_writer()
+                pending.clear()
+                if PREROLL_SEC > 0:
+                    _preroll_absorb()
+                else:
+                    _drain_queue()
+                    time.sleep(0.02)
+                continue
 
             # writer yoksa aç (mevcut frame boyutuna göre ve ölçülen fps ile)
             if _writer is None:
+                if _check_disk() == "full":
+                    continue
                 frame_probe = _get_latest_frame()
                 if frame_probe is not None:
-                    ph_h, ph_w = frame_probe.shape[:2]
-                    size = (ph_w, ph_h)
+                    size = frame_probe.size
+                    frame_probe.release()  # yalnızca meta veri gerekiyor
                 else:
                     size = FRAME_SIZE or (640, 480)
                 with _writer_lock:
                     if _writer is None:
                         est_fps = _estimate_fps()
-                        _writer = _open_writer(size, fps=est_fps)
+                        _writer = _open_writer(size, fps=est_fps, passthrough=RECORD_MJPEG_PASSTHROUGH)
                         if _writer is None:
                             time.sleep(0.1)
                             continue
-                        period = 1.0 / max(1e-3, (est_fps or RECORD_FPS))
-
-            # Kuyruktan kare çek ve yaz
-            try:
-                item = _frame_q.get(timeout=0.5)
-            except Empty:
-                # Uzun süre kare gelmiyorsa döngüye devam (writer açık kalsın)
-                continue
+                # Tetikten önceki saniyeler: ön kayıt kareleri kuyruktan önce yazılır
+                pending.extend(_preroll_take())
+                if pending:
+                    LOG.info(f"Ön kayıt: {len(pending)} kare ({pending[-1].ts - pending[0].ts:.2f}s) dosyanın başına yazılıyor")
+
+            # Önce ön kayıt, sonra kuyruktan kare çek
+            if pending:
+                item = pending.popleft()
+                time.sleep(0)  # boşaltma yakalamayı aç bırakmasın (eventlet'te diğer thread'lere sıra ver)
+            else:
+                try:
+                    item = _frame_q.get(timeout=0.5)
+                except Empty:
+                    # Uzun süre kare gelmiyorsa döngüye devam (writer açık kalsın)
+                    continue
 
             if item is None:
                 continue
 
-            # paket çöz
-            try:
-                frame, ts = item
-            except Exception:
-                # Eski format (yalnızca frame) destekleniyorsa
-                frame = item
-                ts = time.time()
-
-            # Boyut uyumu
-            h, w = frame.shape[:2]
-            target_w, target_h = (WRITER_SIZE or (w, h))
-            if (w, h) != (target_w, target_h):
-                frame = cv2.resize(frame, (target_w, target_h))
-
-            # Zaman çizelgesini koru: arada kaçırılan periyotları önceki kareyle doldur
-            if FILL_MISSING_FRAMES and last_emit_ts is not None and prev_frame is not None:
-                # Güvenlik limiti: çok büyük boşlukları aşırı büyütmemek için sınırlı doldurma
-                max_fill = max(0.0, FILL_MAX_GAP_SEC)
-                while (ts - last_emit_ts) > (period * 1.1) and (ts - last_emit_ts) < (max_fill if max_fill > 0 else float("inf")):
-                    try:
-                        _writer.write(prev_frame)
-                    except Exception as e:
-                        LOG.error(f"Tekrar kare yazma hatası: {e}")
-                        break
-                    last_emit_ts += period
-
-            # Mevcut kareyi yaz
-            try:
-                _writer.write(frame)
-            except Exception as e:
-                LOG.error(f"Frame yazma hatası: {e}")
-            prev_frame = frame
-            last_emit_ts = ts
+            # Disk azaldı: JPEG yazmayan arka uçlarda her iki kareden biri atılır
+            # (CFR boşluğu tekrarla doldurur; JPEG'de kalite düşürülür)
+            if _disk_state == "low" and not _writer_passthrough:
+                thin = not thin
+                if thin:
+                    item.release()
+                    continue
+
+            # Slot eşleme: dolu slota düşen kare kodlanmadan atılır
+            slots = _cfr.place(item.ts) if _cfr is not None else 1
+            if slots == 0:
+                item.release()
+                continue
+            if _writer is not fed:
+                # Parçanın ilk karesi: muxer'da tekrarlanacak önceki kare yok,
+                # yalnızca kendisi yazılır; sayaç da öyle ilerlemeli
+                slots = 1
+                fed = _writer
+
+            # Kodlamayı havuza ver, sırayı koruyarak muxer'a ilet. Tampon doluysa
+            # (disk yavaş) burada beklenir; bu sırada kareler kayıt kuyruğunda birikir.
+            fut = _encode_pool.submit(_encode_job, item, WRITER_SIZE, _writer_passthrough, _jpeg_quality())
+            _mux_q.put(("frame", _writer, fut, item, slots))
+            depth = _mux_q.qsize()
+            if depth > _pipe_stats["buffer_high_water"]:
+                with _pipe_lock:
+                    _pipe_stats["buffer_high_water"] = max(_pipe_stats["buffer_high_water"], depth)
+            _segment_frames += slots
+
+            # Parça süresi/boyutu doldu (veya RIFF-AVI 1 GiB sınırı): kare sınırında
+            # sıradaki parçaya geç; sonraki kare yeni dosyanın ilk karesi olur
+            if _segment_due():
+                LOG.info(f"Parça tamamlandı, sıradakine geçiliyor: {_current_file}")
+                _rotate_segment()
 
         except Exception as e:
             LOG.error(f"writer_loop hata: {e}")
@@ -589,15 +1435,66 @@ def _safe_session(name: str) -> str:
     return name
 
 
+def index_note(op: str, *args, **kwargs):
+    """records_index'i artımlı güncelle (op: note_file, remove_file, rename_file,
+    note_session, remove_session, rename_session). Hata kaydı/silmeyi engellemez."""
+    if records_index is None:
+        return
+    try:
+        getattr(records_index, op)(*args, **kwargs)
+    except Exception as e:
+        LOG.error(f"Kayıt dizini güncellenemedi ({op}): {e}")
+
+
+def current_segment() -> Optional[tuple]:
+    """Yazılmakta olan parça (yol, parça no); kayıt yoksa None. İkisi birlikte okunur."""
+    with _writer_lock:
+        if _writer is None or not _current_path:
+            return None
+        return _current_path, _segment_index
+
+
+def live_current() -> Optional[tuple]:
+    """Yazılmakta olan dosya (oturum, ad, boyut, mtime); dizindeki boyutu eskidir."""
+    path = _current_path
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return os.path.basename(os.path.dirname(path)), os.path.basename(path), st.st_size, st.st_mtime
+
+
 def _list_sessions() -> List[Dict]:
+    if records_index is not None and records_index.ready():
+        try:
+            items = records_index.list_sessions()
+        except Exception as e:
+            LOG.error(f"Kayıt dizini okunamadı, klasör taranıyor: {e}")
+        else:
+            live = live_current()
+            if live is not None:
+                old = records_index.get_file(live[0], live[1])
+                for it in items:
+                    if it["name"] == live[0]:
+                        it["size"] += live[2] - (old["size"] if old else 0)
+                        it["count"] += 0 if old else 1
+                        it["mtime"] = max(it["mtime"], live[3])
+                items.sort(key=lambda x: x["mtime"], reverse=True)
+            return items
+    return _scan_sessions()
+
+
+def _scan_sessions() -> List[Dict]:
     items: List[Dict] = []
     try:
         for fn in os.listdir(RECORDS_DIR):
             p = os.path.join(RECORDS_DIR, fn)
-            if not os.path.isdir(p):
+            if fn.startswith(".") or not os.path.isdir(p):
                 continue
             try:
-                files = [f for f in os.listdir(p) if os.path.isfile(os.path.join(p, f))]
+                files = [f for f in os.listdir(p) if not f.startswith(".") and os.path.isfile(os.path.join(p, f))]
             except Exception:
                 files = []
             size = 0
@@ -629,12 +1526,27 @@ def _list_sessions() -> List[Dict]:
 
 
 def _list_files(session_name: str) -> List[Dict]:
-    items = []
     sess = _safe_session(session_name)
+    if records_index is not None and records_index.ready():
+        try:
+            items = records_index.list_files(sess)
+        except Exception as e:
+            LOG.error(f"Kayıt dizini okunamadı, klasör taranıyor: {e}")
+        else:
+            live = live_current()
+            if live is not None and live[0] == sess:
+                cur = next((it for it in items if it["name"] == live[1]), None)
+                if cur is None:
+                    cur = {"name": live[1]}
+                    items.append(cur)
+                cur["size"], cur["mtime"] = live[2], live[3]
+                items.sort(key=lambda x: x["mtime"], reverse=True)
+            return items
+    items = []
     sess_dir = os.path.join(RECORDS_DIR, sess)
     for fn in os.listdir(sess_dir):
         path = os.path.join(sess_dir, fn)
-        if not os.path.isfile(path):
+        if fn.startswith(".") or not os.path.isfile(path):
             continue
         stat = os.stat(path)
         items.append({
@@ -676,6 +1588,12 @@ def list_session(session):
         flash("Geçersiz oturum.", "danger")
         return redirect(url_for("records.list_records"))
     files = _list_files(sess)
+    try:
+        import records_media
+        for f in files:
+            f["thumb_key"] = records_media.cache_key(f["size"], f["mtime"])
+    except Exception:
+        pass
     return render_template("records.html", files=files, current_session=sess, active_session=SESSION_NAME)
 
 
@@ -716,6 +1634,7 @@ def rename_record(session):
                     pass
         else:
             os.rename(src, dst)
+            index_note("rename_file", sess, old, new)
             flash("İsim değiştirildi.", "success")
             if syslog:
                 try:
@@ -754,6 +1673,7 @@ def delete_record(session):
                 file_size = None
 
             os.remove(path)
+            index_note("remove_file", sess, name)
             flash("Silindi.", "success")
 
             if syslog:
@@ -809,6 +1729,7 @@ def delete_session(session):
 
         # Tüm oturum klasörünü sil
         shutil.rmtree(session_path)
+        index_note("remove_session", sess)
         flash(f"Oturum '{sess}' ve içindeki {file_count} dosya silindi.", "success")
 
         # Silme logu
@@ -880,6 +1801,7 @@ def rename_session(session):
 
         # Oturum klasörünü yeniden adlandır
         os.rename(src_path, dst_path)
+        index_note("rename_session", sess, new_name)
         flash(f"Oturum adı '{sess}' → '{new_name}' olarak değiştirildi.", "success")
 
         # Loglama
@@ -951,6 +1873,7 @@ def delete_all_sessions():
 
                 # Oturum klasörünü sil
                 shutil.rmtree(session_path)
+                index_note("remove_session", sess_name)
                 deleted_count += 1
 
                 LOG.info(f"Oturum silindi: {sess_name} ({file_count} dosya)")
@@ -997,6 +1920,35 @@ def delete_all_sessions():
     return redirect(url_for("records.list_records"))
 
 
+@records_bp.route("/<session>/thumb/<path:filename>", methods=["GET"])  # küçük resim
+@_login_required
+def record_thumb(session, filename):
+    return _media_image(session, filename, "thumb")
+
+
+@records_bp.route("/<session>/sprite/<path:filename>", methods=["GET"])  # kontak sayfası
+@_login_required
+def record_sprite(session, filename):
+    return _media_image(session, filename, "sprite")
+
+
+def _media_image(session_name: str, filename: str, kind: str):
+    try:
+        sess = _safe_session(session_name)
+        filename = _safe_name(filename)
+    except Exception:
+        abort(400)
+    try:
+        import records_media
+        resp = records_media.image_response(sess, filename, kind, request.args.get("v"))
+    except Exception as e:
+        LOG.error(f"Küçük resim hatası ({sess}/{filename}): {e}")
+        resp = None
+    if resp is None:
+        abort(404)
+    return resp
+
+
 @records_bp.route("/<session>/download/<path:filename>", methods=["GET"])  # indirme
 @_login_required
 def download_record(session, filename):
@@ -1006,8 +1958,8 @@ def download_record(session, filename):
         username = globals().get('session', {}).get("user", "Unknown")
         file_path = os.path.join(RECORDS_DIR, sess, filename)
 
-        # İndirme logu
-        if syslog:
+        # İndirme logu (devam/atlama istekleri hariç)
+        if syslog and not file_response.is_resume_request():
             try:
                 syslog.log_video_file_operation("DOWNLOAD", file_path, True, username)
             except Exception:
@@ -1016,74 +1968,73 @@ def download_record(session, filename):
     except Exception:
         flash("Geçersiz dosya/oturum.", "danger")
         return redirect(url_for("records.list_records"))
-    return send_from_directory(os.path.join(RECORDS_DIR, sess), filename, as_attachment=True)
-
-
-# ============================ Puller (video_feed tetikleyici) ============
-_puller_thread = None
-_puller_stop = threading.Event()
+    try:
+        # Range (devam eden indirme / oynatıcıda atlama) ve ETag destekli;
+        # ?inline=1 tarayıcıda oynatmak içindir
+        return file_response.send_range_file(file_path, as_attachment=not request.args.get("inline"))
+    except (FileNotFoundError, IsADirectoryError):
+        abort(404)
 
 
-def _puller_loop():
-    """Kayıt açıkken /video_feed'e bağlanıp akışı tetikler. Veri okunur ve atılır."""
-    global _puller_thread
-    backoff = 0.5
-    while not _puller_stop.is_set():
-        # Kayıt bekle
-        if not _recording_flag.is_set():
-            time.sleep(0.2)
-            continue
+@records_bp.route("/<session>/export", methods=["GET"])  # oturumu tek arşiv olarak indirme
+@_login_required
+def export_session(session):
+    try:
+        sess = _safe_session(session)
+        fmt = request.args.get("format", "zip").lower()
+        username = globals().get('session', {}).get("user", "Unknown")
+    except Exception:
+        flash("Geçersiz oturum.", "danger")
+        return redirect(url_for("records.list_records"))
+    import records_export
+    if fmt not in records_export.FORMATS:
+        abort(400)
+    if syslog and not file_response.is_resume_request():
         try:
-            conn = http.client.HTTPConnection(_FEED_HOST, _FEED_PORT, timeout=5)
-            conn.request("GET", _FEED_PATH, headers={"Connection": "keep-alive"})
-            resp = conn.getresponse()
-            if resp.status != 200:
-                LOG.warning(f"puller: HTTP {resp.status}")
-                conn.close(); time.sleep(backoff); backoff = min(5.0, backoff*1.5)
-                continue
-            LOG.info("puller: /video_feed bağlandı.")
-            backoff = 0.5
-            # Kayıt açık kaldıkça küçük parçalar oku ve at
-            while _recording_flag.is_set() and not _puller_stop.is_set():
-                chunk = resp.read(4096)
-                if not chunk:
-                    break
-            try:
-                conn.close()
-            except Exception:
-                pass
-        except Exception as e:
-            LOG.debug(f"puller: bağlanamadı: {e}")
-            time.sleep(backoff)
-            backoff = min(5.0, backoff*1.5)
-
-
-def _ensure_puller_running():
-    global _puller_thread
-    if _puller_thread is None or not _puller_thread.is_alive():
-        _puller_thread = threading.Thread(target=_puller_loop, name="rec-puller", daemon=True)
-        _puller_thread.start()
+            syslog.log_video_file_operation("EXPORT", os.path.join(RECORDS_DIR, sess), True, username)
+        except Exception:
+            pass
+    try:
+        return records_export.send_session(sess, fmt)
+    except (FileNotFoundError, NotADirectoryError):
+        abort(404)
 
 
 # ============================ Başlat/Durdur ===============================
 _threads_started = False
 
-def start_background():
-    global _threads_started
+def start_background(frame_source=None):
+    """Arkaplan servislerini başlat. frame_source: subscribe(fn) sağlayan kare kaynağı
+    (main.camera_hub); verilmezse kareler push_frame ile elle beslenmelidir.
+    """
+    global _threads_started, _mux_thread, _frame_source
     if _threads_started:
         return
+    # Yakalama hattına süreç içi abone ol
+    if frame_source is not None:
+        _frame_source = frame_source if hasattr(frame_source, "jpeg") else None
+        frame_source.subscribe(push_frame)
+    # Oturum/dosya dizini: açılış eşitlemesi arka planda, bitene kadar listeler klasörü tarar
+    if records_index is not None:
+        try:
+            records_index.start_background(RECORDS_DIR)
+        except Exception as e:
+            LOG.error(f"Kayıt dizini başlatılamadı: {e}")
     # Oturum klasörünü oluştur
     _ensure_session_dir()
     # LED GPIO kurulumu
     _setup_led_gpio()
-    # writer thread
+    # muxer (yazma) ve writer (yerleştirme/kodlama) thread'leri
+    _mux_thread = threading.Thread(target=_mux_loop, name="rec-mux", daemon=True)
+    _mux_thread.start()
     t1 = threading.Thread(target=_writer_loop, name="rec-writer", daemon=True)
     t1.start()
+    # disk alanı izleme thread
+    _check_disk()
+    threading.Thread(target=_disk_loop, name="rec-disk", daemon=True).start()
     # gpio watcher thread
     t2 = threading.Thread(target=_record_gpio_watcher, name="rec-gpio", daemon=True)
     t2.start()
-    # puller thread (bekleme modunda başlar)
-    _ensure_puller_running()
     _threads_started = True
     LOG.info("recordsVideo arkaplan servisleri başlatıldı.")
 
@@ -1091,8 +2042,11 @@ def start_background():
 def stop_background():
     _stop_all.set()
     _recording_flag.clear()
-    _puller_stop.set()
     # writer kapat
     with _writer_lock:
         _close_writer()
+    if _mux_thread is not None:
+        _mux_q.put(("stop",))
+    if records_index is not None:
+        records_index.stop_background()
     LOG.info("recordsVideo servisleri durduruldu.")
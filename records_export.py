@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Bir oturumun tamamını tek bağlantıda ZIP veya TAR arşivi olarak aktarma.
+
+Arşiv diske yazılmaz, istek sırasında üretilir; bellek kullanımı dosya
+sayısıyla orantılı küçük bir üstveri listesi + DOWNLOAD_CHUNK_KB'lık okuma
+parçasıdır. Videolar zaten sıkıştırılmış olduğundan ZIP "store" (sıkıştırmasız)
+yöntemiyle yazılır.
+
+Düzen deterministiktir: dosyalar mtime (eşitse ad) sırasıyla, sabit başlık
+biçimiyle yerleştirilir; her başlığın ve verinin arşivdeki konumu ve toplam
+boyut baştan hesaplanır. Bu sayede yanıt Content-Length taşır ve
+file_response.send_range ile Range / If-Range (kaldığı yerden devam) çalışır.
+ETag dosya listesinden (ad, inode, boyut, mtime_ns) türetilir; oturumdaki bir
+dosya değişirse ETag da değişir ve eski aralık isteği tüm arşivi alır.
+
+ZIP ayrıntıları: her girdi zip64 (4 GB üstü dosya/arşiv sınırı yok), UTF-8 ad,
+genel amaçlı bit 3 (CRC veri tanımlayıcısında). CRC dosya akarken hesaplanır;
+devam isteğinde atlanan dosyaların CRC'si gerekiyorsa dosya bir kez okunur ve
+sonuç bellekte tutulur (EXPORT_CRC_CACHE).
+
+Yazılmakta olan dosya (aktif kayıt) arşive alınmaz.
+"""
+from __future__ import annotations
+
+import os
+import time
+import zlib
+import struct
+import bisect
+import hashlib
+import logging
+import tarfile
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Tuple
+
+from native_io import native as _native
+
+try:
+    import recordsVideo
+except Exception:
+    recordsVideo = None
+
+LOG = logging.getLogger(__name__)
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+RECORDS_DIR = getattr(recordsVideo, "RECORDS_DIR", None) or os.path.join(BASE_DIR, "clary", "records")
+
+EXPORT_CRC_CACHE = max(16, int(os.environ.get("EXPORT_CRC_CACHE", "4096")))
+FORMATS = ("zip", "tar")
+
+
+# ============================ CRC önbelleği ===============================
+_crc_lock = threading.Lock()
+_crc_cache = OrderedDict()  # type: OrderedDict  # (yol, inode, boyut, mtime_ns) -> crc32
+
+
+def _crc_get(key) -> Optional[int]:
+    with _crc_lock:
+        crc = _crc_cache.get(key)
+        if crc is not None:
+            _crc_cache.move_to_end(key)
+        return crc
+
+
+def _crc_put(key, crc: int):
+    with _crc_lock:
+        _crc_cache[key] = crc
+        _crc_cache.move_to_end(key)
+        while len(_crc_cache) > EXPORT_CRC_CACHE:
+            _crc_cache.popitem(last=False)
+
+
+def _crc_file(path: str, size: int) -> int:
+    """Dosyanın ilk size byte'ının CRC32'si (OS thread'inde)."""
+    crc = 0
+    with open(path, "rb", buffering=0) as f:
+        left = size
+        while left > 0:
+            data = f.read(min(1 << 20, left))
+            if not data:
+                raise OSError(f"dosya kısaldı: {path}")
+            crc = zlib.crc32(data, crc)
+            left -= len(data)
+    return crc
+
+
+# ============================ Girdiler ====================================
+class _Entry:
+    __slots__ = ("arcname", "path", "size", "mtime", "key", "data_off")
+
+    def __init__(self, arcname: str, path: str, st: os.stat_result):
+        self.arcname = arcname
+        self.path = path
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.key = (path, st.st_ino, st.st_size, st.st_mtime_ns)
+        self.data_off = 0
+
+
+def _scan(session: str) -> List[_Entry]:
+    sess_dir = os.path.join(RECORDS_DIR, session)
+    live = recordsVideo.live_current() if recordsVideo is not None else None
+    skip = live[1] if live is not None and live[0] == session else None
+    entries = []
+    with os.scandir(sess_dir) as it:
+        for de in it:
+            if de.name.startswith(".") or de.name == skip:
+                continue
+            try:
+                if not de.is_file(follow_symlinks=False):
+                    continue
+                st = de.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            entries.append(_Entry(f"{session}/{de.name}", de.path, st))
+    entries.sort(key=lambda e: (e.mtime, e.arcname))
+    return entries
+
+
+# ============================ ZIP =========================================
+_ZIP_FLAGS = 0x0808      # bit 3: CRC/boyut veri tanımlayıcısında, bit 11: UTF-8 ad
+_ZIP_VERSION = 45        # zip64
+_ZIP_MADE_BY = (3 << 8) | _ZIP_VERSION  # Unix
+_U32 = 0xFFFFFFFF
+
+
+def _dos_time(mtime: float) -> Tuple[int, int]:
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+def _ut_extra(mtime: float) -> bytes:
+    # Genişletilmiş zaman damgası (0x5455): DOS saatinin 2 sn çözünürlüğü yerine Unix mtime
+    return struct.pack("<HHBI", 0x5455, 5, 1, int(mtime) & _U32)
+
+
+def _zip_local_header(e: _Entry) -> bytes:
+    name = e.arcname.encode("utf-8")
+    dtime, ddate = _dos_time(e.mtime)
+    extra = struct.pack("<HHQQ", 0x0001, 16, e.size, e.size) + _ut_extra(e.mtime)
+    return struct.pack("<IHHHHHIIIHH", 0x04034b50, _ZIP_VERSION, _ZIP_FLAGS, 0, dtime, ddate,
+                       0, _U32, _U32, len(name), len(extra)) + name + extra
+
+
+def _zip_descriptor(crc: int, e: _Entry) -> bytes:
+    return struct.pack("<IIQQ", 0x08074b50, crc, e.size, e.size)
+
+
+_ZIP_DESCRIPTOR_LEN = 24
+
+
+def _zip_central_header(e: _Entry, crc: int, offset: int) -> bytes:
+    name = e.arcname.encode("utf-8")
+    dtime, ddate = _dos_time(e.mtime)
+    extra = struct.pack("<HHQQQ", 0x0001, 24, e.size, e.size, offset) + _ut_extra(e.mtime)
+    return struct.pack("<IHHHHHHIIIHHHHHII", 0x02014b50, _ZIP_MADE_BY, _ZIP_VERSION, _ZIP_FLAGS, 0,
+                       dtime, ddate, crc, _U32, _U32, len(name), len(extra), 0, 0, 0,
+                       0o100644 << 16, _U32) + name + extra
+
+
+def _zip_central_len(e: _Entry) -> int:
+    return 46 + len(e.arcname.encode("utf-8")) + 28 + 9
+
+
+def _zip_end(count: int, cd_off: int, cd_len: int) -> bytes:
+    eocd64_off = cd_off + cd_len
+    return (struct.pack("<IQHHIIQQQQ", 0x06064b50, 44, _ZIP_MADE_BY, _ZIP_VERSION, 0, 0,
+                        count, count, cd_len, cd_off)
+            + struct.pack("<IIQI", 0x07064b50, 0, eocd64_off, 1)
+            + struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                          _U32, _U32, 0))
+
+
+_ZIP_END_LEN = 56 + 20 + 22
+
+
+# ============================ TAR =========================================
+def _tar_header(e: _Entry) -> bytes:
+    ti = tarfile.TarInfo(e.arcname)
+    ti.size = e.size
+    ti.mtime = int(e.mtime)
+    ti.mode = 0o644
+    ti.type = tarfile.REGTYPE
+    # Gerekirse (uzun/UTF-8 ad, 8 GB üstü) pax başlığı eklenir; aynı girdi hep aynı byte'ları üretir
+    return ti.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+
+
+# ============================ Arşiv =======================================
+# Parça türleri: ("raw", bytes) | ("file", _Entry) | ("desc", _Entry) | ("tail", None)
+class Archive:
+    """Bir oturumun deterministik arşiv düzeni. read(n, konum) file_response.send_range
+    ile kullanılır; close() açık dosyayı kapatır."""
+
+    def __init__(self, session: str, fmt: str = "zip"):
+        if fmt not in FORMATS:
+            raise ValueError(f"Desteklenmeyen biçim: {fmt}")
+        self.session = session
+        self.fmt = fmt
+        self.entries = _native(_scan, session)
+        self._starts = []  # type: List[int]
+        self._parts = []  # type: List[Tuple[int, str, object]]
+        self._tail = None  # type: Optional[bytes]
+        self._fd = None  # type: Optional[int]
+        self._fd_entry = None  # type: Optional[_Entry]
+        self._crc = {}  # type: dict  # akış sırasında hesaplanan: _Entry -> (konum, crc)
+        pos = 0
+
+        def add(kind, length, obj):
+            nonlocal pos
+            if length > 0:
+                self._starts.append(pos)
+                self._parts.append((length, kind, obj))
+                pos += length
+
+        for e in self.entries:
+            if fmt == "zip":
+                hdr = _zip_local_header(e)
+                e_off = pos
+                add("raw", len(hdr), hdr)
+                e.data_off = pos
+                add("file", e.size, e)
+                add("desc", _ZIP_DESCRIPTOR_LEN, e)
+                self._crc[e] = (0, 0, e_off)
+            else:
+                hdr = _tar_header(e)
+                add("raw", len(hdr), hdr)
+                e.data_off = pos
+                add("file", e.size, e)
+                pad = -e.size % tarfile.BLOCKSIZE
+                add("raw", pad, b"\0" * pad)
+        if fmt == "zip":
+            self._cd_off = pos
+            self._cd_len = sum(_zip_central_len(e) for e in self.entries)
+            add("tail", self._cd_len + _ZIP_END_LEN, None)
+        else:
+            add("raw", 2 * tarfile.BLOCKSIZE, b"\0" * (2 * tarfile.BLOCKSIZE))
+        self.size = pos
+
+    # ---- Kimlik ----
+    @property
+    def etag(self) -> str:
+        h = hashlib.sha1(self.fmt.encode())
+        for e in self.entries:
+            h.update(repr((e.arcname,) + e.key[1:]).encode("utf-8", "surrogateescape"))
+        return f"{self.fmt}-{h.hexdigest()[:24]}"
+
+    @property
+    def mtime(self) -> float:
+        return max((e.mtime for e in self.entries), default=0.0)
+
+    @property
+    def filename(self) -> str:
+        return f"{self.session}.{self.fmt}"
+
+    @property
+    def mimetype(self) -> str:
+        return "application/zip" if self.fmt == "zip" else "application/x-tar"
+
+    # ---- Okuma ----
+    def _entry_crc(self, e: _Entry) -> int:
+        crc = _crc_get(e.key)
+        if crc is None:
+            crc = _native(_crc_file, e.path, e.size)
+            _crc_put(e.key, crc)
+        return crc
+
+    def _tail_bytes(self) -> bytes:
+        if self._tail is None:
+            cd = b"".join(_zip_central_header(e, self._entry_crc(e), self._crc[e][2]) for e in self.entries)
+            self._tail = cd + _zip_end(len(self.entries), self._cd_off, self._cd_len)
+        return self._tail
+
+    def _read_file(self, e: _Entry, n: int, off: int) -> bytes:
+        if self._fd_entry is not e:
+            self._close_fd()
+            self._fd = os.open(e.path, os.O_RDONLY)
+            self._fd_entry = e
+        data = _native(os.pread, self._fd, n, off)
+        if self.fmt == "zip":
+            cpos, crc, hoff = self._crc[e]
+            if off == cpos and data:  # baştan sırayla okunuyor: CRC'yi yolda hesapla
+                crc = zlib.crc32(data, crc)
+                self._crc[e] = (cpos + len(data), crc, hoff)
+                if cpos + len(data) == e.size:
+                    _crc_put(e.key, crc)
+        if off + len(data) >= e.size:
+            self._close_fd()
+        return data
+
+    def read(self, n: int, pos: int) -> bytes:
+        i = bisect.bisect_right(self._starts, pos) - 1
+        if i < 0 or pos >= self.size:
+            return b""
+        start = self._starts[i]
+        length, kind, obj = self._parts[i]
+        off = pos - start
+        n = min(n, length - off)
+        try:
+            if kind == "raw":
+                return obj[off:off + n]
+            if kind == "file":
+                return self._read_file(obj, n, off)
+            if kind == "desc":
+                return _zip_descriptor(self._entry_crc(obj), obj)[off:off + n]
+            return self._tail_bytes()[off:off + n]
+        except OSError as e:
+            # Dosya aktarım sırasında silindi/kısaldı: akışı kes (istemci eksik boyutu görür)
+            LOG.error(f"Arşiv aktarımı kesildi ({self.session}): {e}")
+            return b""
+
+    def _close_fd(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._fd_entry = None
+
+    def close(self):
+        self._close_fd()
+
+
+def send_session(session: str, fmt: str = "zip"):
+    """Oturumu arşiv olarak Range/If-Range destekli yanıtla gönder.
+    Oturum yoksa FileNotFoundError, biçim geçersizse ValueError."""
+    import file_response
+    arc = Archive(session, fmt)
+    return file_response.send_range(arc.size, arc.etag, arc.mtime, arc.read, arc.close,
+                                    arc.filename, True, arc.mimetype)
@@ -0,0 +1,537 @@
+# -*- coding: utf-8 -*-
+"""
+Kayıt oturumları ve dosyaları için kalıcı SQLite dizini.
+
+Her listeleme isteğinde tüm oturum klasörlerini os.listdir + os.stat ile
+taramak yerine oturum/dosya bilgileri (boyut, mtime, süre, çözünürlük, fps)
+RECORDS_DIR/.index.sqlite3 içinde tutulur:
+
+- Açılışta reconcile() diski bir kez tarar ve dizini eşitler.
+- Kayıt writer'ı (kapanan parçalar), yeniden adlandırma ve silme yolları
+  note_file/remove_file/rename_file/... ile dizini artımlı günceller.
+- Dışarıdan yapılan değişiklikler (scp, elle silme) için refresh() yalnızca
+  kök ve oturum klasörlerinin mtime'ına bakar; değişen oturumlar yeniden
+  taranır. Arka plan thread'i bunu her RECORDS_INDEX_REFRESH_SEC'te bir yapar;
+  listeler de çağırır (aynı aralıkla sınırlı), generation() ise hiç taramaz.
+- Süre/çözünürlük/fps bilinmeyen dosyaları records_media arka planda
+  yoklar ve update_meta ile yazar (pending_probe).
+
+Veritabanı açılamazsa (salt okunur disk, bozuk dosya) dizin bellekte tutulur.
+Adı nokta ile başlayan oturum ve dosyalar (.thumbs, .index.sqlite3 vb.) dizine
+alınmaz. Her değişiklik generation() sayacını artırır (ETag vb. için).
+"""
+from __future__ import annotations
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Optional, List, Dict, Tuple
+
+# eventlet altında disk taraması gerçek OS thread'inde
+# yapılır; SQLite erişimi kısa sürdüğü için çağıran (yeşil) thread'de kalır.
+from native_io import native as _native
+
+LOG = logging.getLogger(__name__)
+
+RECORDS_INDEX_PATH = os.environ.get("RECORDS_INDEX_PATH", "")          # boşsa RECORDS_DIR/.index.sqlite3
+RECORDS_INDEX_REFRESH_SEC = float(os.environ.get("RECORDS_INDEX_REFRESH_SEC", "2"))
+# Klasör mtime çözünürlüğü kaba olabilir (vfat: 2 s); tarama anına bu kadar
+# yakın mtime'lı klasörler bir sonraki refresh'te yeniden taranır.
+_MTIME_SLACK = 2.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    name TEXT PRIMARY KEY,
+    dir_mtime REAL,
+    scanned_at REAL
+);
+CREATE TABLE IF NOT EXISTS files (
+    session TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    duration REAL,
+    width INTEGER,
+    height INTEGER,
+    fps REAL,
+    frames INTEGER,
+    backend TEXT,
+    probed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (session, name)
+);
+CREATE INDEX IF NOT EXISTS files_pending ON files (probed);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_FILE_COLS = ("name", "size", "mtime", "duration", "width", "height", "fps", "frames", "backend")
+
+
+_lock = threading.RLock()
+_refresh_lock = threading.Lock()
+_db = None  # type: Optional[sqlite3.Connection]
+_records_dir = None  # type: Optional[str]
+_db_path = None  # type: Optional[str]
+_ready = False
+_generation = 0
+_last_refresh = 0.0
+_root_mtime = None  # type: Optional[float]
+_thread = None  # type: Optional[threading.Thread]
+_stop_evt = threading.Event()
+_stats = {"reconciled_at": None, "reconcile_sec": None, "refreshes": 0,
+          "rescanned_sessions": 0}
+
+
+# ============================ Disk taraması ===============================
+def _dir_mtimes(records_dir: str) -> Tuple[Optional[float], Dict[str, float]]:
+    """(kök mtime, {oturum: klasör mtime}) — OS thread'inde çalışır."""
+    out = {}
+    try:
+        root = os.stat(records_dir).st_mtime
+        it = os.scandir(records_dir)
+    except OSError:
+        return None, out
+    with it:
+        for de in it:
+            if de.name.startswith("."):
+                continue
+            try:
+                if de.is_dir(follow_symlinks=False):
+                    out[de.name] = de.stat(follow_symlinks=False).st_mtime
+            except OSError:
+                continue
+    return root, out
+
+
+def _scan_session(path: str) -> Optional[Tuple[float, Dict[str, Tuple[int, float]]]]:
+    """(klasör mtime, {dosya: (boyut, mtime)}); klasör yoksa None."""
+    files = {}
+    try:
+        dir_mtime = os.stat(path).st_mtime
+        it = os.scandir(path)
+    except OSError:
+        return None
+    with it:
+        for de in it:
+            if de.name.startswith("."):
+                continue
+            try:
+                if not de.is_file(follow_symlinks=False):
+                    continue
+                st = de.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            files[de.name] = (st.st_size, st.st_mtime)
+    return dir_mtime, files
+
+
+def _scan_sessions(records_dir: str, names: List[str]) -> Dict[str, Optional[tuple]]:
+    return {n: _scan_session(os.path.join(records_dir, n)) for n in names}
+
+
+# ============================ Veritabanı =================================
+def _connect(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(_SCHEMA)
+    db.execute("SELECT COUNT(*) FROM files").fetchone()
+    return db
+
+
+def _bump():
+    """_lock altında, açık bir işlem içinde çağrılır."""
+    global _generation
+    _generation += 1
+    _db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (str(_generation),))
+
+
+def open_index(records_dir: str, path: Optional[str] = None) -> bool:
+    """Dizini aç (veya oluştur). Dosya açılamazsa bellekte çalışır; False döner."""
+    global _db, _records_dir, _db_path, _generation, _ready
+    path = path or RECORDS_INDEX_PATH or os.path.join(records_dir, ".index.sqlite3")
+    with _lock:
+        if _db is not None:
+            return _db_path != ":memory:"
+        _records_dir = records_dir
+        db = None
+        try:
+            db = _connect(path)
+        except sqlite3.OperationalError as e:
+            # Kilitli / salt okunur: dosyaya dokunma, bellekte çalış
+            LOG.error(f"Kayıt dizini açılamadı ({path}): {e}")
+        except sqlite3.DatabaseError as e:
+            # Bozuk dizin: kaynak bilgi diskte, silip yeniden kurmak güvenli
+            LOG.warning(f"Kayıt dizini bozuk, yeniden oluşturuluyor: {e}")
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(path + suffix)
+                except OSError:
+                    pass
+            try:
+                db = _connect(path)
+            except Exception as e2:
+                LOG.error(f"Kayıt dizini açılamadı ({path}): {e2}")
+        except Exception as e:
+            LOG.error(f"Kayıt dizini açılamadı ({path}): {e}")
+        if db is None:
+            path = ":memory:"
+            db = _connect(path)
+        _db, _db_path, _ready = db, path, False
+        row = db.execute("SELECT value FROM meta WHERE key='generation'").fetchone()
+        try:
+            _generation = int(row[0]) if row else 0
+        except ValueError:
+            _generation = 0
+    return path != ":memory:"
+
+
+def close():
+    global _db, _ready
+    with _lock:
+        if _db is not None:
+            try:
+                _db.close()
+            except Exception:
+                pass
+        _db, _ready = None, False
+
+
+def ready() -> bool:
+    """Açılış eşitlemesi bitti mi? Bitmediyse çağıranlar klasörü kendisi taramalı."""
+    return _ready and _db is not None
+
+
+def generation() -> int:
+    return _generation
+
+
+def _apply_session(name: str, scanned: Optional[tuple], now: float) -> bool:
+    """Bir oturumun tarama sonucunu dizine yaz; değişiklik olduysa True.
+    _lock altında ve açık işlem içinde çağrılır."""
+    if scanned is None:
+        cur = _db.execute("DELETE FROM files WHERE session=?", (name,))
+        cur2 = _db.execute("DELETE FROM sessions WHERE name=?", (name,))
+        return bool(cur.rowcount or cur2.rowcount)
+    dir_mtime, files = scanned
+    changed = False
+    row = _db.execute("SELECT dir_mtime FROM sessions WHERE name=?", (name,)).fetchone()
+    if row is None:
+        changed = True
+    _db.execute("INSERT OR REPLACE INTO sessions (name, dir_mtime, scanned_at) VALUES (?, ?, ?)",
+                (name, dir_mtime, now))
+    known = {r[0]: (r[1], r[2]) for r in
+             _db.execute("SELECT name, size, mtime FROM files WHERE session=?", (name,))}
+    for fn in set(known) - set(files):
+        _db.execute("DELETE FROM files WHERE session=? AND name=?", (name, fn))
+        changed = True
+    for fn, (size, mtime) in files.items():
+        old = known.get(fn)
+        if old is not None and old[0] == size and old[1] == mtime:
+            continue
+        # İçerik değişti: yoklama bilgisi geçersiz
+        _db.execute("INSERT OR REPLACE INTO files (session, name, size, mtime, probed) VALUES (?, ?, ?, ?, 0)",
+                    (name, fn, size, mtime))
+        changed = True
+    return changed
+
+
+def reconcile() -> dict:
+    """Tüm klasörü tara ve dizini diskle eşitle (açılışta bir kez)."""
+    global _ready, _last_refresh, _root_mtime
+    if _db is None:
+        raise RuntimeError("records_index açılmadı")
+    t0 = time.monotonic()
+    root, dirs = _native(_dir_mtimes, _records_dir)
+    scanned = _native(_scan_sessions, _records_dir, sorted(dirs))
+    now = time.time()
+    changed = 0
+    with _lock:
+        _db.execute("BEGIN")
+        try:
+            for (name,) in _db.execute("SELECT name FROM sessions").fetchall():
+                if name not in scanned:
+                    changed += _apply_session(name, None, now)
+            for name, res in scanned.items():
+                changed += _apply_session(name, res, now)
+            if changed:
+                _bump()
+            _db.execute("COMMIT")
+        except Exception:
+            _db.execute("ROLLBACK")
+            raise
+        _root_mtime = root
+        _last_refresh = time.monotonic()
+        _ready = True
+        nfiles = _db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+    took = round(time.monotonic() - t0, 2)
+    _stats["reconciled_at"] = now
+    _stats["reconcile_sec"] = took
+    LOG.info(f"Kayıt dizini eşitlendi: {len(scanned)} oturum, {nfiles} dosya, "
+             f"{changed} oturumda değişiklik ({took}s)")
+    return {"sessions": len(scanned), "files": nfiles, "changed_sessions": changed, "took_sec": took}
+
+
+def refresh(force: bool = False) -> int:
+    """Dışarıdan yapılan değişiklikleri yakala: yalnızca mtime'ı değişen (veya
+    tarama anına çok yakın olan) oturum klasörleri yeniden taranır.
+    Yeniden taranan oturum sayısını döndürür."""
+    global _last_refresh, _root_mtime
+    if not ready():
+        return 0
+    if not force and time.monotonic() - _last_refresh < RECORDS_INDEX_REFRESH_SEC:
+        return 0
+    with _refresh_lock:
+        if not force and time.monotonic() - _last_refresh < RECORDS_INDEX_REFRESH_SEC:
+            return 0  # başka bir istek az önce tazeledi
+        root, dirs = _native(_dir_mtimes, _records_dir)
+        with _lock:
+            known = {r[0]: (r[1], r[2]) for r in
+                     _db.execute("SELECT name, dir_mtime, scanned_at FROM sessions")}
+        stale = [n for n in known if n not in dirs]
+        for name, mtime in dirs.items():
+            k = known.get(name)
+            if k is None or k[0] != mtime or (k[1] is not None and mtime >= k[1] - _MTIME_SLACK):
+                stale.append(name)
+        if stale:
+            scanned = _native(_scan_sessions, _records_dir, [n for n in stale if n in dirs])
+            now = time.time()
+            with _lock:
+                _db.execute("BEGIN")
+                try:
+                    changed = 0
+                    for name in stale:
+                        changed += _apply_session(name, scanned.get(name), now)
+                    if changed:
+                        _bump()
+                    _db.execute("COMMIT")
+                except Exception:
+                    _db.execute("ROLLBACK")
+                    raise
+        _root_mtime = root
+        _last_refresh = time.monotonic()
+        _stats["refreshes"] += 1
+        _stats["rescanned_sessions"] += len(stale)
+        return len(stale)
+
+
+# ============================ Sorgular ===================================
+def list_sessions() -> List[Dict]:
+    """recordsVideo._list_sessions ile aynı biçim: name, count, size, mtime (yeniden eskiye)."""
+    refresh()
+    with _lock:
+        rows = _db.execute(
+            "SELECT s.name, COUNT(f.name), COALESCE(SUM(f.size), 0), MAX(f.mtime), s.dir_mtime "
+            "FROM sessions s LEFT JOIN files f ON f.session = s.name GROUP BY s.name").fetchall()
+    items = [{"name": r[0], "count": r[1], "size": r[2], "mtime": r[3] or r[4] or time.time()}
+             for r in rows]
+    items.sort(key=lambda x: x["mtime"], reverse=True)
+    return items
+
+
+def list_files(session: str) -> List[Dict]:
+    """Oturumdaki dosyalar (yeniden eskiye): name, size, mtime ve biliniyorsa
+    duration, width, height, fps, frames, backend."""
+    refresh()
+    with _lock:
+        rows = _db.execute(f"SELECT {', '.join(_FILE_COLS)} FROM files WHERE session=? ORDER BY mtime DESC",
+                           (session,)).fetchall()
+    return [dict(zip(_FILE_COLS, r)) for r in rows]
+
+
+def get_file(session: str, name: str) -> Optional[Dict]:
+    with _lock:
+        if _db is None:
+            return None
+        r = _db.execute(f"SELECT {', '.join(_FILE_COLS)} FROM files WHERE session=? AND name=?",
+                        (session, name)).fetchone()
+    return dict(zip(_FILE_COLS, r)) if r else None
+
+
+def has_session(session: str) -> bool:
+    with _lock:
+        return _db is not None and _db.execute(
+            "SELECT 1 FROM sessions WHERE name=?", (session,)).fetchone() is not None
+
+
+# ============================ Artımlı güncelleme =========================
+def _write(fn):
+    """fn(db)'yi tek işlemde uygula ve sayacı artır; dizin kapalıysa sessizce geç."""
+    with _lock:
+        if _db is None:
+            return
+        _db.execute("BEGIN")
+        try:
+            fn(_db)
+            _bump()
+            _db.execute("COMMIT")
+        except Exception as e:
+            _db.execute("ROLLBACK")
+            LOG.error(f"Kayıt dizini güncellenemedi: {e}")
+
+
+def _touch_session(db, session: str):
+    try:
+        dir_mtime = os.stat(os.path.join(_records_dir, session)).st_mtime
+    except OSError:
+        dir_mtime = None
+    db.execute("INSERT OR REPLACE INTO sessions (name, dir_mtime, scanned_at) VALUES (?, ?, ?)",
+               (session, dir_mtime, time.time()))
+
+
+def note_session(session: str):
+    """Yeni (boş) oturum klasörü oluşturuldu."""
+    if session.startswith("."):
+        return
+    _write(lambda db: _touch_session(db, session))
+
+
+def note_file(session: str, name: str, **meta):
+    """Dosya eklendi ya da kapandı. Boyut/mtime diskten okunur; meta ile
+    duration, width, height, fps, frames, backend verilebilir (verilirse
+    dosya yoklanmış sayılır)."""
+    if session.startswith(".") or name.startswith("."):
+        return
+    try:
+        st = os.stat(os.path.join(_records_dir or "", session, name))
+    except OSError:
+        return
+    cols = {k: meta[k] for k in _FILE_COLS[3:] if meta.get(k) is not None}
+
+    def fn(db):
+        _touch_session(db, session)
+        db.execute("INSERT OR REPLACE INTO files (session, name, size, mtime, probed) VALUES (?, ?, ?, ?, ?)",
+                   (session, name, st.st_size, st.st_mtime, 1 if cols else 0))
+        if cols:
+            db.execute(f"UPDATE files SET {', '.join(k + '=?' for k in cols)} WHERE session=? AND name=?",
+                       (*cols.values(), session, name))
+    _write(fn)
+
+
+def remove_file(session: str, name: str):
+    def fn(db):
+        db.execute("DELETE FROM files WHERE session=? AND name=?", (session, name))
+        _touch_session(db, session)
+    _write(fn)
+
+
+def rename_file(session: str, old: str, new: str):
+    def fn(db):
+        db.execute("DELETE FROM files WHERE session=? AND name=?", (session, new))
+        db.execute("UPDATE files SET name=? WHERE session=? AND name=?", (new, session, old))
+        _touch_session(db, session)
+    _write(fn)
+
+
+def remove_session(session: str):
+    def fn(db):
+        db.execute("DELETE FROM files WHERE session=?", (session,))
+        db.execute("DELETE FROM sessions WHERE name=?", (session,))
+    _write(fn)
+
+
+def rename_session(old: str, new: str):
+    def fn(db):
+        db.execute("DELETE FROM files WHERE session=?", (new,))
+        db.execute("DELETE FROM sessions WHERE name=?", (new,))
+        db.execute("UPDATE files SET session=? WHERE session=?", (new, old))
+        db.execute("UPDATE sessions SET name=? WHERE name=?", (new, old))
+        _touch_session(db, new)
+    _write(fn)
+
+
+def remove_paths(paths: List[str]):
+    """Silinmiş mutlak dosya yollarını dizinden çıkar (saklama servisi için)."""
+    pairs = []
+    for p in paths:
+        sess_dir, name = os.path.split(p)
+        pairs.append((os.path.basename(sess_dir), name))
+    if not pairs:
+        return
+
+    def fn(db):
+        db.executemany("DELETE FROM files WHERE session=? AND name=?", pairs)
+        for sess in {s for s, _ in pairs}:
+            if os.path.isdir(os.path.join(_records_dir, sess)):
+                _touch_session(db, sess)
+            else:
+                db.execute("DELETE FROM sessions WHERE name=?", (sess,))
+    _write(fn)
+
+
+def pending_probe(limit: int = 8) -> List[Tuple[str, str, int, float]]:
+    """Süresi/çözünürlüğü bilinmeyen dosyalar (oturum, ad, boyut, mtime), yeniden eskiye."""
+    with _lock:
+        if _db is None:
+            return []
+        return _db.execute("SELECT session, name, size, mtime FROM files WHERE probed=0 "
+                           "ORDER BY mtime DESC LIMIT ?", (limit,)).fetchall()
+
+
+def update_meta(session: str, name: str, size: int, mtime: float, **meta) -> bool:
+    """Yoklama sonucunu yaz. Yalnızca boş alanlar doldurulur (writer'ın verdiği
+    değerler korunur); dosya yoklama sırasında değiştiyse (boyut/mtime farklı)
+    hiçbir şey yazılmaz ve False döner."""
+    cols = {k: meta[k] for k in _FILE_COLS[3:] if meta.get(k) is not None}
+    with _lock:
+        if _db is None:
+            return False
+        _db.execute("BEGIN")
+        try:
+            sets = "".join(f", {k}=COALESCE({k}, ?)" for k in cols)
+            cur = _db.execute(f"UPDATE files SET probed=1{sets} WHERE session=? AND name=? AND size=? AND mtime=?",
+                              (*cols.values(), session, name, size, mtime))
+            if cur.rowcount:
+                _bump()
+            _db.execute("COMMIT")
+        except Exception:
+            _db.execute("ROLLBACK")
+            raise
+    return bool(cur.rowcount)
+
+
+# ============================ Servis =====================================
+def _loop():
+    try:
+        reconcile()
+    except Exception as e:
+        LOG.error(f"Kayıt dizini eşitlenemedi: {e}")
+    # Dışarıdan yapılan değişiklikler: istek yolunu (ETag/304) taramadan tutmak için burada
+    while not _stop_evt.wait(max(0.5, RECORDS_INDEX_REFRESH_SEC)):
+        try:
+            refresh()
+        except Exception as e:
+            LOG.error(f"Kayıt dizini tazelenemedi: {e}")
+
+
+def get_stats() -> dict:
+    with _lock:
+        if _db is None:
+            return {"ready": False}
+        sessions = _db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        files, pending = _db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(probed = 0), 0) FROM files").fetchone()
+    out = dict(_stats)
+    out.update({"ready": ready(), "path": _db_path, "generation": _generation,
+                "sessions": sessions, "files": files, "probe_pending": pending})
+    return out
+
+
+def start_background(records_dir: str):
+    """Dizini aç; açılış eşitlemesi arka plan thread'inde yapılır."""
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    open_index(records_dir)
+    _stop_evt.clear()
+    _thread = threading.Thread(target=_loop, name="rec-index", daemon=True)
+    _thread.start()
+
+
+def stop_background():
+    _stop_evt.set()
+    close()
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""
+Kayıt dosyaları için video bilgisi (süre, kare sayısı, çözünürlük, fps),
+küçük resim ve isteğe bağlı kontak sayfası (sprite) önbelleği.
+
+Önbellek her oturum klasörünün altındaki .thumbs/ içinde, dosya boyutu ve
+mtime'ından türetilen anahtarla tutulur:
+    .thumbs/<dosya>.<anahtar>.jpg         küçük resim
+    .thumbs/<dosya>.<anahtar>.sprite.jpg  kontak sayfası (MEDIA_SPRITE_COLS x ROWS)
+    .thumbs/<dosya>.<anahtar>.json        video bilgisi
+Dosya değişirse (boyut/mtime) anahtar değişir; eski önbellek periyodik
+taramada silinir. Anahtar URL'de ?v= olarak verildiğinde yanıt uzun süre
+önbelleğe alınabilir (immutable).
+
+Arka plan worker'ı kapanan kayıt parçalarını (recordsVideo segment
+dinleyicisi) ve önbelleği eksik dosyaları (MEDIA_SWEEP_SEC aralıklı tarama)
+sırayla işler; çözme işi eventlet altında OS thread'inde yapılır. Bulunan
+bilgiler records_index'e yazılır. Yazılmakta olan dosyalara (son
+MEDIA_IDLE_SEC içinde değişmiş) dokunulmaz.
+
+main.py içinden start_background() ile çalışır.
+"""
+from __future__ import annotations
+
+import os
+import json
+import time
+import logging
+import threading
+from queue import Queue, Empty
+from typing import Optional, List, Dict, Tuple
+
+import cv2
+import numpy as np
+
+from native_io import native as _native
+
+# Kayıt klasörü, aktif dosya ve parça bildirimleri için
+try:
+    import recordsVideo
+except Exception:
+    recordsVideo = None
+
+# Oturum/dosya dizini (video bilgisi buraya yazılır)
+try:
+    import records_index
+except Exception:
+    records_index = None
+
+LOG = logging.getLogger(__name__)
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+RECORDS_DIR = getattr(recordsVideo, "RECORDS_DIR", None) or os.path.join(BASE_DIR, "clary", "records")
+THUMBS_DIR = ".thumbs"
+
+MEDIA_THUMB_WIDTH = int(os.environ.get("MEDIA_THUMB_WIDTH", "320"))
+MEDIA_THUMB_QUALITY = int(os.environ.get("MEDIA_THUMB_QUALITY", "80"))
+MEDIA_THUMB_AT = float(os.environ.get("MEDIA_THUMB_AT", "0.1"))        # sürenin bu oranındaki kare
+MEDIA_SPRITE = (os.environ.get("MEDIA_SPRITE", "0").strip() not in ("0", "false", "False"))  # arka planda da üret
+MEDIA_SPRITE_COLS = max(1, int(os.environ.get("MEDIA_SPRITE_COLS", "4")))
+MEDIA_SPRITE_ROWS = max(1, int(os.environ.get("MEDIA_SPRITE_ROWS", "3")))
+MEDIA_SPRITE_TILE_WIDTH = int(os.environ.get("MEDIA_SPRITE_TILE_WIDTH", "160"))
+MEDIA_IDLE_SEC = float(os.environ.get("MEDIA_IDLE_SEC", "10"))
+MEDIA_SWEEP_SEC = float(os.environ.get("MEDIA_SWEEP_SEC", "300"))
+MEDIA_JOB_PAUSE_SEC = float(os.environ.get("MEDIA_JOB_PAUSE_SEC", "0.2"))
+MEDIA_CACHE_MAX_AGE = int(os.environ.get("MEDIA_CACHE_MAX_AGE", str(365 * 86400)))
+
+
+def cache_key(size: int, mtime: float) -> str:
+    """Boyut + mtime (ms) anahtarı; dizindeki ve os.stat'taki değerlerden aynı çıkar."""
+    return f"{int(size):x}-{int(round(mtime * 1000)):x}"
+
+
+def _cache_paths(sess_dir: str, name: str, key: str) -> Dict[str, str]:
+    base = os.path.join(sess_dir, THUMBS_DIR, f"{name}.{key}")
+    return {"thumb": base + ".jpg", "sprite": base + ".sprite.jpg", "meta": base + ".json"}
+
+
+# ============================ Çıkarma (OS thread) =========================
+def _write_atomic(path: str, data: bytes):
+    tmp = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _encode_jpeg(img, width: int) -> bytes:
+    h, w = img.shape[:2]
+    if w > width:
+        img = cv2.resize(img, (width, max(1, int(h * width / w))), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), MEDIA_THUMB_QUALITY])
+    if not ok:
+        raise ValueError("JPEG kodlanamadı")
+    return buf.tobytes()
+
+
+def _read_at(cap, index: int, frames: int):
+    """index'teki kareyi oku; arama desteklenmiyorsa baştan okunan ilk kare."""
+    if frames > 0 and index > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, float(min(index, frames - 1)))
+    ok, img = cap.read()
+    if not ok and index > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0.0)
+        ok, img = cap.read()
+    return img if ok else None
+
+
+def _make_sprite(cap, frames: int) -> Optional[bytes]:
+    n = MEDIA_SPRITE_COLS * MEDIA_SPRITE_ROWS
+    tiles = []
+    for i in range(n):
+        img = _read_at(cap, int(frames * (i + 0.5) / n), frames) if frames > 0 else None
+        if img is None:
+            break
+        h, w = img.shape[:2]
+        tw = MEDIA_SPRITE_TILE_WIDTH
+        tiles.append(cv2.resize(img, (tw, max(1, int(h * tw / w))), interpolation=cv2.INTER_AREA))
+    if not tiles:
+        return None
+    th, tw = tiles[0].shape[:2]
+    sheet = np.zeros((th * MEDIA_SPRITE_ROWS, tw * MEDIA_SPRITE_COLS, 3), dtype=np.uint8)
+    for i, t in enumerate(tiles):
+        r, c = divmod(i, MEDIA_SPRITE_COLS)
+        t = t[:th, :tw]
+        sheet[r * th:r * th + t.shape[0], c * tw:c * tw + t.shape[1]] = t
+    return _encode_jpeg(sheet, sheet.shape[1])
+
+
+def _extract(path: str, sprite: bool, closed: bool = False) -> Optional[dict]:
+    """Önbelleği hazırla ve {size, mtime, key, meta, thumb, sprite} döndür.
+    Dosya yazılmakta görünüyorsa None (closed=True: writer kapattı, bekleme);
+    açılamıyorsa meta boş olur."""
+    st = os.stat(path)
+    sess_dir, name = os.path.split(path)
+    key = cache_key(st.st_size, st.st_mtime)
+    paths = _cache_paths(sess_dir, name, key)
+    res = {"size": st.st_size, "mtime": st.st_mtime, "key": key, "created": []}
+    meta = None
+    try:
+        with open(paths["meta"], "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        pass
+    have_thumb = os.path.exists(paths["thumb"])
+    have_sprite = os.path.exists(paths["sprite"])
+    if meta is not None and (have_thumb or not meta) and (have_sprite or not sprite or not meta):
+        res.update(meta=meta, thumb=paths["thumb"] if have_thumb else None,
+                   sprite=paths["sprite"] if have_sprite else None)
+        return res
+    if not closed and time.time() - st.st_mtime < MEDIA_IDLE_SEC:
+        return None
+
+    os.makedirs(os.path.join(sess_dir, THUMBS_DIR), exist_ok=True)
+    cap = cv2.VideoCapture(path)
+    try:
+        meta = {}
+        if cap.isOpened():
+            fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
+            frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0)
+            h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0)
+            if fps > 0:
+                meta["fps"] = round(fps, 3)
+            if frames > 0:
+                meta["frames"] = frames
+                if fps > 0:
+                    meta["duration"] = round(frames / fps, 2)
+            if w > 0 and h > 0:
+                meta["width"], meta["height"] = w, h
+            if not have_thumb:
+                img = _read_at(cap, int(frames * MEDIA_THUMB_AT), frames)
+                if img is not None:
+                    _write_atomic(paths["thumb"], _encode_jpeg(img, MEDIA_THUMB_WIDTH))
+                    have_thumb = True
+                    res["created"].append("thumb")
+            if sprite and not have_sprite:
+                data = _make_sprite(cap, frames)
+                if data is not None:
+                    _write_atomic(paths["sprite"], data)
+                    have_sprite = True
+                    res["created"].append("sprite")
+    finally:
+        cap.release()
+    # Açılamayan dosya için de (boş) bilgi yazılır; aynı anahtarla tekrar denenmez
+    _write_atomic(paths["meta"], json.dumps(meta).encode("utf-8"))
+    res.update(meta=meta, thumb=paths["thumb"] if have_thumb else None,
+               sprite=paths["sprite"] if have_sprite else None)
+    return res
+
+
+def _sweep_dir(sess_dir: str, files: List[Tuple[str, int, float]]) -> Tuple[List[str], int]:
+    """Önbelleği eksik dosyalar ve silinen eski önbellek sayısı (OS thread'inde)."""
+    tdir = os.path.join(sess_dir, THUMBS_DIR)
+    try:
+        cached = set(os.listdir(tdir))
+    except OSError:
+        cached = set()
+    wanted = set()
+    missing = []
+    for name, size, mtime in files:
+        p = _cache_paths(sess_dir, name, cache_key(size, mtime))
+        names = {os.path.basename(v) for v in p.values()}
+        wanted |= names
+        if os.path.basename(p["meta"]) not in cached:
+            missing.append(name)
+    pruned = 0
+    for fn in cached - wanted:
+        if fn.startswith("."):
+            continue  # yazılmakta olan geçici dosya
+        try:
+            os.remove(os.path.join(tdir, fn))
+            pruned += 1
+        except OSError:
+            pass
+    return missing, pruned
+
+
+# ============================ Servis =====================================
+_locks_guard = threading.Lock()
+_file_locks = {}  # type: Dict[Tuple[str, str], list]  # dosya başına üretim kilidi: [kilit, bekleyen sayısı]
+_queue = Queue()  # type: Queue
+_queued = set()
+_stop_evt = threading.Event()
+_thread = None  # type: Optional[threading.Thread]
+_stats_lock = threading.Lock()  # sayaçlar istek thread'lerinden ve worker'dan güncellenir
+_stats = {"processed": 0, "thumbs": 0, "sprites": 0, "errors": 0, "pruned": 0,
+          "last_sweep": None, "last_error": None}
+
+
+def _active_file() -> Tuple[Optional[str], Optional[str]]:
+    path = getattr(recordsVideo, "_current_path", None) if recordsVideo is not None else None
+    if not path:
+        return None, None
+    return os.path.basename(os.path.dirname(path)), os.path.basename(path)
+
+
+def ensure(session: str, name: str, sprite: bool = False, closed: bool = False) -> Optional[dict]:
+    """Dosyanın önbelleğini (gerekirse üreterek) döndür; yazılmakta olan veya
+    bulunamayan dosya için None. session ve name önceden doğrulanmış olmalı."""
+    if (session, name) == _active_file():
+        return None
+    path = os.path.join(RECORDS_DIR, session, name)
+    key = (session, name)
+    with _locks_guard:
+        entry = _file_locks.get(key)
+        if entry is None:
+            entry = _file_locks[key] = [threading.Lock(), 0]
+        entry[1] += 1
+    try:
+        with entry[0]:  # aynı dosya için eşzamanlı istekler tek kez üretir
+            res = _native(_extract, path, sprite, closed)
+    except FileNotFoundError:
+        return None
+    finally:
+        with _locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _file_locks[key]  # son kullanan bıraktı: silinen/yeniden adlandırılan dosyalar birikmesin
+    if res is None:
+        return None
+    if res["created"]:
+        with _stats_lock:
+            _stats["thumbs"] += "thumb" in res["created"]
+            _stats["sprites"] += "sprite" in res["created"]
+    if records_index is not None and res["meta"]:
+        try:
+            records_index.update_meta(session, name, res["size"], res["mtime"], **res["meta"])
+        except Exception as e:
+            LOG.error(f"Video bilgisi dizine yazılamadı ({session}/{name}): {e}")
+    return res
+
+
+def enqueue(session: str, name: str, closed: bool = False):
+    """Dosyayı arka plan işine ekle (zaten kuyruktaysa geç). closed=True:
+    writer'ın kapattığı parça, yazılma beklemesi gerekmez."""
+    if session.startswith(".") or name.startswith("."):
+        return
+    with _locks_guard:
+        if (session, name) in _queued:
+            return
+        _queued.add((session, name))
+    _queue.put((session, name, closed))
+
+
+def _on_segment(info: dict):
+    if info.get("session") and info.get("file"):
+        enqueue(info["session"], info["file"], closed=True)
+
+
+def _listing() -> List[Tuple[str, List[Tuple[str, int, float]]]]:
+    if records_index is not None and records_index.ready():
+        return [(s["name"], [(f["name"], f["size"], f["mtime"]) for f in records_index.list_files(s["name"])])
+                for s in records_index.list_sessions()]
+    if recordsVideo is not None:
+        out = []
+        for s in recordsVideo._scan_sessions():
+            try:
+                out.append((s["name"], [(f["name"], f["size"], f["mtime"])
+                                        for f in recordsVideo._list_files(s["name"])]))
+            except Exception:
+                continue
+        return out
+    return []
+
+
+def sweep() -> int:
+    """Önbelleği eksik dosyaları kuyruğa ekle, silinmiş dosyaların önbelleğini temizle."""
+    queued = pruned = 0
+    active = _active_file()
+    for sess, files in _listing():
+        missing, n = _native(_sweep_dir, os.path.join(RECORDS_DIR, sess), files)
+        pruned += n
+        for name in missing:
+            if (sess, name) != active:
+                enqueue(sess, name)
+                queued += 1
+    with _stats_lock:
+        _stats["pruned"] += pruned
+        _stats["last_sweep"] = time.time()
+    if queued or pruned:
+        LOG.info(f"Küçük resim taraması: {queued} dosya kuyrukta, {pruned} eski önbellek silindi")
+    return queued
+
+
+def _loop():
+    # Dizinin açılış eşitlemesini bekle (en fazla ~30 s), sonra ilk tarama
+    for _ in range(60):
+        if _stop_evt.is_set() or records_index is None or records_index.ready():
+            break
+        _stop_evt.wait(0.5)
+    next_sweep = 0.0
+    while not _stop_evt.is_set():
+        if time.monotonic() >= next_sweep:
+            try:
+                sweep()
+            except Exception as e:
+                LOG.error(f"Küçük resim taraması hatası: {e}")
+            next_sweep = time.monotonic() + MEDIA_SWEEP_SEC
+        try:
+            sess, name, closed = _queue.get(timeout=min(5.0, max(0.1, next_sweep - time.monotonic())))
+        except Empty:
+            continue
+        with _locks_guard:
+            _queued.discard((sess, name))
+        try:
+            if ensure(sess, name, sprite=MEDIA_SPRITE, closed=closed) is not None:
+                with _stats_lock:
+                    _stats["processed"] += 1
+        except Exception as e:
+            with _stats_lock:
+                _stats["errors"] += 1
+                _stats["last_error"] = f"{sess}/{name}: {e}"
+            LOG.error(f"Küçük resim üretilemedi ({sess}/{name}): {e}")
+        _stop_evt.wait(MEDIA_JOB_PAUSE_SEC)
+
+
+def get_stats() -> dict:
+    with _stats_lock:
+        out = dict(_stats)
+    out["queued"] = _queue.qsize()
+    out["running"] = _thread is not None and _thread.is_alive()
+    return out
+
+
+def start_background():
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _stop_evt.clear()
+    if recordsVideo is not None:
+        recordsVideo.add_segment_listener(_on_segment)
+    _thread = threading.Thread(target=_loop, name="rec-media", daemon=True)
+    _thread.start()
+    LOG.info("Küçük resim/video bilgisi servisi başlatıldı")
+
+
+def stop_background():
+    _stop_evt.set()
+
+
+# ============================ HTTP yanıtı =================================
+def image_response(session: str, name: str, kind: str = "thumb", version: Optional[str] = None):
+    """Küçük resim / sprite yanıtı (flask Response) ya da hazır değilse None.
+    version (?v=) geçerli anahtarla eşleşiyorsa yanıt uzun süreli önbelleklenir;
+    aksi halde ETag ile her seferinde doğrulanır (304)."""
+    from flask import send_file
+    res = ensure(session, name, sprite=(kind == "sprite"))
+    path = res and res.get(kind)
+    if not path:
+        return None
+    resp = send_file(path, mimetype="image/jpeg", conditional=True,
+                     etag=f"{res['key']}-{kind}", last_modified=res["mtime"], max_age=0)
+    # Kayıtlar oturum/token arkasında: paylaşılan önbellekler saklamasın
+    resp.cache_control.public = False
+    resp.cache_control.private = True
+    if version and version == res["key"]:
+        resp.cache_control.max_age = MEDIA_CACHE_MAX_AGE
+        resp.cache_control.immutable = True
+        resp.cache_control.no_cache = None
+    else:
+        resp.cache_control.max_age = 0
+        resp.cache_control.no_cache = True
+    return resp
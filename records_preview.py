@@ -0,0 +1,536 @@
+# -*- coding: utf-8 -*-
+"""
+Mobil indirmeler için düşük bit hızlı, düşük çözünürlüklü önizleme kopyaları.
+
+Tam kaliteli kayıt (MJPG AVI, onlarca Mbit/s) 2.4 GHz AP üzerinden hızlı
+gözden geçirme için çok büyüktür. Önizleme bir kez üretilip diskte
+önbelleklenir:
+    RECORDS_DIR/.previews/<oturum>/<dosya>.<anahtar>.mp4   (ffmpeg varsa, H.264)
+    RECORDS_DIR/.previews/<oturum>/<dosya>.<anahtar>.avi   (yoksa düşük kaliteli MJPG)
+Anahtar kaynak dosyanın boyut + mtime'ıdır; kaynak değişirse yeni önizleme
+üretilir, eskisi temizlenir. Önbelleğin toplam boyutu PREVIEW_CACHE_MAX_MB ile
+sınırlıdır; en uzun süredir istenmeyen önizlemeler silinir (LRU, her sunumda
+dosya mtime'ı güncellenir).
+
+Üretim tek bir arka plan worker'ında, sırayla ve düşük öncelikle yapılır:
+ffmpeg `nice -n 19` / `ionice -c 3` ile, cv2 yedeği idle G/Ç sınıfında ve en
+düşük CPU önceliğinde, yalnızca o iş için açılan bir OS thread'inde çalışır.
+İstenen dosya sıranın başına alınır. H.264 çıktı parçalı MP4'tür; bu yüzden
+üretim sürerken bile istemciye aktarılabilir (stream_response, büyüyen dosyayı
+okur). MJPG AVI'nin başlığı ancak dosya kapanınca yazıldığından o, üretim
+bitince Range destekli dosya olarak sunulur. İstek başına bekleme
+PREVIEW_START_WAIT_SEC ile sınırlıdır; aşılırsa 503 + Retry-After döner.
+
+PREVIEW_AUTO=1 ise kapanan her kayıt parçası için önizleme önceden üretilir.
+"""
+from __future__ import annotations
+
+import os
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from collections import deque
+from typing import Optional, Dict, Tuple
+
+import cv2
+
+import record_backends
+from avi_mjpeg import MjpegAviWriter
+from native_io import IdleIo, native as _native, OsThread as _OsThread
+
+# Kayıt klasörü, aktif dosya ve parça bildirimleri için
+try:
+    import recordsVideo
+except Exception:
+    recordsVideo = None
+
+LOG = logging.getLogger(__name__)
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+RECORDS_DIR = getattr(recordsVideo, "RECORDS_DIR", None) or os.path.join(BASE_DIR, "clary", "records")
+PREVIEWS_DIR = os.path.join(RECORDS_DIR, ".previews")
+
+PREVIEW_HEIGHT = int(os.environ.get("PREVIEW_HEIGHT", "360"))
+PREVIEW_FPS = float(os.environ.get("PREVIEW_FPS", "12"))
+PREVIEW_BITRATE_KBPS = int(os.environ.get("PREVIEW_BITRATE_KBPS", "400"))
+PREVIEW_X264_CRF = int(os.environ.get("PREVIEW_X264_CRF", "32"))
+PREVIEW_JPEG_QUALITY = int(os.environ.get("PREVIEW_JPEG_QUALITY", "40"))   # ffmpeg yoksa MJPG yedeği
+PREVIEW_MJPEG_HEIGHT = int(os.environ.get("PREVIEW_MJPEG_HEIGHT", "240"))
+PREVIEW_CACHE_MAX_MB = float(os.environ.get("PREVIEW_CACHE_MAX_MB", "1024"))
+PREVIEW_AUTO = (os.environ.get("PREVIEW_AUTO", "0").strip() not in ("0", "false", "False"))
+PREVIEW_TIMEOUT_SEC = float(os.environ.get("PREVIEW_TIMEOUT_SEC", "1800"))
+PREVIEW_RETRY_SEC = float(os.environ.get("PREVIEW_RETRY_SEC", "300"))
+PREVIEW_START_WAIT_SEC = float(os.environ.get("PREVIEW_START_WAIT_SEC", "15"))  # istek başına en uzun bekleme (sıra dahil)
+PREVIEW_RETRY_AFTER_SEC = int(os.environ.get("PREVIEW_RETRY_AFTER_SEC", "5"))
+
+
+def _key(st: os.stat_result) -> str:
+    return f"{st.st_size:x}-{int(round(st.st_mtime * 1000)):x}"
+
+
+def _use_ffmpeg() -> bool:
+    return record_backends.ffmpeg_encoder() is not None
+
+
+def _ext() -> str:
+    return ".mp4" if _use_ffmpeg() else ".avi"
+
+
+# ============================ Üretim =====================================
+class _Job:
+    __slots__ = ("session", "name", "src", "key", "out", "part", "state", "error",
+                 "created", "started", "finished", "proc", "done")
+
+    def __init__(self, session: str, name: str, src: str, key: str, out: str):
+        self.session, self.name, self.src, self.key, self.out = session, name, src, key, out
+        self.part = out + ".part"
+        self.state = "queued"  # queued | running | done | failed
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.proc = None
+        self.done = threading.Event()
+
+    def info(self) -> dict:
+        return {"session": self.session, "file": self.name, "state": self.state, "error": self.error,
+                "bytes": _size(self.out if self.state == "done" else self.part)}
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _ffmpeg_command(src: str, dst: str) -> list:
+    enc = record_backends.ffmpeg_encoder()
+    cmd = []
+    if shutil.which("nice"):
+        cmd += ["nice", "-n", "19"]
+    if shutil.which("ionice"):
+        cmd += ["ionice", "-c", "3"]
+    cmd += [shutil.which("ffmpeg") or "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin", "-y",
+            "-i", src, "-an", "-vf", f"scale=-2:{PREVIEW_HEIGHT},fps={PREVIEW_FPS:g}",
+            "-c:v", enc, "-g", str(max(1, int(PREVIEW_FPS * 2)))]
+    if enc == "libx264":
+        cmd += ["-preset", "veryfast", "-crf", str(PREVIEW_X264_CRF),
+                "-maxrate", f"{PREVIEW_BITRATE_KBPS}k", "-bufsize", f"{PREVIEW_BITRATE_KBPS * 2}k",
+                "-pix_fmt", "yuv420p"]
+    else:
+        cmd += ["-b:v", f"{PREVIEW_BITRATE_KBPS}k", "-pix_fmt", "nv12"]
+    # Parçalı MP4: moov başta, üretim sürerken istemci oynatabilir
+    return cmd + ["-movflags", "+frag_keyframe+empty_moov+default_base_moof", "-f", "mp4", dst]
+
+
+def _run_ffmpeg(job: _Job):
+    cmd = _ffmpeg_command(job.src, job.part)
+    LOG.info(f"Önizleme üretiliyor: {' '.join(cmd)}")
+    job.proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE)
+    try:
+        _, err = job.proc.communicate(timeout=PREVIEW_TIMEOUT_SEC)
+    except subprocess.TimeoutExpired:
+        job.proc.kill()
+        job.proc.wait()
+        raise RuntimeError("ffmpeg zaman aşımı")
+    if job.proc.returncode != 0:
+        tail = (err or b"").decode(errors="replace").strip().splitlines()[-3:]
+        raise RuntimeError(f"ffmpeg çıkış kodu {job.proc.returncode}: {' | '.join(tail)}")
+
+
+def _transcode_mjpeg(src: str, dst: str, stop: threading.Event):
+    """ffmpeg yoksa: cv2 ile çöz, küçült, düşük kaliteli JPEG ile AVI'ye yaz.
+    _run_mjpeg'in açtığı OS thread'inde, idle G/Ç önceliğinde çalışır."""
+    io = IdleIo()
+    io.__enter__()
+    cap = cv2.VideoCapture(src)
+    writer = None
+    try:
+        if not cap.isOpened():
+            raise RuntimeError("kaynak açılamadı")
+        src_fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0) or PREVIEW_FPS
+        fps = min(PREVIEW_FPS, src_fps)
+        step = src_fps / fps
+        next_pick = 0.0
+        i = 0
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), PREVIEW_JPEG_QUALITY]
+        while not stop.is_set():
+            if i + 1 < next_pick:
+                if not cap.grab():  # atlanan kareyi çözmeden geç
+                    break
+                i += 1
+                continue
+            ok, img = cap.read()
+            if not ok:
+                break
+            i += 1
+            next_pick += step
+            h, w = img.shape[:2]
+            if h > PREVIEW_MJPEG_HEIGHT:
+                nw = max(2, int(w * PREVIEW_MJPEG_HEIGHT / h) // 2 * 2)
+                img = cv2.resize(img, (nw, PREVIEW_MJPEG_HEIGHT), interpolation=cv2.INTER_AREA)
+            if writer is None:
+                writer = MjpegAviWriter(dst, fps, (img.shape[1], img.shape[0]), buffer_size=64 * 1024)
+            ok, buf = cv2.imencode(".jpg", img, params)
+            if ok:
+                writer.write(buf.tobytes())
+        if stop.is_set():
+            raise RuntimeError("durduruldu")
+        if writer is None:
+            raise RuntimeError("kare okunamadı")
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+        io.__exit__(None, None, None)
+
+
+def _run_mjpeg(job: _Job):
+    """cv2 yedeğini bu iş için açılan ayrı bir OS thread'inde çalıştır: CPU
+    önceliği o thread'le birlikte biter (paylaşılan tpool thread'i nice'lanmaz)."""
+    err = []
+
+    def work():
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)  # yalnızca bu thread
+        except (AttributeError, OSError):
+            pass
+        try:
+            _transcode_mjpeg(job.src, job.part, _stop_evt)
+        except Exception as e:
+            err.append(e)
+
+    t = _OsThread(target=work, name="rec-preview-mjpeg", daemon=True)
+    t.start()
+    while t.is_alive():  # eventlet altında da hub'ı bloklamadan bekle
+        time.sleep(0.25)
+    if err:
+        raise err[0]
+
+
+def _run(job: _Job):
+    os.makedirs(os.path.dirname(job.out), exist_ok=True)
+    try:
+        if job.out.endswith(".mp4"):
+            _run_ffmpeg(job)
+        else:
+            _run_mjpeg(job)
+        os.replace(job.part, job.out)
+    except Exception:
+        try:
+            os.remove(job.part)
+        except OSError:
+            pass
+        raise
+
+
+# ============================ Önbellek (LRU) ==============================
+def _evict(keep: Tuple[str, ...] = ()) -> Tuple[int, int]:
+    """Kaynağı silinmiş/değişmiş önizlemeleri ve boyut sınırını aşan en eski
+    kullanılanları sil (OS thread'inde). (silinen dosya, byte) döndürür."""
+    entries = []
+    removed = freed = 0
+    try:
+        sessions = os.listdir(PREVIEWS_DIR)
+    except OSError:
+        return 0, 0
+    for sess in sessions:
+        sdir = os.path.join(PREVIEWS_DIR, sess)
+        try:
+            names = os.listdir(sdir)
+        except OSError:
+            continue
+        for fn in names:
+            path = os.path.join(sdir, fn)
+            if fn.endswith(".part") or path in keep:
+                continue  # üretimde
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            base, _ = os.path.splitext(fn)
+            src_name, _, key = base.rpartition(".")
+            try:
+                stale = _key(os.stat(os.path.join(RECORDS_DIR, sess, src_name))) != key
+            except OSError:
+                stale = True
+            if stale:
+                try:
+                    os.remove(path)
+                    removed += 1
+                    freed += st.st_size
+                except OSError:
+                    pass
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        try:
+            os.rmdir(sdir)  # boşaldıysa
+        except OSError:
+            pass
+    total = sum(e[1] for e in entries)
+    limit = PREVIEW_CACHE_MAX_MB * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+            freed += size
+            total -= size
+        except OSError:
+            pass
+    return removed, freed
+
+
+# ============================ Servis =====================================
+_cond = threading.Condition()
+_pending = deque()  # type: deque  # bekleyen _Job'lar (öncelikli olanlar başta)
+_jobs = {}  # type: Dict[Tuple[str, str], _Job]  # (oturum, dosya) -> son iş
+_current = None  # type: Optional[_Job]
+_stop_evt = threading.Event()
+_thread = None  # type: Optional[threading.Thread]
+_stats = {"generated": 0, "failed": 0, "evicted": 0, "served": 0, "last_error": None}
+
+
+def _active_file() -> Tuple[Optional[str], Optional[str]]:
+    path = getattr(recordsVideo, "_current_path", None) if recordsVideo is not None else None
+    if not path:
+        return None, None
+    return os.path.basename(os.path.dirname(path)), os.path.basename(path)
+
+
+def is_active(session: str, name: str) -> bool:
+    """Dosya hâlâ kaydediliyor mu? (önizlemesi üretilemez)"""
+    return (session, name) == _active_file()
+
+
+def lookup(session: str, name: str) -> Tuple[Optional[str], Optional[_Job]]:
+    """(hazır önizleme yolu, sürmekte olan iş). İkisi de None ise üretilmemiş."""
+    try:
+        st = os.stat(os.path.join(RECORDS_DIR, session, name))
+    except OSError:
+        return None, None
+    out = os.path.join(PREVIEWS_DIR, session, f"{name}.{_key(st)}{_ext()}")
+    if os.path.exists(out):
+        return out, None
+    with _cond:
+        job = _jobs.get((session, name))
+    if job is not None and job.out == out and job.state in ("queued", "running"):
+        return None, job
+    return None, None
+
+
+def enqueue(session: str, name: str, urgent: bool = False) -> Optional[_Job]:
+    """Önizleme üretimini kuyruğa al (zaten varsa/sürüyorsa mevcut işi döndür).
+    urgent=True ise sıranın başına alınır. Kaynak yoksa veya yazılıyorsa None."""
+    if is_active(session, name):
+        return None
+    src = os.path.join(RECORDS_DIR, session, name)
+    try:
+        st = os.stat(src)
+    except OSError:
+        return None
+    out = os.path.join(PREVIEWS_DIR, session, f"{name}.{_key(st)}{_ext()}")
+    with _cond:
+        job = _jobs.get((session, name))
+        if job is not None and job.out == out and job.state == "failed" \
+                and time.time() - (job.finished or 0) < PREVIEW_RETRY_SEC:
+            return None  # aynı kaynak az önce üretilemedi; her istekte yeniden deneme
+        if job is not None and job.out == out and job.state in ("queued", "running"):
+            if urgent and job.state == "queued" and _pending and _pending[0] is not job:
+                _pending.remove(job)
+                _pending.appendleft(job)
+            return job
+        if os.path.exists(out):
+            return None
+        job = _Job(session, name, src, _key(st), out)
+        _jobs[(session, name)] = job
+        if urgent:
+            _pending.appendleft(job)
+        else:
+            _pending.append(job)
+        _cond.notify()
+    return job
+
+
+def _on_segment(info: dict):
+    if info.get("session") and info.get("file"):
+        enqueue(info["session"], info["file"])
+
+
+def _loop():
+    global _current
+    try:
+        n, freed = _native(_evict)
+        if n:
+            LOG.info(f"Önizleme önbelleği: {n} dosya ({freed / 1048576:.1f} MB) temizlendi")
+    except Exception as e:
+        LOG.error(f"Önizleme önbelleği temizlenemedi: {e}")
+    while not _stop_evt.is_set():
+        with _cond:
+            while not _pending and not _stop_evt.is_set():
+                _cond.wait(5.0)
+            if _stop_evt.is_set():
+                break
+            job = _pending.popleft()
+            job.state = "running"
+            job.started = time.time()
+            _current = job
+        try:
+            _run(job)
+            job.state = "done"
+            _stats["generated"] += 1
+            LOG.info(f"Önizleme hazır: {job.session}/{job.name} ({_size(job.out) / 1048576:.1f} MB, "
+                     f"{time.time() - job.started:.1f}s)")
+        except Exception as e:
+            job.state = "failed"
+            job.error = str(e)
+            _stats["failed"] += 1
+            _stats["last_error"] = f"{job.session}/{job.name}: {e}"
+            LOG.error(f"Önizleme üretilemedi ({job.session}/{job.name}): {e}")
+        finally:
+            job.finished = time.time()
+            job.proc = None
+            job.done.set()
+            with _cond:
+                _current = None
+        try:
+            n, _ = _native(_evict, (job.out,))
+            _stats["evicted"] += n
+        except Exception as e:
+            LOG.error(f"Önizleme önbelleği temizlenemedi: {e}")
+
+
+def get_stats() -> dict:
+    with _cond:
+        cur = _current.info() if _current is not None else None
+        queued = len(_pending)
+    out = dict(_stats)
+    out.update({"running": _thread is not None and _thread.is_alive(), "current": cur, "queued": queued,
+                "encoder": record_backends.ffmpeg_encoder() or "mjpeg",
+                "cache_max_mb": PREVIEW_CACHE_MAX_MB})
+    return out
+
+
+def start_background():
+    global _thread
+    if _thread is not None and _thread.is_alive():
+        return
+    _stop_evt.clear()
+    if PREVIEW_AUTO and recordsVideo is not None:
+        recordsVideo.add_segment_listener(_on_segment)
+    _thread = threading.Thread(target=_loop, name="rec-preview", daemon=True)
+    _thread.start()
+    LOG.info(f"Önizleme servisi başlatıldı ({'ffmpeg ' + record_backends.ffmpeg_encoder() if _use_ffmpeg() else 'MJPG yedeği'})")
+
+
+def stop_background():
+    _stop_evt.set()
+    with _cond:
+        job = _current
+        _cond.notify_all()
+    if job is not None and job.proc is not None:
+        try:
+            job.proc.kill()
+        except Exception:
+            pass
+
+
+# ============================ HTTP yanıtı =================================
+def _touch(path: str):
+    try:
+        os.utime(path)  # LRU: son kullanım
+    except OSError:
+        pass
+
+
+def _wait(job: _Job, deadline: float) -> bool:
+    """Akış başlatılabilene (MP4: .part oluştu; AVI: üretim bitti) ya da iş
+    sonlanana dek bekle. Süre mutlak; sırada beklemek de sayılır."""
+    stream = job.out.endswith(".mp4")
+    while not job.done.is_set():
+        if stream and job.state == "running" and os.path.exists(job.part):
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        job.done.wait(min(0.2, remaining))
+    return True
+
+
+def _follow(job: _Job, chunk: int = 256 * 1024):
+    """Üretilmekte olan (parçalı MP4) önizlemeyi büyüdükçe gönder; iş bitince
+    kalanı gönderip kapan."""
+    fd = None
+    try:
+        for path in (job.part, job.out):  # arada .part -> son ad olmuş olabilir
+            try:
+                fd = os.open(path, os.O_RDONLY)
+                break
+            except FileNotFoundError:
+                continue
+        if fd is None:
+            return
+        pos = 0
+        while True:
+            data = _native(os.pread, fd, chunk, pos)
+            if data:
+                pos += len(data)
+                yield data
+                continue
+            if job.done.is_set():
+                # .part -> son ad yeniden adlandırması fd'yi etkilemez; son byte'lar da okundu
+                if job.state != "done":
+                    LOG.warning(f"Önizleme akışı yarım kaldı: {job.session}/{job.name} ({job.error})")
+                return
+            job.done.wait(0.25)
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+
+def stream_response(session: str, name: str):
+    """Önizleme yanıtı: hazırsa Range destekli dosya; değilse üretimi başlatıp
+    (MP4) büyüyen dosyayı parça parça aktaran yanıt ya da (AVI) üretimin
+    bitmesini bekleyip dosya. PREVIEW_START_WAIT_SEC içinde başlayamazsa
+    503 + Retry-After. Üretilemiyorsa None."""
+    from flask import Response, jsonify
+    import file_response
+    deadline = time.monotonic() + PREVIEW_START_WAIT_SEC
+    out, job = lookup(session, name)
+    if out is None and job is None:
+        job = enqueue(session, name, urgent=True)
+        if job is None:
+            out, job = lookup(session, name)  # bu arada bitmiş olabilir
+    else:
+        if job is not None:
+            enqueue(session, name, urgent=True)
+    if out is None and job is not None:
+        if not _wait(job, deadline):
+            resp = jsonify({"success": False, "error": "Önizleme hazırlanıyor", "state": job.state})
+            resp.status_code = 503
+            resp.headers["Retry-After"] = str(PREVIEW_RETRY_AFTER_SEC)
+            resp.headers["X-Preview-State"] = job.state
+            return resp
+        if job.done.is_set():
+            if job.state != "done":
+                return None
+            out = job.out
+    if out is not None:
+        _touch(out)
+        _stats["served"] += 1
+        base, _ = os.path.splitext(name)
+        return file_response.send_range_file(out, download_name=f"{base}_preview{os.path.splitext(out)[1]}",
+                                             as_attachment=False)
+    if job is None:
+        return None
+    _stats["served"] += 1
+    resp = Response(_follow(job), mimetype="video/mp4", direct_passthrough=True)
+    resp.headers["Cache-Control"] = "no-store"
+    resp.headers["Accept-Ranges"] = "none"
+    resp.headers["X-Preview-State"] = job.state
+    return resp
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Kayıt klasörü (clary/records) için otomatik saklama (retention) servisi.
+
+Politikalar (0 = kapalı):
+    RETENTION_MAX_GB          kayıtların toplam boyutu üst sınırı
+    RETENTION_MAX_AGE_DAYS    bundan eski dosyalar silinir
+    RETENTION_MIN_FREE_PCT    diskte en az bu kadar boş alan kalmalı
+
+Yalnızca aktif olmayan oturumların dosyaları silinir, en eskisi önce. Aktif
+oturumun hiçbir dosyasına (kapanmış parçalar dahil) ve son
+RETENTION_MIN_AGE_SEC içinde değişmiş dosyalara dokunulmaz; bunlar silinmeden
+yer yetmezse kaydedicinin kendi disk dolu koruması devreye girer. Boşalan
+(aktif olmayan) oturum klasörleri kaldırılır.
+
+Silme küçük gruplar hâlinde, gruplar arasında bekleyerek ve düşük G/Ç
+önceliğiyle (ionice idle sınıfı, yalnızca silmeyi yapan thread için) yapılır.
+Büyük dosyalar önce silinir, sonra (açık okuyucusu yoksa) adım adım
+kısaltılır; böylece çok GB'lık bir oturumun silinmesi kayıt writer'ının disk
+erişimini bir anda kilitlemez ve indirilmekte olan dosyanın içeriği bozulmaz.
+
+Varsayılan olarak yalnızca RETENTION_MIN_FREE_PCT=10 açıktır: disk %10'un
+altına indiğinde eski oturumların en eski kayıtları kendiliğinden silinir.
+Kapatmak için RETENTION_MIN_FREE_PCT=0.
+
+main.py içinden start_background() ile çalışır; elle:
+    python3 records_retention.py --dry-run       # ne silineceğini göster
+    python3 records_retention.py --once          # bir tur uygula
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import threading
+from typing import List, Optional, Tuple
+
+# Eventlet altında (main.py) silme gerçek bir OS thread'inde yapılır: hub
+# bloklanmaz ve ioprio yalnızca o thread'e uygulanır (iş bitince geri alınır).
+from native_io import IdleIo, native as _native, os_sleep as _os_sleep
+
+# Aktif oturum / dosya bilgisi için (yoksa yalnızca RECORDS_DIR taranır)
+try:
+    import recordsVideo
+except Exception:
+    recordsVideo = None
+
+# Silinen dosyaları oturum/dosya dizininden düşmek için
+try:
+    import records_index
+except Exception:
+    records_index = None
+
+# Merkezi loglama sistemi
+try:
+    import system_logger as syslog
+except Exception:
+    syslog = None
+
+LOG = logging.getLogger(__name__)
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+RECORDS_DIR = getattr(recordsVideo, "RECORDS_DIR", None) or os.path.join(BASE_DIR, "clary", "records")
+
+RETENTION_MAX_GB = float(os.environ.get("RETENTION_MAX_GB", "0"))
+RETENTION_MAX_AGE_DAYS = float(os.environ.get("RETENTION_MAX_AGE_DAYS", "0"))
+RETENTION_MIN_FREE_PCT = float(os.environ.get("RETENTION_MIN_FREE_PCT", "10"))
+RETENTION_INTERVAL_SEC = float(os.environ.get("RETENTION_INTERVAL_SEC", "600"))    # tam tarama aralığı
+RETENTION_CHECK_SEC = float(os.environ.get("RETENTION_CHECK_SEC", "30"))           # boş alan kontrol aralığı
+RETENTION_MIN_AGE_SEC = float(os.environ.get("RETENTION_MIN_AGE_SEC", "120"))
+RETENTION_BATCH_FILES = max(1, int(os.environ.get("RETENTION_BATCH_FILES", "10")))
+RETENTION_BATCH_PAUSE_SEC = float(os.environ.get("RETENTION_BATCH_PAUSE_SEC", "1.0"))
+RETENTION_TRUNCATE_STEP_MB = float(os.environ.get("RETENTION_TRUNCATE_STEP_MB", "128"))
+RETENTION_IONICE = (os.environ.get("RETENTION_IONICE", "1").strip() not in ("0", "false", "False"))
+
+# ============================ Tarama ve plan ==============================
+class _Entry:
+    __slots__ = ("session", "name", "path", "size", "mtime", "active")
+
+    def __init__(self, session, name, path, size, mtime, active):
+        self.session, self.name, self.path = session, name, path
+        self.size, self.mtime, self.active = size, mtime, active
+
+
+def _active() -> Tuple[Optional[str], Optional[str]]:
+    """(aktif oturum, yazılmakta olan dosya adı)"""
+    if recordsVideo is None:
+        return None, None
+    return getattr(recordsVideo, "SESSION_NAME", None), getattr(recordsVideo, "_current_file", None)
+
+
+def scan(records_dir: Optional[str] = None) -> List[_Entry]:
+    """Oturum klasörlerindeki kayıt dosyaları (nokta ile başlayanlar hariç)."""
+    records_dir = records_dir or RECORDS_DIR
+    active_session, _ = _active()
+    entries = []
+    try:
+        sessions = os.listdir(records_dir)
+    except OSError:
+        return entries
+    for sess in sessions:
+        sdir = os.path.join(records_dir, sess)
+        if sess.startswith(".") or not os.path.isdir(sdir):
+            continue
+        try:
+            it = os.scandir(sdir)
+        except OSError:
+            continue
+        with it:
+            for de in it:
+                if de.name.startswith("."):
+                    continue
+                try:
+                    if not de.is_file(follow_symlinks=False):
+                        continue
+                    st = de.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                entries.append(_Entry(sess, de.name, de.path, st.st_size, st.st_mtime, sess == active_session))
+    return entries
+
+
+def plan(entries: List[_Entry], now: Optional[float] = None,
+         usage: Optional[Tuple[int, int, int]] = None) -> List[Tuple[_Entry, str]]:
+    """Silinecek dosyalar ve nedenleri (sırayla). usage: shutil.disk_usage sonucu."""
+    now = time.time() if now is None else now
+    # Yalnızca aktif olmayan oturumlar, en eski dosya önce
+    candidates = sorted(
+        (e for e in entries if not e.active and now - e.mtime >= RETENTION_MIN_AGE_SEC),
+        key=lambda e: e.mtime)
+    chosen = []
+    picked = set()
+
+    def take(e, reason):
+        picked.add(e.path)
+        chosen.append((e, reason))
+        return e.size
+
+    if RETENTION_MAX_AGE_DAYS > 0:
+        limit = now - RETENTION_MAX_AGE_DAYS * 86400
+        for e in candidates:
+            if e.mtime < limit:
+                take(e, "max_age")
+
+    total = sum(e.size for e in entries) - sum(e.size for e, _ in chosen)
+    if RETENTION_MAX_GB > 0:
+        max_bytes = RETENTION_MAX_GB * 1024 ** 3
+        for e in candidates:
+            if total <= max_bytes:
+                break
+            if e.path not in picked:
+                total -= take(e, "max_total")
+
+    if RETENTION_MIN_FREE_PCT > 0:
+        if usage is None:
+            try:
+                usage = shutil.disk_usage(RECORDS_DIR)
+            except OSError:
+                usage = None
+        if usage is not None and usage[0] > 0:
+            free = usage[2] + sum(e.size for e, _ in chosen)
+            need = usage[0] * RETENTION_MIN_FREE_PCT / 100.0
+            for e in candidates:
+                if free >= need:
+                    break
+                if e.path not in picked:
+                    free += take(e, "min_free")
+    return chosen
+
+
+# ============================ Silme ======================================
+def _open_elsewhere(st: os.stat_result, own_fd: int) -> bool:
+    """Bu süreçte dosyayı (aynı inode) açık tutan başka bir fd var mı?
+    Okuyucular (file_response, records_export, records_media, records_preview)
+    web sunucusuyla aynı süreçte çalışır; /proc okunamıyorsa açık sayılır."""
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return True
+    for name in fds:
+        try:
+            fd = int(name)
+            if fd == own_fd:
+                continue
+            other = os.stat(f"/proc/self/fd/{fd}")
+        except (ValueError, OSError):
+            continue
+        if other.st_ino == st.st_ino and other.st_dev == st.st_dev:
+            return True
+    return False
+
+
+def _unlink_gently(path: str) -> int:
+    """Dosyayı sil, sonra (başka okuyan yoksa) adım adım kısaltarak blokları
+    serbest bırak; serbest kalan byte'ları döndür. Tek seferde büyük bir
+    unlink, dosya sisteminin tüm blokları bir anda serbest bırakmasına (ve
+    diğer yazmaların beklemesine) yol açar. Önce silindiği için yeni okuyucu
+    açılamaz; açık bir okuyucu varsa içerik kısaltılmaz, alan o kapanınca
+    boşalır."""
+    step = int(RETENTION_TRUNCATE_STEP_MB * 1024 * 1024)
+    try:
+        fd = os.open(path, os.O_WRONLY)
+    except PermissionError:
+        fd = None  # yazmaya açılamıyorsa doğrudan silinir
+    try:
+        if fd is None:
+            size = os.path.getsize(path)
+            os.unlink(path)
+            return size
+        st = os.fstat(fd)
+        size = st.st_size
+        os.unlink(path)
+        if step > 0 and size > step and not _open_elsewhere(st, fd):
+            try:
+                cur = size
+                while cur > step:
+                    cur -= step
+                    os.ftruncate(fd, cur)
+                    _os_sleep(0.05)
+            except OSError:
+                pass  # kalan bloklar fd kapanınca serbest kalır
+        return size
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+
+def _delete_batch(paths: List[str]) -> Tuple[List[str], int, List[str]]:
+    """Bir grup dosyayı düşük G/Ç önceliğiyle sil (OS thread'inde çalışır).
+    (silinen yollar, serbest kalan byte, hatalar) döndürür."""
+    done = []
+    nbytes = 0
+    errors = []
+    with IdleIo(RETENTION_IONICE):
+        for p in paths:
+            try:
+                nbytes += _unlink_gently(p)
+                done.append(p)
+            except FileNotFoundError:
+                pass  # başkası silmiş; dizin refresh ile güncellenir
+            except OSError as e:
+                errors.append(f"{os.path.basename(p)}: {e}")
+    return done, nbytes, errors
+
+
+def _remove_empty_sessions(sessions, records_dir: Optional[str] = None) -> List[str]:
+    """İçinde kayıt dosyası kalmamış, aktif olmayan oturum klasörlerini kaldır."""
+    records_dir = records_dir or RECORDS_DIR
+    active_session, _ = _active()
+    removed = []
+    for sess in sessions:
+        if sess == active_session:
+            continue
+        sdir = os.path.join(records_dir, sess)
+        try:
+            if any(not n.startswith(".") for n in os.listdir(sdir)):
+                continue
+            shutil.rmtree(sdir)  # yalnızca gizli yardımcı dosyalar (küçük resim vb.) kaldı
+            removed.append(sess)
+        except OSError:
+            continue
+    return removed
+
+
+# ============================ Servis =====================================
+_stats_lock = threading.Lock()
+_stats = {
+    "runs": 0, "last_run": None, "last_duration_sec": None,
+    "deleted_files": 0, "deleted_bytes": 0, "removed_sessions": 0,
+    "last_reasons": {}, "errors": 0, "running": False,
+}
+_wake = threading.Event()
+_stop_evt = threading.Event()
+_thread = None  # type: Optional[threading.Thread]
+
+
+def _policy_breached() -> bool:
+    """Ucuz kontrol: boş alan sınırının altına inildi mi (veya kaydedici disk azaldı dedi mi)?"""
+    if recordsVideo is not None and getattr(recordsVideo, "_disk_state", "ok") != "ok":
+        return True
+    if RETENTION_MIN_FREE_PCT <= 0:
+        return False
+    try:
+        u = shutil.disk_usage(RECORDS_DIR)
+    except OSError:
+        return False
+    return u.total > 0 and u.free * 100.0 / u.total < RETENTION_MIN_FREE_PCT
+
+
+def run_once(dry_run: bool = False) -> dict:
+    """Bir saklama turu: tara, planla, (dry_run değilse) gruplar hâlinde sil."""
+    t0 = time.monotonic()
+    entries = _native(scan)
+    todo = plan(entries)
+    reasons = {}
+    for e, r in todo:
+        reasons[r] = reasons.get(r, 0) + 1
+    result = {"planned_files": len(todo), "planned_bytes": sum(e.size for e, _ in todo),
+              "reasons": reasons, "deleted_files": 0, "deleted_bytes": 0, "removed_sessions": []}
+    if dry_run or not todo:
+        return result
+
+    with _stats_lock:
+        _stats["running"] = True
+    errors = []
+    try:
+        paths = [e.path for e, _ in todo]
+        for i in range(0, len(paths), RETENTION_BATCH_FILES):
+            if _stop_evt.is_set():
+                break
+            done, nbytes, errs = _native(_delete_batch, paths[i:i + RETENTION_BATCH_FILES])
+            if records_index is not None:
+                try:
+                    records_index.remove_paths(done)
+                except Exception as e:
+                    LOG.error(f"Saklama: kayıt dizini güncellenemedi: {e}")
+            result["deleted_files"] += len(done)
+            result["deleted_bytes"] += nbytes
+            errors.extend(errs)
+            # Gruplar arası nefes: writer'ın birikmiş yazmaları diske insin
+            _stop_evt.wait(RETENTION_BATCH_PAUSE_SEC)
+        result["removed_sessions"] = _native(_remove_empty_sessions, sorted({e.session for e, _ in todo}))
+        if records_index is not None:
+            for sess in result["removed_sessions"]:
+                try:
+                    records_index.remove_session(sess)
+                except Exception as e:
+                    LOG.error(f"Saklama: kayıt dizini güncellenemedi: {e}")
+    finally:
+        with _stats_lock:
+            _stats["running"] = False
+            _stats["runs"] += 1
+            _stats["last_run"] = time.time()
+            _stats["last_duration_sec"] = round(time.monotonic() - t0, 2)
+            _stats["deleted_files"] += result["deleted_files"]
+            _stats["deleted_bytes"] += result["deleted_bytes"]
+            _stats["removed_sessions"] += len(result["removed_sessions"])
+            _stats["last_reasons"] = reasons
+            _stats["errors"] += len(errors)
+
+    for err in errors:
+        LOG.error(f"Saklama: silinemedi {err}")
+    LOG.info(f"Saklama: {result['deleted_files']} dosya ({result['deleted_bytes'] / 1048576:.1f} MB) silindi, "
+             f"nedenler {reasons}, kaldırılan oturumlar {result['removed_sessions']}")
+    if syslog:
+        try:
+            syslog.log_system_event("RETENTION_DELETE",
+                                    f"Saklama politikası {result['deleted_files']} dosya sildi",
+                                    "INFO",
+                                    deleted_files=result["deleted_files"],
+                                    deleted_bytes=result["deleted_bytes"],
+                                    reasons=reasons,
+                                    removed_sessions=result["removed_sessions"])
+        except Exception:
+            pass
+    return result
+
+
+def _loop():
+    next_full = time.monotonic() + 30.0  # açılışta kayıt başlasın diye kısa gecikme
+    while not _stop_evt.is_set():
+        woke = _wake.wait(RETENTION_CHECK_SEC)
+        _wake.clear()
+        if _stop_evt.is_set():
+            break
+        now = time.monotonic()
+        if woke or now >= next_full or _policy_breached():
+            try:
+                run_once()
+            except Exception as e:
+                LOG.error(f"Saklama turu hatası: {e}")
+            next_full = time.monotonic() + RETENTION_INTERVAL_SEC
+
+
+def request_run():
+    """Bir sonraki kontrolü beklemeden saklama turu başlat (ör. disk azaldığında)."""
+    _wake.set()
+
+
+def get_stats() -> dict:
+    with _stats_lock:
+        info = dict(_stats)
+    info.update({
+        "max_gb": RETENTION_MAX_GB,
+        "max_age_days": RETENTION_MAX_AGE_DAYS,
+        "min_free_pct": RETENTION_MIN_FREE_PCT,
+    })
+    return info
+
+
+def start_background():
+    global _thread
+    if _thread is not None:
+        return
+    if RETENTION_MAX_GB <= 0 and RETENTION_MAX_AGE_DAYS <= 0 and RETENTION_MIN_FREE_PCT <= 0:
+        LOG.info("Saklama servisi kapalı (politika tanımlı değil)")
+        return
+    _thread = threading.Thread(target=_loop, name="rec-retention", daemon=True)
+    _thread.start()
+    LOG.info(f"Saklama servisi başlatıldı: max {RETENTION_MAX_GB or '-'} GB, "
+             f"max {RETENTION_MAX_AGE_DAYS or '-'} gün, min %{RETENTION_MIN_FREE_PCT or '-'} boş")
+
+
+def stop_background():
+    _stop_evt.set()
+    _wake.set()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Kayıt saklama politikasını uygula")
+    ap.add_argument("--dry-run", action="store_true", help="yalnızca silinecekleri listele")
+    ap.add_argument("--once", action="store_true", help="bir tur uygula ve çık")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.dry_run:
+        for e, reason in plan(scan()):
+            print(f"{reason:10s} {e.session}/{e.name}  {e.size / 1048576:.1f} MB  "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(e.mtime))}")
+        return 0
+    if args.once:
+        print(run_once())
+        return 0
+    ap.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
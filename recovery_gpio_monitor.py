@@ -11,6 +11,7 @@ import os
 import sys
 import time
 import signal
+import socket
 import subprocess
 import threading
 import logging
@@ -32,6 +33,8 @@ except ImportError as e:
 # Kamera kontrol sinyali için dosya yolu
 # NOT: /tmp yerine /var/run kullanıyoruz çünkü systemd PrivateTmp=true ile /tmp'yi izole ediyor
 CAMERA_SIGNAL_FILE = "/var/run/clary_qr_mode.signal"
+# main.py bu soketi dinler; dosya yazılıp silindiğinde uyandırmak için datagram gönderilir
+CAMERA_SIGNAL_SOCKET = os.environ.get("CAMERA_SIGNAL_SOCKET", "/var/run/clary_qr_mode.sock")
 CAMERA_RELEASE_TIMEOUT = 10  # Kameranın serbest kalması için max bekleme süresi (saniye) - arttırıldı
 
 # ==================== LOGLAMA YAPILANDIRMA ====================
@@ -123,6 +126,22 @@ LED_BLINK_RECOVERY = 0.5     # Recovery modu: orta hızda (0.5s aç, 0.5s kapa)
 LED_BLINK_AP7_MODE = 1.0     # AP7 modu: yavaş yanıp sönme (1.0s aç, 1.0s kapa)
 
 # ==================== KAMERA SİNYAL FONKSİYONLARI ====================
+def notify_main(message):
+    """main.py'nin QR sinyal soketine bildirim gönder.
+    main.py eski sürümse veya soket yoksa sessizce geçilir; main zaten
+    dosyayı emniyet aralığıyla kontrol eder.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(message.encode(), CAMERA_SIGNAL_SOCKET)
+        logger.debug(f"main.py'ye bildirim gönderildi: {message}")
+        return True
+    except (FileNotFoundError, ConnectionRefusedError):
+        logger.debug(f"QR sinyal soketi yok ({CAMERA_SIGNAL_SOCKET}), main.py yoklamayla algılayacak")
+    except Exception as e:
+        logger.warning(f"main.py'ye bildirim gönderilemedi: {e}")
+    return False
+
 def signal_qr_mode_start():
     """Main uygulamasına QR modunun başladığını bildir"""
     try:
@@ -162,6 +181,7 @@ def signal_qr_mode_start():
             file_stat = os.stat(CAMERA_SIGNAL_FILE)
             logger.info(f"✓ QR modu sinyali gönderildi: {CAMERA_SIGNAL_FILE}")
             logger.info(f"  Dosya sahibi: uid={file_stat.st_uid}, gid={file_stat.st_gid}, izinler={oct(file_stat.st_mode)}")
+            notify_main("QR_MODE_START")
             return True
         else:
             logger.error(f"✗ Sinyal dosyası oluşturulamadı: {CAMERA_SIGNAL_FILE}")
@@ -183,6 +203,7 @@ def signal_qr_mode_end():
                 subprocess.run(['sudo', 'rm', '-f', CAMERA_SIGNAL_FILE],
                              check=False, stdin=subprocess.DEVNULL,
                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        notify_main("QR_MODE_END")
         logger.info("✓ QR modu sinyali temizlendi")
         return True
     except Exception as e:
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""Testler depo kökündeki modülleri (main.py'siz, eventlet'siz) doğrudan içe aktarır."""
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""recordsVideo._CfrResampler: zaman damgası -> sabit kare hızlı slot eşlemesi."""
+import pytest
+
+from recordsVideo import _CfrResampler
+
+
+def _feed(cfr, stamps):
+    return [cfr.place(ts) for ts in stamps]
+
+
+def test_steady_input_one_slot_per_frame():
+    cfr = _CfrResampler(10.0, max_gap_sec=0, fill=True)
+    assert _feed(cfr, [100.0 + i * 0.1 for i in range(20)]) == [1] * 20
+    st = cfr.stats()
+    assert (st["frames_in"], st["frames_out"], st["duplicated"], st["dropped"]) == (20, 20, 0, 0)
+
+
+def test_small_jitter_stays_on_grid():
+    cfr = _CfrResampler(10.0, max_gap_sec=0, fill=True)
+    # çizelge ilk kareye bağlanır; sonrakiler yarım periyottan az oynar
+    stamps = [100.0] + [100.0 + i * 0.1 + (0.04 if i % 2 else -0.04) for i in range(1, 10)]
+    assert _feed(cfr, stamps) == [1] * 10
+
+
+def test_gap_is_filled_with_duplicates():
+    cfr = _CfrResampler(10.0, max_gap_sec=0, fill=True)
+    # 100.1 ve 100.2 eksik: 100.3'teki kare 3 slot kaplar (önceki kare 2 kez tekrarlanır)
+    assert _feed(cfr, [100.0, 100.3, 100.4]) == [1, 3, 1]
+    assert cfr.stats()["duplicated"] == 2
+    assert cfr.stats()["frames_out"] == 5
+
+
+def test_frame_on_filled_slot_is_dropped():
+    cfr = _CfrResampler(10.0, max_gap_sec=0, fill=True)
+    assert _feed(cfr, [100.0, 100.02, 100.1]) == [1, 0, 1]
+    assert cfr.stats()["dropped"] == 1
+
+
+def test_long_gap_is_not_filled():
+    cfr = _CfrResampler(10.0, max_gap_sec=1.0, fill=True)
+    assert _feed(cfr, [100.0, 100.1, 105.0, 105.1]) == [1, 1, 1, 1]
+    st = cfr.stats()
+    assert st["gaps_skipped"] == 1
+    assert st["skipped_sec"] == pytest.approx(4.8, abs=0.01)
+
+
+def test_fill_disabled_relinks_timeline():
+    cfr = _CfrResampler(10.0, max_gap_sec=0, fill=False)
+    assert _feed(cfr, [100.0, 100.5, 100.6]) == [1, 1, 1]
+    assert cfr.stats()["duplicated"] == 0
+
+
+def test_output_duration_tracks_capture():
+    cfr = _CfrResampler(25.0, max_gap_sec=0, fill=True)
+    # 20 fps kaynak, 25 fps çıktı: 10 s sonunda ~250 slot
+    total = sum(_feed(cfr, [i * 0.05 for i in range(200)]))
+    assert abs(total - 249) <= 1
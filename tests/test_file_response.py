@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""file_response: Range, If-Range ve koşullu GET (304/412/416)."""
+import os
+
+import pytest
+from flask import Flask
+from werkzeug.http import http_date
+
+import file_response
+
+
+@pytest.fixture
+def data():
+    return os.urandom(100_000)
+
+
+@pytest.fixture
+def client(tmp_path, data):
+    path = tmp_path / "rec_test.avi"
+    path.write_bytes(data)
+    os.utime(path, (1_700_000_000, 1_700_000_000))
+    app = Flask(__name__)
+
+    @app.route("/f")
+    def f():
+        return file_response.send_range_file(str(path), download_name="kayıt ş.avi")
+
+    return app.test_client()
+
+
+def _fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def _get(client, **headers):
+    r = client.get("/f", headers=headers)
+    body = r.data
+    r.close()
+    return r, body
+
+
+def test_full_download(client, data):
+    r, body = _get(client)
+    assert r.status_code == 200
+    assert body == data
+    assert r.headers["Content-Type"] == "video/x-msvideo"
+    assert r.headers["Content-Length"] == str(len(data))
+    assert r.headers["Accept-Ranges"] == "bytes"
+    assert r.headers["Last-Modified"] == http_date(1_700_000_000)
+    assert r.headers["Content-Disposition"].startswith('attachment; filename="kayit s.avi"; filename*=UTF-8')
+
+
+@pytest.mark.parametrize("spec, start, end", [
+    ("bytes=100-199", 100, 199),
+    ("bytes=99990-", 99990, 99999),
+    ("bytes=-10", 99990, 99999),
+    ("bytes=99990-500000", 99990, 99999),
+])
+def test_single_range(client, data, spec, start, end):
+    r, body = _get(client, Range=spec)
+    assert r.status_code == 206
+    assert r.headers["Content-Range"] == f"bytes {start}-{end}/{len(data)}"
+    assert body == data[start:end + 1]
+
+
+def test_multiple_ranges(client, data):
+    r, body = _get(client, Range="bytes=0-9,5-19,1000-1009")
+    assert r.status_code == 206
+    ctype = r.headers["Content-Type"]
+    assert ctype.startswith("multipart/byteranges; boundary=")
+    assert int(r.headers["Content-Length"]) == len(body)
+    # çakışan 0-9 ve 5-19 birleştirilir: iki parça
+    assert body.count(b"Content-Range: ") == 2
+    assert b"Content-Range: bytes 0-19/100000\r\n\r\n" + data[:20] in body
+    assert b"Content-Range: bytes 1000-1009/100000\r\n\r\n" + data[1000:1010] in body
+    assert body.endswith(b"--" + ctype.split("=", 1)[1].encode() + b"--\r\n")
+
+
+def test_too_many_ranges_sends_whole_file(client, data):
+    spec = "bytes=" + ",".join(f"{i * 100}-{i * 100 + 9}" for i in range(file_response.DOWNLOAD_MAX_RANGES + 1))
+    r, body = _get(client, Range=spec)
+    assert r.status_code == 200 and body == data
+
+
+def test_unsatisfiable_range_is_416(client, data):
+    r, body = _get(client, Range="bytes=200000-")
+    assert r.status_code == 416
+    assert r.headers["Content-Range"] == f"bytes */{len(data)}"
+    assert body == b""
+
+
+def test_malformed_range_is_ignored(client, data):
+    r, body = _get(client, Range="pages=1-2")
+    assert r.status_code == 200 and body == data
+
+
+def test_if_range(client, data):
+    r, _ = _get(client)
+    etag, last_mod = r.headers["ETag"], r.headers["Last-Modified"]
+    r, body = _get(client, Range="bytes=10-19", **{"If-Range": etag})
+    assert r.status_code == 206 and body == data[10:20]
+    r, body = _get(client, Range="bytes=10-19", **{"If-Range": last_mod})
+    assert r.status_code == 206
+    # dosya değişmiş: aralık yok sayılır, tüm dosya gider
+    r, body = _get(client, Range="bytes=10-19", **{"If-Range": '"baska"'})
+    assert r.status_code == 200 and body == data
+    r, body = _get(client, Range="bytes=10-19", **{"If-Range": "W/" + etag})
+    assert r.status_code == 200
+
+
+def test_not_modified(client):
+    r, _ = _get(client)
+    etag = r.headers["ETag"]
+    r, body = _get(client, **{"If-None-Match": etag})
+    assert r.status_code == 304 and body == b""
+    assert r.headers["ETag"] == etag
+    r, _ = _get(client, **{"If-None-Match": '"baska", ' + etag})
+    assert r.status_code == 304
+    r, _ = _get(client, **{"If-Modified-Since": http_date(1_700_000_000)})
+    assert r.status_code == 304
+    r, _ = _get(client, **{"If-Modified-Since": http_date(1_699_999_000)})
+    assert r.status_code == 200
+
+
+def test_precondition_failed(client):
+    r, _ = _get(client)
+    etag = r.headers["ETag"]
+    r, body = _get(client, **{"If-Match": '"baska"'})
+    assert r.status_code == 412 and body == b""
+    r, _ = _get(client, **{"If-Match": etag})
+    assert r.status_code == 200
+    r, _ = _get(client, **{"If-Unmodified-Since": http_date(1_699_999_000)})
+    assert r.status_code == 412
+    # If-Match varsa If-Unmodified-Since'e bakılmaz
+    r, _ = _get(client, **{"If-Match": etag, "If-Unmodified-Since": http_date(1_699_999_000)})
+    assert r.status_code == 200
+
+
+def test_head_has_length_but_no_body(client, data):
+    r = client.head("/f")
+    assert r.status_code == 200
+    assert r.headers["Content-Length"] == str(len(data))
+    assert r.data == b""
+    r.close()
+
+
+def test_file_is_closed_on_every_path(client):
+    before = _fds()
+    for headers in ({}, {"Range": "bytes=0-9"}, {"Range": "bytes=0-1,5-6"}, {"Range": "bytes=999999-"},
+                    {"If-None-Match": "*"}, {"If-Match": '"x"'}):
+        _get(client, **headers)
+    r = client.get("/f", buffered=False)
+    next(iter(r.response))  # aktarım yarıda kesildi
+    r.close()
+    assert _fds() == before
+
+
+def test_missing_file_raises(tmp_path):
+    app = Flask(__name__)
+    with app.test_request_context("/"):
+        with pytest.raises(FileNotFoundError):
+            file_response.send_range_file(str(tmp_path / "yok.avi"))
+
+
+@pytest.mark.parametrize("header, resume", [
+    (None, False), ("bytes=0-", False), ("bytes=0-99", False), ("bytes=100-", True), ("bytes=-5", True),
+])
+def test_is_resume_request(header, resume):
+    app = Flask(__name__)
+    with app.test_request_context("/", headers={"Range": header} if header else {}):
+        assert file_response.is_resume_request() is resume
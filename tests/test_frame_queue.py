@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""recordsVideo._FrameQueue: bayt sınırı ve taşma politikaları."""
+from queue import Empty
+
+import numpy as np
+import pytest
+
+from frame_hub import Frame
+from recordsVideo import _FrameQueue
+
+
+class _Tracked(Frame):
+    """release() çağrılarını sayan kare."""
+
+    def __init__(self, seq, w=10, h=10, jpeg=None):
+        if jpeg is not None:
+            super().__init__(seq, float(seq), jpeg=jpeg, size=(w, h))
+        else:
+            super().__init__(seq, float(seq), image=np.zeros((h, w, 3), np.uint8))
+        self.released = 0
+
+    def release(self):
+        self.released += 1
+
+
+def _drain(q):
+    out = []
+    while True:
+        try:
+            out.append(q.get_nowait())
+        except Empty:
+            return out
+
+
+def test_unknown_policy_falls_back_to_drop_oldest():
+    assert _FrameQueue(1000, 10, "nope").policy == "drop_oldest"
+
+
+def test_drop_oldest_keeps_newest_within_budget():
+    q = _FrameQueue(1000, 100, "drop_oldest")  # 10x10 BGR = 300 byte: 3 kare sığar
+    frames = [_Tracked(i) for i in range(5)]
+    for f in frames:
+        q.put_nowait(f)
+    assert [f.seq for f in _drain(q)] == [2, 3, 4]
+    assert [f.released for f in frames] == [1, 1, 0, 0, 0]
+    st = q.stats()
+    assert (st["enqueued"], st["dropped"], st["bytes"]) == (5, 2, 0)
+    assert st["high_water_bytes"] == 900
+
+
+def test_drop_newest_keeps_backlog():
+    q = _FrameQueue(1000, 100, "drop_newest")
+    frames = [_Tracked(i) for i in range(5)]
+    for f in frames:
+        q.put_nowait(f)
+    assert [f.seq for f in _drain(q)] == [0, 1, 2]
+    assert [f.released for f in frames] == [0, 0, 0, 1, 1]
+    assert q.stats()["dropped"] == 2
+
+
+def test_item_limit_applies_to_small_frames():
+    q = _FrameQueue(10 ** 9, 2, "drop_oldest")
+    for i in range(4):
+        q.put_nowait(_Tracked(i, jpeg=b"x" * 10))
+    assert [f.seq for f in _drain(q)] == [2, 3]
+
+
+def test_decimate_drops_every_other_frame():
+    q = _FrameQueue(10 ** 9, 6, "decimate")
+    frames = [_Tracked(i, jpeg=b"x") for i in range(7)]
+    for f in frames:
+        q.put_nowait(f)
+    kept = [f.seq for f in _drain(q)]
+    # taşmada eski kareler seyreltilir, en yenisi her zaman korunur
+    assert kept[-1] == 6
+    assert len(kept) < 7
+    assert q.stats()["dropped"] == 7 - len(kept)
+    assert all(f.released == (f.seq not in kept) for f in frames)
+
+
+def test_degrade_shrinks_raw_frames_over_threshold():
+    q = _FrameQueue(1000, 100, "degrade")  # %50 (500 byte) üstünde küçültülür
+    first, second, third = _Tracked(0), _Tracked(1), _Tracked(2)
+    q.put_nowait(first)
+    q.put_nowait(second)  # 300 byte: eşik altı, olduğu gibi
+    q.put_nowait(third)   # 600 byte: eşik üstü, yarı boyuta
+    got = _drain(q)
+    assert [f.size for f in got] == [(10, 10), (10, 10), (5, 5)]
+    assert got[2].seq == 2 and got[2].ts == 2.0
+    assert third.released == 1  # özgün tampon bırakıldı
+    assert q.stats()["degraded"] == 1
+
+
+def test_degrade_leaves_jpeg_frames_alone():
+    q = _FrameQueue(100, 100, "degrade")
+    for i in range(3):
+        q.put_nowait(_Tracked(i, jpeg=b"x" * 40))
+    got = _drain(q)
+    assert all(f.jpeg == b"x" * 40 for f in got)
+    assert q.stats()["degraded"] == 0
+
+
+def test_get_timeout_raises_empty():
+    q = _FrameQueue(1000, 10)
+    with pytest.raises(Empty):
+        q.get(timeout=0.01)
+    assert q.qsize() == 0
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""mobile_api liste sayfalama: parametreler, filtreler ve cursor gidiş-dönüşü."""
+import pytest
+from flask import Flask
+
+import mobile_api
+
+_app = Flask(__name__)
+
+ITEMS = [{"name": f"rec_{i:02d}.avi", "mtime": 1_700_000_000 + i * 10, "size": (i * 7) % 5 * 100}
+         for i in range(23)]
+
+
+def _params(**query):
+    with _app.test_request_context("/", query_string=query):
+        return mobile_api._list_params()
+
+
+def _walk(limit, **query):
+    """Tüm sayfaları next_cursor ile gez; (adlar, her sayfadaki total) döndür."""
+    names, totals, cursor = [], [], None
+    for _ in range(100):
+        q = dict(query, limit=limit)
+        if cursor:
+            q["cursor"] = cursor
+        page, total, cursor = mobile_api._paginate(ITEMS, _params(**q))
+        assert len(page) <= limit
+        names += [it["name"] for it in page]
+        totals.append(total)
+        if cursor is None:
+            return names, totals
+    raise AssertionError("sayfalama bitmedi")
+
+
+def test_defaults():
+    p = _params()
+    assert (p["sort"], p["order"], p["limit"], p["cursor"]) == ("mtime", "desc", None, None)
+    page, total, cursor = mobile_api._paginate(ITEMS, p)
+    assert total == 23 and cursor is None
+    assert [it["name"] for it in page] == [it["name"] for it in reversed(ITEMS)]
+
+
+@pytest.mark.parametrize("sort", ["mtime", "name", "size"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_cursor_walk_matches_full_sort(sort, order):
+    expected = [it["name"] for it in sorted(ITEMS, key=lambda it: (it[sort], it["name"]), reverse=order == "desc")]
+    names, totals = _walk(4, sort=sort, order=order)
+    assert names == expected  # tekrar yok, atlama yok (eşit size değerlerinde de)
+    assert set(totals) == {23}
+
+
+def test_cursor_is_stable_when_items_change():
+    page, _, cursor = mobile_api._paginate(ITEMS, _params(limit=5))
+    newer = ITEMS + [{"name": "rec_99.avi", "mtime": 1_800_000_000, "size": 1}]  # araya yeni kayıt
+    rest, total, _ = mobile_api._paginate(newer, _params(limit=5, cursor=cursor))
+    assert total == 24
+    assert rest[0]["name"] == "rec_17.avi"  # ilk sayfanın sonu rec_18
+    assert page[-1]["name"] == "rec_18.avi"
+
+
+def test_filters():
+    p = _params(since=1_700_000_050, until="1700000150", min_size=200, prefix="rec_1")
+    page, total, _ = mobile_api._paginate(ITEMS, p)
+    assert total == len(page)
+    for it in page:
+        assert it["name"].startswith("rec_1")
+        assert 1_700_000_050 <= it["mtime"] < 1_700_000_150 and it["size"] >= 200
+
+
+def test_iso_time_and_limit_clamp(monkeypatch):
+    monkeypatch.setattr(mobile_api, "LIST_MAX_LIMIT", 10)
+    p = _params(since="2023-11-14T22:13:20", limit=1000)
+    assert p["limit"] == 10
+    assert isinstance(p["since"], float)
+    assert _params(limit=0)["limit"] == 1
+
+
+def test_cursor_round_trip():
+    item = {"name": "rec_ş.avi", "mtime": 1.5, "size": 3}
+    c = mobile_api._encode_cursor("size", "asc", item)
+    assert "=" not in c
+    assert mobile_api._decode_cursor(c, "size", "asc") == (3, "rec_ş.avi")
+
+
+@pytest.mark.parametrize("query", [
+    {"sort": "foo"},
+    {"order": "up"},
+    {"limit": "abc"},
+    {"since": "dün"},
+    {"min_size": "1.5"},
+    {"cursor": "zzz"},
+    {"cursor": mobile_api._encode_cursor("name", "desc", ITEMS[0]), "sort": "mtime"},
+])
+def test_bad_params_raise_value_error(query):
+    with pytest.raises(ValueError):
+        _params(**query)
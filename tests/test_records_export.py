@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""records_export: akış hâlinde üretilen ZIP/TAR'ın geçerliliği ve kaldığı yerden devam."""
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+from flask import Flask
+
+import records_export
+
+
+class _Recorder:
+    """recordsVideo yerine: yazılmakta olan dosyayı bildirir."""
+
+    def __init__(self, live=None):
+        self.live = live
+
+    def live_current(self):
+        return self.live
+
+
+@pytest.fixture
+def records(tmp_path, monkeypatch):
+    sess = tmp_path / "oturum1"
+    sess.mkdir()
+    files = {}
+    for i, size in enumerate((0, 1, 70_000, 300_001)):
+        name = f"rec_{i}_ş.avi"
+        data = os.urandom(size)
+        (sess / name).write_bytes(data)
+        os.utime(sess / name, (1_700_000_000 + i, 1_700_000_000 + i))
+        files[f"oturum1/{name}"] = data
+    (sess / ".thumbs").mkdir()
+    (sess / ".thumbs" / "x.jpg").write_bytes(b"jpg")
+    monkeypatch.setattr(records_export, "RECORDS_DIR", str(tmp_path))
+    monkeypatch.setattr(records_export, "recordsVideo", _Recorder())
+    with records_export._crc_lock:
+        records_export._crc_cache.clear()
+    return files
+
+
+def _read_all(arc, chunk=8192, start=0):
+    out = bytearray()
+    pos = start
+    while pos < arc.size:
+        data = arc.read(chunk, pos)
+        assert data, f"{pos}/{arc.size} konumunda boş okuma"
+        out += data
+        pos += len(data)
+    return bytes(out)
+
+
+def test_zip_is_valid(records):
+    arc = records_export.Archive("oturum1", "zip")
+    blob = _read_all(arc)
+    arc.close()
+    assert len(blob) == arc.size
+    zf = zipfile.ZipFile(io.BytesIO(blob))
+    assert zf.testzip() is None
+    assert zf.namelist() == list(records)  # mtime sırası
+    for name, data in records.items():
+        assert zf.read(name) == data
+    assert (arc.filename, arc.mimetype) == ("oturum1.zip", "application/zip")
+
+
+def test_tar_is_valid(records):
+    arc = records_export.Archive("oturum1", "tar")
+    blob = _read_all(arc)
+    arc.close()
+    assert len(blob) == arc.size and arc.size % tarfile.BLOCKSIZE == 0
+    with tarfile.open(fileobj=io.BytesIO(blob)) as tf:
+        members = tf.getmembers()
+        assert [m.name for m in members] == list(records)
+        for m in members:
+            assert tf.extractfile(m).read() == records[m.name]
+            assert m.mtime >= 1_700_000_000
+
+
+@pytest.mark.parametrize("fmt", records_export.FORMATS)
+def test_resume_is_byte_identical(records, fmt):
+    full = _read_all(records_export.Archive("oturum1", fmt))
+    with records_export._crc_lock:
+        records_export._crc_cache.clear()  # devam: atlanan dosyaların CRC'si yeniden hesaplanmalı
+    for cut in (1, 100, 70_000, len(full) // 2, len(full) - 30):
+        arc = records_export.Archive("oturum1", fmt)
+        assert _read_all(arc, chunk=65536, start=cut) == full[cut:]
+        arc.close()
+
+
+def test_layout_and_etag_are_deterministic(records, tmp_path):
+    a, b = records_export.Archive("oturum1", "zip"), records_export.Archive("oturum1", "zip")
+    assert (a.size, a.etag) == (b.size, b.etag)
+    assert a.etag != records_export.Archive("oturum1", "tar").etag
+    (tmp_path / "oturum1" / "rec_1_ş.avi").write_bytes(b"yy")
+    assert records_export.Archive("oturum1", "zip").etag != a.etag
+
+
+def test_live_file_is_skipped(records, monkeypatch):
+    monkeypatch.setattr(records_export, "recordsVideo", _Recorder(("oturum1", "rec_3_ş.avi", 0, 0.0)))
+    arc = records_export.Archive("oturum1", "zip")
+    with zipfile.ZipFile(io.BytesIO(_read_all(arc))) as zf:
+        assert "oturum1/rec_3_ş.avi" not in zf.namelist()
+        assert len(zf.namelist()) == 3
+
+
+def test_bad_format_and_missing_session(records):
+    with pytest.raises(ValueError):
+        records_export.Archive("oturum1", "rar")
+    with pytest.raises(FileNotFoundError):
+        records_export.Archive("yok", "zip")
+
+
+def test_send_session_range_resume(records):
+    app = Flask(__name__)
+
+    @app.route("/e/<fmt>")
+    def e(fmt):
+        return records_export.send_session("oturum1", fmt)
+
+    c = app.test_client()
+    r = c.get("/e/zip")
+    full, etag = r.data, r.headers["ETag"]
+    assert r.status_code == 200 and r.headers["Content-Length"] == str(len(full))
+    assert r.headers["Content-Disposition"] == 'attachment; filename="oturum1.zip"'
+    r.close()
+    got = full[:1000]
+    for start, end in ((1000, 200_000), (200_001, None)):
+        spec = f"bytes={start}-{'' if end is None else end}"
+        r = c.get("/e/zip", headers={"Range": spec, "If-Range": etag})
+        assert r.status_code == 206
+        got += r.data
+        r.close()
+    assert got == full
+    r = c.get("/e/zip", headers={"Range": "bytes=1000-", "If-Range": '"eski"'})
+    assert r.status_code == 200 and r.data == full
+    r.close()
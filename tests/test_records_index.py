@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""records_index: açılış eşitlemesi, artımlı güncelleme ve dışarıdan değişiklik."""
+import os
+
+import pytest
+
+import records_index
+
+
+def _write(root, session, name, size, mtime):
+    d = root / session
+    d.mkdir(exist_ok=True)
+    p = d / name
+    p.write_bytes(b"x" * size)
+    os.utime(p, (mtime, mtime))
+    return p
+
+
+@pytest.fixture
+def index(tmp_path):
+    _write(tmp_path, "oturum1", "rec_a.avi", 100, 1_700_000_000)
+    _write(tmp_path, "oturum1", "rec_b.avi", 300, 1_700_000_100)
+    _write(tmp_path, "oturum2", "rec_c.avi", 50, 1_700_000_200)
+    _write(tmp_path, "oturum2", ".thumb.jpg", 10, 1_700_000_300)
+    (tmp_path / ".previews").mkdir()
+    assert records_index.open_index(str(tmp_path))
+    assert not records_index.ready()
+    records_index.reconcile()
+    yield tmp_path
+    records_index.close()
+
+
+def test_reconcile_lists_sessions_newest_first(index):
+    assert records_index.ready()
+    sessions = records_index.list_sessions()
+    assert [(s["name"], s["count"], s["size"]) for s in sessions] == [("oturum2", 1, 50), ("oturum1", 2, 400)]
+    assert (index / ".index.sqlite3").exists()
+
+
+def test_list_files_skips_dot_files(index):
+    files = records_index.list_files("oturum1")
+    assert [(f["name"], f["size"], f["mtime"]) for f in files] == [
+        ("rec_b.avi", 300, 1_700_000_100), ("rec_a.avi", 100, 1_700_000_000)]
+    assert [f["name"] for f in records_index.list_files("oturum2")] == ["rec_c.avi"]
+
+
+def test_incremental_updates_bump_generation(index):
+    gen = records_index.generation()
+    _write(index, "oturum1", "rec_d.avi", 10, 1_700_000_500)
+    records_index.note_file("oturum1", "rec_d.avi", duration=1.5, fps=10.0, frames=15)
+    assert records_index.generation() == gen + 1
+    f = records_index.get_file("oturum1", "rec_d.avi")
+    assert (f["size"], f["duration"], f["frames"]) == (10, 1.5, 15)
+
+    records_index.rename_file("oturum1", "rec_d.avi", "rec_e.avi")
+    assert records_index.get_file("oturum1", "rec_d.avi") is None
+    assert records_index.get_file("oturum1", "rec_e.avi")["duration"] == 1.5
+
+    records_index.remove_file("oturum1", "rec_e.avi")
+    records_index.rename_session("oturum2", "oturum3")
+    assert records_index.has_session("oturum3") and not records_index.has_session("oturum2")
+    assert [f["name"] for f in records_index.list_files("oturum3")] == ["rec_c.avi"]
+    records_index.remove_session("oturum3")
+    assert [s["name"] for s in records_index.list_sessions()] == ["oturum1"]
+    assert records_index.generation() == gen + 5
+
+
+def test_probe_metadata_fills_only_unknown_fields(index):
+    pending = {(s, n) for s, n, _, _ in records_index.pending_probe(10)}
+    assert pending == {("oturum1", "rec_a.avi"), ("oturum1", "rec_b.avi"), ("oturum2", "rec_c.avi")}
+    assert records_index.update_meta("oturum1", "rec_a.avi", 100, 1_700_000_000, width=640, height=480)
+    assert not records_index.update_meta("oturum1", "rec_b.avi", 999, 1_700_000_100, width=1)  # dosya değişmiş
+    f = records_index.get_file("oturum1", "rec_a.avi")
+    assert (f["width"], f["height"]) == (640, 480)
+    assert ("oturum1", "rec_a.avi") not in {(s, n) for s, n, _, _ in records_index.pending_probe(10)}
+
+
+def test_refresh_picks_up_external_changes(index):
+    gen = records_index.generation()
+    _write(index, "oturum4", "rec_x.avi", 7, 1_700_000_900)
+    os.remove(index / "oturum1" / "rec_a.avi")
+    assert records_index.refresh(force=True) >= 2
+    assert records_index.generation() > gen
+    assert [f["name"] for f in records_index.list_files("oturum1")] == ["rec_b.avi"]
+    assert records_index.list_sessions()[0]["name"] == "oturum4"
+
+
+def test_index_persists_across_reopen(index):
+    gen = records_index.generation()
+    records_index.close()
+    assert records_index.open_index(str(index))
+    assert records_index.generation() == gen
+    records_index.reconcile()
+    assert records_index.generation() == gen  # disk değişmedi: sayaç da değişmez
+    assert len(records_index.list_files("oturum1")) == 2
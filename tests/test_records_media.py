@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""records_media.ensure(): dosya başına üretim kilidi."""
+import threading
+import time
+
+import pytest
+
+import records_media
+
+
+@pytest.fixture
+def media(tmp_path, monkeypatch):
+    monkeypatch.setattr(records_media, "RECORDS_DIR", str(tmp_path))
+    monkeypatch.setattr(records_media, "recordsVideo", None)
+    monkeypatch.setattr(records_media, "records_index", None)
+    return tmp_path
+
+
+def test_missing_file_leaves_no_lock_behind(media):
+    assert records_media.ensure("oturum1", "yok.avi") is None
+    assert records_media._file_locks == {}
+
+
+def test_concurrent_requests_share_one_lock(media, monkeypatch):
+    running = []
+    overlap = []
+
+    def extract(path, sprite, closed=False):
+        running.append(path)
+        overlap.append(len(running))
+        time.sleep(0.05)
+        running.remove(path)
+        return {"size": 1, "mtime": 1.0, "key": "k", "meta": None, "created": []}
+
+    monkeypatch.setattr(records_media, "_extract", extract)
+    threads = [threading.Thread(target=records_media.ensure, args=("oturum1", "rec.avi")) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.02)
+    assert list(records_media._file_locks) == [("oturum1", "rec.avi")]
+    for t in threads:
+        t.join()
+    assert max(overlap) == 1  # aynı dosya için üretim hiç üst üste binmedi
+    assert records_media._file_locks == {}  # son kullanan bırakınca kilit silindi
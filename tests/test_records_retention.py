@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""records_retention.plan(): hangi dosyaların hangi sırayla silineceği."""
+import pytest
+
+import records_retention as rr
+
+NOW = 1_800_000_000.0
+GB = 1024 ** 3
+
+
+def _e(session, name, size, age, active=False):
+    return rr._Entry(session, name, f"/r/{session}/{name}", size, NOW - age, active)
+
+
+@pytest.fixture
+def entries(monkeypatch):
+    for k, v in (("RETENTION_MAX_GB", 0), ("RETENTION_MAX_AGE_DAYS", 0),
+                 ("RETENTION_MIN_FREE_PCT", 0), ("RETENTION_MIN_AGE_SEC", 120)):
+        monkeypatch.setattr(rr, k, v)
+    return [
+        _e("oturum1", "rec_a.avi", GB, 10 * 86400),
+        _e("oturum1", "rec_b.avi", GB, 9 * 86400),
+        _e("oturum2", "rec_c.avi", GB, 5 * 86400),
+        # aktif oturum: kapanmış eski parçalar ve yazılmakta olan parça
+        _e("oturum3", "rec_p001.avi", GB, 20 * 86400, active=True),
+        _e("oturum3", "rec_p002.avi", GB, 19 * 86400, active=True),
+        _e("oturum3", "rec_p003.avi", GB, 0, active=True),
+        _e("oturum2", "rec_new.avi", GB, 30),  # az önce kapandı
+    ]
+
+
+def _names(todo):
+    return [(e.name, reason) for e, reason in todo]
+
+
+def test_nothing_when_policies_off(entries):
+    assert rr.plan(entries, now=NOW, usage=(100 * GB, 99 * GB, 1 * GB)) == []
+
+
+def test_max_age_oldest_first_skips_active_session(entries, monkeypatch):
+    monkeypatch.setattr(rr, "RETENTION_MAX_AGE_DAYS", 7)
+    assert _names(rr.plan(entries, now=NOW)) == [("rec_a.avi", "max_age"), ("rec_b.avi", "max_age")]
+
+
+def test_max_total_stops_at_limit(entries, monkeypatch):
+    monkeypatch.setattr(rr, "RETENTION_MAX_GB", 5.5)
+    assert _names(rr.plan(entries, now=NOW)) == [("rec_a.avi", "max_total"), ("rec_b.avi", "max_total")]
+
+
+def test_min_free_never_touches_active_session(entries, monkeypatch):
+    monkeypatch.setattr(rr, "RETENTION_MIN_FREE_PCT", 50)
+    # 100 GB diskte 1 GB boş: tüm aday oturumlar silinse de yetmez
+    todo = rr.plan(entries, now=NOW, usage=(100 * GB, 99 * GB, 1 * GB))
+    assert _names(todo) == [("rec_a.avi", "min_free"), ("rec_b.avi", "min_free"), ("rec_c.avi", "min_free")]
+    assert not any(e.active for e, _ in todo)
+
+
+def test_every_policy_together_spares_active_session(entries, monkeypatch):
+    monkeypatch.setattr(rr, "RETENTION_MAX_AGE_DAYS", 1)
+    monkeypatch.setattr(rr, "RETENTION_MAX_GB", 0.1)
+    monkeypatch.setattr(rr, "RETENTION_MIN_FREE_PCT", 90)
+    todo = rr.plan(entries, now=NOW, usage=(100 * GB, 99 * GB, 1 * GB))
+    assert {e.session for e, _ in todo} == {"oturum1", "oturum2"}
+    assert "rec_new.avi" not in {e.name for e, _ in todo}  # RETENTION_MIN_AGE_SEC
+    assert len({e.path for e, _ in todo}) == len(todo)  # aynı dosya iki kez seçilmez